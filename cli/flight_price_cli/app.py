@@ -2,48 +2,32 @@ from __future__ import annotations
 
 import json
 import os
+import sys
 import time
-from dataclasses import dataclass
+from contextlib import nullcontext
+from dataclasses import replace
 from datetime import date, timedelta
-from decimal import Decimal, InvalidOperation
-from enum import Enum
+from decimal import Decimal
 from pathlib import Path
-from typing import Any, Iterable, Optional
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional
 
 import typer
-from amadeus import Client, ResponseError
-from dotenv import load_dotenv
+from flight_engine import OfferQuery, Profiler, RateLimiter, SearchEngine, new_client
 from rich.console import Console
-from rich.panel import Panel
-from rich.progress import (
-    BarColumn,
-    MofNCompleteColumn,
-    Progress,
-    SpinnerColumn,
-    TextColumn,
-    TimeRemainingColumn,
-)
-from rich.style import Style
-from rich.table import Table
-
-console = Console()
 
+from .export import PriceSink, export_format
+from .matrix import PriceMatrix, parse_weekdays, price_buckets
+from .planner import AnytimeQueue, PriceModel, RefineSampler, Strategy
+from .pruning import PruneStats, max_price_filter
+from .results import CheapestResult, TopN, TripType, compact_offer
+from .watch import WatchPlanner, load_states, save_states
 
-class TripType(str, Enum):
-    one_way = "one-way"
-    return_trip = "return"
+if TYPE_CHECKING:
+    from rich.progress import Progress
 
-
-@dataclass(frozen=True)
-class CheapestResult:
-    origin: str
-    destination: str
-    currency: str
-    trip_type: TripType
-    departure_date: date
-    return_date: Optional[date]
-    total_price: Decimal
-    raw_offer: dict[str, Any]
+# `amadeus`, `dotenv` and the heavier rich renderables are imported inside the functions
+# that use them, so `--help`, `--dry-run`, `query` and the prompts start without them.
+console = Console()
 
 
 app = typer.Typer(
@@ -55,6 +39,8 @@ app = typer.Typer(
 
 
 def _load_env() -> None:
+    from dotenv import load_dotenv
+
     load_dotenv(override=False)
     repo_root = Path(__file__).resolve().parents[2]
     load_dotenv(repo_root / ".env", override=False)
@@ -86,6 +72,41 @@ def _save_state(state: dict[str, Any]) -> None:
     tmp.replace(path)
 
 
+def _matrix_path(origin: str, destination: str, currency: str) -> Path:
+    return _repo_root() / ".flight_price_cli_matrices" / f"{origin}-{destination}-{currency}.fpm"
+
+
+def _watch_path(origin: str, destination: str, currency: str, trip: TripType) -> Path:
+    return _repo_root() / ".flight_price_cli_watch" / f"{origin}-{destination}-{currency}-{trip.value}.json"
+
+
+def _new_engine(*, rate: float = 0.0) -> SearchEngine:
+    """Load credentials and build the search engine; only called once a search will really run."""
+    _load_env()
+    _require_amadeus_env()
+    return SearchEngine(new_client(), limiter=RateLimiter(rate) if rate else None)
+
+
+def _progress() -> Progress:
+    from rich.progress import (
+        BarColumn,
+        MofNCompleteColumn,
+        Progress,
+        SpinnerColumn,
+        TextColumn,
+        TimeRemainingColumn,
+    )
+
+    return Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeRemainingColumn(),
+        console=console,
+    )
+
+
 def _require_amadeus_env() -> None:
     missing = [k for k in ("AMADEUS_CLIENT_ID", "AMADEUS_CLIENT_SECRET") if not os.getenv(k)]
     if missing:
@@ -109,6 +130,38 @@ def _parse_iata(value: str) -> str:
     return code
 
 
+def _parse_route(value: str) -> tuple[str, str]:
+    parts = [p for p in value.replace(",", " ").replace("-", " ").split() if p]
+    if len(parts) != 2:
+        raise typer.BadParameter(f"Route must be ORIGIN-DESTINATION (e.g. LHR-JFK), got {value!r}")
+    return _parse_iata(parts[0]), _parse_iata(parts[1])
+
+
+def _parse_code_list(values: Iterable[str]) -> list[str]:
+    codes: list[str] = []
+    for value in values:
+        codes.extend(_parse_iata(v) for v in value.split(",") if v.strip())
+    return codes
+
+
+def _load_routes(
+    *,
+    origins: list[str],
+    destinations: list[str],
+    routes: list[str],
+    routes_file: Optional[Path],
+) -> list[tuple[str, str]]:
+    """Explicit routes, routes-file lines and the origins x destinations matrix, de-duplicated in order."""
+    found: list[tuple[str, str]] = [_parse_route(r) for r in routes]
+    if routes_file is not None:
+        for line in routes_file.read_text(encoding="utf-8").splitlines():
+            line = line.split("#", 1)[0].strip()
+            if line:
+                found.append(_parse_route(line))
+    found.extend((o, d) for o in origins for d in destinations)
+    return [r for r in dict.fromkeys(found) if r[0] != r[1]]
+
+
 def _parse_trip(value: str) -> TripType:
     normalized = value.strip().lower().replace("_", "-").replace(" ", "-")
     if normalized in {"return", "round-trip", "roundtrip", "rt"}:
@@ -127,23 +180,17 @@ def _iter_dates(start: date, end: date) -> Iterable[date]:
         current += timedelta(days=1)
 
 
-def _offer_total(offer: dict[str, Any]) -> Decimal:
-    price = offer.get("price") or {}
-    value = price.get("grandTotal") or price.get("total")
-    if value is None:
-        raise ValueError("Offer missing price.total / price.grandTotal")
-    try:
-        return Decimal(str(value))
-    except (InvalidOperation, TypeError) as e:
-        raise ValueError(f"Invalid price value: {value!r}") from e
+def _prune_observer(stats: Optional[PruneStats], query: OfferQuery) -> Optional[Callable[[Any], None]]:
+    if stats is None:
+        return None
+    return lambda response: stats.record(response, query.max_price)
 
 
-def _cheapest_offer(client: Client, **kwargs: Any) -> tuple[Optional[Decimal], Optional[dict[str, Any]]]:
-    response = client.shopping.flight_offers_search.get(**kwargs)
-    if not response.data:
-        return None, None
-    cheapest = min(response.data, key=_offer_total)
-    return _offer_total(cheapest), cheapest
+def _transport_summary(stats: dict[str, Any]) -> str:
+    return (
+        f"{stats['requests']} HTTP requests over {stats['connections_opened']} connections "
+        f"({stats['reuse_ratio']:.0%} reused)"
+    )
 
 
 def _maybe_sleep(throttle_seconds: float) -> None:
@@ -171,32 +218,121 @@ def _iter_requests(
             yield departure_date, return_date
 
 
+def _plan_requests(
+    *,
+    trip: TripType,
+    departure_dates: list[date],
+    end_date: date,
+    min_stay_days: int,
+    max_stay_days: int,
+) -> int:
+    if trip == TripType.one_way:
+        return len(departure_dates)
+    planned_requests = 0
+    for departure_date in departure_dates:
+        earliest_return = departure_date + timedelta(days=min_stay_days)
+        latest_return = min(end_date, departure_date + timedelta(days=max_stay_days))
+        planned_requests += max(0, (latest_return - earliest_return).days + 1)
+    return planned_requests
+
+
+def _compose_dates(
+    *,
+    departure_dates: Iterable[date],
+    end_date: date,
+    min_stay_days: int,
+    max_stay_days: int,
+) -> tuple[list[date], list[date]]:
+    """Outbound and inbound one-way dates needed to cover every return pair in the stay window."""
+    outbound: list[date] = []
+    inbound: set[date] = set()
+    for departure_date in departure_dates:
+        earliest_return = departure_date + timedelta(days=min_stay_days)
+        latest_return = min(end_date, departure_date + timedelta(days=max_stay_days))
+        if latest_return < earliest_return:
+            continue
+        outbound.append(departure_date)
+        inbound.update(_iter_dates(earliest_return, latest_return))
+    return outbound, sorted(inbound)
+
+
+def _compose_return_pairs(
+    outbound: dict[date, tuple[Decimal, dict[str, Any]]],
+    inbound: dict[date, tuple[Decimal, dict[str, Any]]],
+    *,
+    end_date: date,
+    min_stay_days: int,
+    max_stay_days: int,
+) -> Iterable[tuple[date, date, Decimal, dict[str, Any]]]:
+    """Combine one-way leg prices into (departure, return, total, offer) return pairs."""
+    for departure_date in sorted(outbound):
+        out_price, out_offer = outbound[departure_date]
+        earliest_return = departure_date + timedelta(days=min_stay_days)
+        latest_return = min(end_date, departure_date + timedelta(days=max_stay_days))
+        for return_date in _iter_dates(earliest_return, latest_return):
+            leg = inbound.get(return_date)
+            if leg is None:
+                continue
+            in_price, in_offer = leg
+            offer = {
+                "id": f"{out_offer.get('id', '')}+{in_offer.get('id', '')}",
+                "outbound": out_offer,
+                "inbound": in_offer,
+            }
+            yield departure_date, return_date, out_price + in_price, offer
+
+
+def _offer_query(
+    *,
+    origin: str,
+    destination: str,
+    departure_date: date,
+    return_date: Optional[date],
+    adults: int,
+    currency: str,
+    max_offers: int,
+    nonstop: bool,
+    max_price: Optional[int] = None,
+) -> OfferQuery:
+    return OfferQuery(
+        origin=origin,
+        destination=destination,
+        departure_date=departure_date,
+        return_date=return_date,
+        adults=adults,
+        currency=currency,
+        max_offers=max_offers,
+        nonstop=nonstop,
+        max_price=max_price,
+    )
+
+
 def _format_pair(departure_date: date, return_date: Optional[date]) -> str:
     if return_date:
         return f"{departure_date} / {return_date}"
     return f"{departure_date}"
 
 
-def _update_top_n(
+def _print_top_n(
     top: list[CheapestResult],
-    candidate: CheapestResult,
+    *,
     top_n: int,
-) -> bool:
-    if top_n <= 0:
-        return False
-    top.append(candidate)
-    top.sort(key=lambda r: r.total_price)
-    if len(top) > top_n:
-        del top[top_n:]
-    return candidate in top
-
-
-def _print_top_n(top: list[CheapestResult], *, top_n: int) -> None:
+    show_route: bool = False,
+    title: Optional[str] = None,
+) -> None:
     if not top or top_n <= 0:
         return
+    from rich.style import Style
+    from rich.table import Table
     
-    table = Table(title=f"Top {min(top_n, len(top))} results", show_header=True, header_style="bold magenta")
+    table = Table(
+        title=title or f"Top {min(top_n, len(top))} results",
+        show_header=True,
+        header_style="bold magenta",
+    )
     table.add_column("#", justify="right", style="cyan")
+    if show_route:
+        table.add_column("Route", style="cyan")
     table.add_column("Dates", style="white")
     table.add_column("Price", justify="right", style="green")
     table.add_column("Offer ID", justify="right")
@@ -208,8 +344,10 @@ def _print_top_n(top: list[CheapestResult], *, top_n: int) -> None:
         
         style = Style(bgcolor="dark_green", bold=True) if i == 1 else None
         
+        route = [f"{r.origin}->{r.destination}"] if show_route else []
         table.add_row(
             str(i),
+            *route,
             dates,
             price_str,
             offer_id,
@@ -220,6 +358,86 @@ def _print_top_n(top: list[CheapestResult], *, top_n: int) -> None:
     console.print(table)
 
 
+def _open_sink(output: Optional[str], export: Optional[Path]) -> PriceSink:
+    try:
+        sink = PriceSink(output, export)
+    except (ValueError, OSError) as e:
+        raise typer.BadParameter(str(e)) from e
+    if sink.to_stdout:
+        # stdout carries the NDJSON stream; everything human-readable moves to stderr.
+        console.file = sys.stderr
+    return sink
+
+
+def _check_export(export: Optional[Path]) -> None:
+    if export is not None:
+        try:
+            export_format(export)
+        except ValueError as e:
+            raise typer.BadParameter(str(e)) from e
+
+
+def _save_matrix(matrix: Optional[PriceMatrix], path: Optional[Path] = None) -> Optional[Path]:
+    if matrix is None or not len(matrix):
+        return None
+    path = path or _matrix_path(matrix.origin, matrix.destination, matrix.currency)
+    matrix.save(path)
+    console.print(f"[dim]Saved {len(matrix)} prices to {path} (re-rank offline with `query`)[/dim]")
+    return path
+
+
+def _print_heatmap(matrix: PriceMatrix, by_departure: dict[date, float]) -> None:
+    """Calendar of the cheapest return per departure date, coloured by price quintile."""
+    if not by_departure:
+        return
+    from rich.table import Table
+
+    colors = ("bold green", "green", "yellow", "dark_orange", "red")
+    bounds = price_buckets(by_departure.values(), len(colors))
+    table = Table(
+        title=f"Cheapest return by departure date ({matrix.origin}->{matrix.destination}, {matrix.currency})",
+        show_header=True,
+        header_style="bold magenta",
+        show_lines=True,
+    )
+    table.add_column("Week of", style="cyan")
+    for name in ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"):
+        table.add_column(name, justify="right")
+
+    first = min(by_departure)
+    last = max(by_departure)
+    week_start = first - timedelta(days=first.weekday())
+    while week_start <= last:
+        cells = []
+        for offset in range(7):
+            day = week_start + timedelta(days=offset)
+            price = by_departure.get(day)
+            if price is None:
+                cells.append(f"[dim]{day.day:>2}[/dim]" if first <= day <= last else "")
+                continue
+            color = next(c for c, bound in zip(colors, bounds) if price <= bound)
+            cells.append(f"[dim]{day.day:>2}[/dim]\n[{color}]{price:.0f}[/{color}]")
+        table.add_row(week_start.isoformat(), *cells)
+        week_start += timedelta(days=7)
+
+    console.print()
+    console.print(table)
+
+
+def _result_json(r: CheapestResult, *, with_route: bool = False) -> dict[str, Any]:
+    entry: dict[str, Any] = {"origin": r.origin, "destination": r.destination} if with_route else {}
+    entry.update(
+        {
+            "departure_date": r.departure_date.isoformat(),
+            "return_date": r.return_date.isoformat() if r.return_date else None,
+            "total_price": str(r.total_price),
+            "offer_id": r.raw_offer.get("id"),
+            "composed": r.composed,
+        }
+    )
+    return entry
+
+
 def _run_search(
     *,
     origin: str,
@@ -242,13 +460,35 @@ def _run_search(
     top_n: int,
     stream: bool,
     remember: bool,
+    compose_one_way: bool = False,
+    validate_top: int = 0,
+    keep_offers: int = 0,
+    output: Optional[str] = None,
+    export: Optional[Path] = None,
+    matrix_path: Optional[Path] = None,
+    anytime: bool = False,
+    time_budget: Optional[float] = None,
+    strategy: Strategy = Strategy.exhaustive,
+    refine_step: int = 3,
+    prune: bool = False,
 ) -> None:
-    _load_env()
-    _require_amadeus_env()
+    _check_export(export)
 
     if trip == TripType.one_way and (min_stay_days != 1 or max_stay_days != 14):
         typer.echo("Note: --min-stay/--max-stay are ignored for --trip one-way", err=True)
 
+    refine = strategy == Strategy.refine
+    if anytime and compose_one_way:
+        raise typer.BadParameter("--anytime cannot be combined with --compose-one-way")
+    if refine and (anytime or compose_one_way):
+        raise typer.BadParameter("--strategy refine cannot be combined with --anytime or --compose-one-way")
+    if prune and compose_one_way:
+        raise typer.BadParameter("--prune cannot be combined with --compose-one-way")
+
+    if trip == TripType.one_way and compose_one_way:
+        typer.echo("Note: --compose-one-way is ignored for --trip one-way", err=True)
+        compose_one_way = False
+
     if trip == TripType.return_trip and max_stay_days < min_stay_days:
         raise typer.BadParameter("--max-stay must be >= --min-stay")
 
@@ -256,19 +496,45 @@ def _run_search(
     if not departure_dates:
         raise typer.BadParameter("Empty date range")
 
-    if trip == TripType.one_way:
-        planned_requests = len(departure_dates)
+    outbound_dates: list[date] = []
+    inbound_dates: list[date] = []
+    if compose_one_way:
+        outbound_dates, inbound_dates = _compose_dates(
+            departure_dates=departure_dates,
+            end_date=end_date,
+            min_stay_days=min_stay_days,
+            max_stay_days=max_stay_days,
+        )
+        # At most every composable return pair gets validated, however high --validate-top is.
+        validate_top = min(
+            validate_top,
+            _plan_requests(
+                trip=TripType.return_trip,
+                departure_dates=outbound_dates,
+                end_date=end_date,
+                min_stay_days=min_stay_days,
+                max_stay_days=max_stay_days,
+            ),
+        )
+        planned_requests = len(outbound_dates) + len(inbound_dates) + validate_top
     else:
-        planned_requests = 0
-        for departure_date in departure_dates:
-            earliest_return = departure_date + timedelta(days=min_stay_days)
-            latest_return = min(end_date, departure_date + timedelta(days=max_stay_days))
-            planned_requests += max(0, (latest_return - earliest_return).days + 1)
+        planned_requests = _plan_requests(
+            trip=trip,
+            departure_dates=departure_dates,
+            end_date=end_date,
+            min_stay_days=min_stay_days,
+            max_stay_days=max_stay_days,
+        )
 
-    if planned_requests > max_requests and not force:
+    # Anytime and refine searches spend --max-requests as a budget instead of refusing the plan.
+    total_pairs = planned_requests
+    if anytime or refine:
+        planned_requests = min(planned_requests, max_requests)
+    elif planned_requests > max_requests and not force:
         raise typer.BadParameter(
             f"Planned {planned_requests} API requests (> {max_requests}). "
-            "Narrow the date range / stay window, raise --max-requests, or pass --force."
+            "Narrow the date range / stay window, raise --max-requests, pass --anytime or --strategy refine, "
+            "or pass --force."
         )
 
     if remember:
@@ -290,21 +556,70 @@ def _run_search(
         )
 
     if dry_run:
-        typer.echo(json.dumps({"planned_requests": planned_requests, "trip": trip.value}, indent=2))
+        plan: dict[str, Any] = {"planned_requests": planned_requests, "trip": trip.value}
+        if anytime:
+            plan["anytime"] = {"pairs": total_pairs, "request_budget": max_requests, "time_budget": time_budget}
+        if refine:
+            # The refined request count depends on the prices, so only the upper bound is known.
+            plan["refine"] = {"pairs": total_pairs, "request_budget": max_requests, "step": refine_step}
+        if compose_one_way:
+            plan["compose_one_way"] = {
+                "outbound": len(outbound_dates),
+                "inbound": len(inbound_dates),
+                "validate": validate_top,
+            }
+        typer.echo(json.dumps(plan, indent=2))
         return
 
-    client = Client()
+    engine = _new_engine()
+    sink = _open_sink(output, export)
+    from amadeus import ResponseError
+
+    matrix = (
+        PriceMatrix(
+            origin=origin,
+            destination=destination,
+            currency=currency,
+            start_date=start_date,
+            days=len(departure_dates),
+            min_stay=min_stay_days,
+            max_stay=max_stay_days,
+            pruned=prune,
+        )
+        if trip == TripType.return_trip
+        else None
+    )
+    prior_matrix: Optional[PriceMatrix] = None
+    if anytime and matrix is not None:
+        try:
+            prior_matrix = PriceMatrix.load(matrix_path or _matrix_path(origin, destination, currency))
+        except (OSError, ValueError):
+            prior_matrix = None
+        if prior_matrix is not None and prior_matrix.pruned:
+            # Only prices under an old cutoff survived pruning: they would skew the model and leave gaps
+            typer.echo("Note: the saved price matrix was pruned (--prune); not using it as a prior", err=True)
+            prior_matrix = None
+    queue: Optional[AnytimeQueue] = None
+    sampler: Optional[RefineSampler] = None
+    stopped_by = "done"
 
     best: Optional[CheapestResult] = None
-    top: list[CheapestResult] = []
+    top = TopN(top_n, keep_offers=keep_offers)
     completed = 0
     errors = 0
+    prune_stats = PruneStats(max_offers) if prune else None
+
+    def prune_cutoff() -> Optional[Decimal]:
+        if not top_n:
+            return best.total_price if best is not None else None
+        return top.cutoff
 
     def consider_result(
         departure_date: date,
         return_date: Optional[date],
         price: Decimal,
         offer: dict[str, Any],
+        composed: bool = False,
     ) -> None:
         nonlocal best
         result = CheapestResult(
@@ -316,9 +631,13 @@ def _run_search(
             return_date=return_date,
             total_price=price,
             raw_offer=offer,
+            composed=composed,
         )
+        sink.write(result)
+        if matrix is not None and return_date is not None:
+            matrix.set(departure_date, return_date, price)
         is_new_best = best is None or result.total_price < best.total_price
-        made_top = _update_top_n(top, result, top_n)
+        made_top = top.push(result)
 
         if is_new_best:
             best = result
@@ -333,52 +652,168 @@ def _run_search(
                 style=style,
             )
 
-    label = "Searching dates"
-    requests_iter = _iter_requests(
-        trip=trip,
-        departure_dates=departure_dates,
-        end_date=end_date,
-        min_stay_days=min_stay_days,
-        max_stay_days=max_stay_days,
-    )
+    def fetch(
+        leg_origin: str,
+        leg_destination: str,
+        departure_date: date,
+        return_date: Optional[date],
+    ) -> tuple[Optional[Decimal], Optional[dict[str, Any]]]:
+        nonlocal completed, errors
+        query = _offer_query(
+            origin=leg_origin,
+            destination=leg_destination,
+            departure_date=departure_date,
+            return_date=return_date,
+            adults=adults,
+            currency=currency,
+            max_offers=max_offers,
+            nonstop=nonstop,
+            max_price=max_price_filter(prune_cutoff(), adults) if prune else None,
+        )
+        try:
+            price, offer = engine.cheapest(query, observe=_prune_observer(prune_stats, query))
+        except ResponseError as e:
+            price, offer = None, None
+            errors += 1
+            if verbose:
+                console.print(
+                    f"[red]API error for {leg_origin}->{leg_destination} "
+                    f"{_format_pair(departure_date, return_date)}: {e}[/red]",
+                )
+        completed += 1
+        _maybe_sleep(throttle_seconds)
+        return price, offer
 
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        MofNCompleteColumn(),
-        TimeRemainingColumn(),
-        console=console,
-    ) as progress:
+    label = "Searching dates"
+    with sink, _progress() as progress:
         task_id = progress.add_task(label, total=planned_requests)
-        
-        for departure_date, return_date in requests_iter:
-            kwargs: dict[str, Any] = dict(
-                originLocationCode=origin,
-                destinationLocationCode=destination,
-                departureDate=departure_date.isoformat(),
-                adults=adults,
-                currencyCode=currency,
-                max=max_offers,
-            )
-            if return_date is not None:
-                kwargs["returnDate"] = return_date.isoformat()
-            if nonstop:
-                kwargs["nonStop"] = "true"
-            try:
-                price, offer = _cheapest_offer(client, **kwargs)
-                completed += 1
+
+        if compose_one_way:
+            outbound: dict[date, tuple[Decimal, dict[str, Any]]] = {}
+            inbound: dict[date, tuple[Decimal, dict[str, Any]]] = {}
+            progress.update(task_id, description="Outbound one-way")
+            for departure_date in outbound_dates:
+                price, offer = fetch(origin, destination, departure_date, None)
                 if price is not None and offer is not None:
-                    consider_result(departure_date, return_date, price, offer)
-            except ResponseError as e:
-                completed += 1
-                errors += 1
-                if verbose:
-                    console.print(
-                        f"[red]API error for {_format_pair(departure_date, return_date)}: {e}[/red]",
-                    )
-            _maybe_sleep(throttle_seconds)
-            progress.update(task_id, advance=1)
+                    outbound[departure_date] = (price, offer)
+                progress.update(task_id, advance=1)
+            progress.update(task_id, description="Inbound one-way")
+            for return_date in inbound_dates:
+                price, offer = fetch(destination, origin, return_date, None)
+                if price is not None and offer is not None:
+                    inbound[return_date] = (price, offer)
+                progress.update(task_id, advance=1)
+
+            composed = sorted(
+                _compose_return_pairs(
+                    outbound,
+                    inbound,
+                    end_date=end_date,
+                    min_stay_days=min_stay_days,
+                    max_stay_days=max_stay_days,
+                ),
+                key=lambda c: c[2],
+            )
+
+            # Two one-way tickets are bookable on their own, so a validated pair keeps
+            # whichever of the composed and the round-trip fare is cheaper.
+            validated: dict[tuple[date, date], tuple[Decimal, dict[str, Any]]] = {}
+            if validate_top:
+                progress.update(task_id, description="Validating round trips")
+                for departure_date, return_date, _, _ in composed[:validate_top]:
+                    price, offer = fetch(origin, destination, departure_date, return_date)
+                    if price is not None and offer is not None:
+                        validated[(departure_date, return_date)] = (price, offer)
+                    progress.update(task_id, advance=1)
+                # Fewer pairs than --validate-top means fewer requests than planned.
+                progress.update(task_id, total=completed)
+
+            for departure_date, return_date, price, offer in composed:
+                round_trip = validated.get((departure_date, return_date))
+                if round_trip is not None and round_trip[0] <= price:
+                    consider_result(departure_date, return_date, round_trip[0], round_trip[1])
+                else:
+                    consider_result(departure_date, return_date, price, offer, composed=True)
+        else:
+            requests_iter = _iter_requests(
+                trip=trip,
+                departure_dates=departure_dates,
+                end_date=end_date,
+                min_stay_days=min_stay_days,
+                max_stay_days=max_stay_days,
+            )
+            if anytime:
+                queue = AnytimeQueue(requests_iter, PriceModel.from_matrix(prior_matrix))
+                deadline = time.monotonic() + time_budget if time_budget else None
+                progress.update(task_id, description="Searching dates (cheapest expected first)")
+                while queue:
+                    if completed >= max_requests:
+                        stopped_by = "requests"
+                        break
+                    if deadline is not None and time.monotonic() >= deadline:
+                        stopped_by = "time"
+                        break
+                    departure_date, return_date = queue.pop()
+                    price, offer = fetch(origin, destination, departure_date, return_date)
+                    if price is not None and offer is not None:
+                        queue.observe((departure_date, return_date), float(price))
+                        consider_result(departure_date, return_date, price, offer)
+                    progress.update(task_id, advance=1)
+            elif refine:
+                sampler = RefineSampler(requests_iter, step=refine_step)
+                progress.update(task_id, description=f"Sampling every {refine_step} days")
+                batch = sampler.next_batch()
+                while batch:
+                    for departure_date, return_date in batch:
+                        if completed >= max_requests:
+                            stopped_by = "requests"
+                            break
+                        price, offer = fetch(origin, destination, departure_date, return_date)
+                        sampler.observe((departure_date, return_date), float(price) if price is not None else None)
+                        if price is not None and offer is not None:
+                            consider_result(departure_date, return_date, price, offer)
+                        progress.update(task_id, advance=1)
+                    if stopped_by != "done":
+                        break
+                    progress.update(task_id, description="Refining around the cheapest dates")
+                    batch = sampler.next_batch()
+                progress.update(task_id, total=completed)
+            else:
+                for departure_date, return_date in requests_iter:
+                    price, offer = fetch(origin, destination, departure_date, return_date)
+                    if price is not None and offer is not None:
+                        consider_result(departure_date, return_date, price, offer)
+                    progress.update(task_id, advance=1)
+
+    if matrix is not None and prior_matrix is not None:
+        # A capped anytime run prices only part of the grid; keep earlier prices for the rest.
+        matrix.fill_missing(prior_matrix)
+    saved_matrix = _save_matrix(matrix, matrix_path)
+
+    anytime_info: Optional[dict[str, Any]] = None
+    if queue is not None:
+        anytime_info = {"pairs": total_pairs, "priced": total_pairs - len(queue), "stopped_by": stopped_by}
+        if not queue:
+            anytime_info.update(confidence="exact", note=f"All {total_pairs} pairs priced; the result is exact.")
+        elif best is not None:
+            expected = queue.expected_better(float(best.total_price))
+            confidence = "high" if expected < 0.5 else "medium" if expected < 2 else "low"
+            anytime_info.update(
+                expected_better=round(expected, 2),
+                confidence=confidence,
+                note=(
+                    f"Priced {total_pairs - len(queue)}/{total_pairs} pairs, cheapest expected first; "
+                    f"~{expected:.1f} unpriced pairs are expected to beat the best ({confidence} confidence)."
+                ),
+            )
+
+    refine_info: Optional[dict[str, Any]] = None
+    if sampler is not None:
+        refine_info = {"pairs": total_pairs, "priced": len(sampler.prices), "stopped_by": stopped_by}
+        refine_info["note"] = (
+            f"Refined search priced {len(sampler.prices)}/{total_pairs} pairs"
+            + (" (stopped at --max-requests)." if stopped_by == "requests" else ".")
+        )
 
     if best is None:
         typer.echo(
@@ -394,7 +829,8 @@ def _run_search(
                 indent=2,
             )
             if json_output
-            else "No flights found for the given criteria."
+            else "No flights found for the given criteria.",
+            err=sink.to_stdout,
         )
         raise typer.Exit(code=2)
 
@@ -407,23 +843,35 @@ def _run_search(
         "departure_date": best.departure_date.isoformat(),
         "return_date": best.return_date.isoformat() if best.return_date else None,
         "total_price": str(best.total_price),
+        "composed": best.composed,
         "requests": {"planned": planned_requests, "completed": completed, "errors": errors},
     }
+    if saved_matrix is not None:
+        payload["matrix"] = str(saved_matrix)
+    if anytime_info is not None:
+        payload["anytime"] = anytime_info
+    if refine_info is not None:
+        payload["refine"] = refine_info
+    if prune_stats is not None:
+        payload["pruning"] = prune_stats.to_json()
+    transport_stats = engine.transport_stats()
+    if transport_stats is not None:
+        payload["transport"] = transport_stats
+    ranked = top.results()
     if top_n > 0:
-        payload["top"] = [
-            {
-                "departure_date": r.departure_date.isoformat(),
-                "return_date": r.return_date.isoformat() if r.return_date else None,
-                "total_price": str(r.total_price),
-                "offer_id": r.raw_offer.get("id"),
-            }
-            for r in top[:top_n]
-        ]
+        payload["top"] = []
+        for i, r in enumerate(ranked):
+            entry = _result_json(r)
+            if i < top.keep_offers:
+                entry["offer"] = r.raw_offer
+            payload["top"].append(entry)
 
     if json_output:
-        typer.echo(json.dumps(payload, indent=2))
+        typer.echo(json.dumps(payload, indent=2), err=sink.to_stdout)
     else:
-        _print_top_n(top, top_n=top_n)
+        from rich.panel import Panel
+
+        _print_top_n(ranked, top_n=top_n)
         
         result_text = ""
         if best.return_date:
@@ -431,7 +879,8 @@ def _run_search(
                 f"Best return: {best.origin}->{best.destination}\n"
                 f"{best.departure_date} / {best.return_date}\n"
                 f"[bold green]= {best.total_price} {best.currency}[/bold green]\n"
-                f"({completed}/{planned_requests} requests, {errors} errors)"
+                + ("(two one-way tickets)\n" if best.composed else "")
+                + f"({completed}/{planned_requests} requests, {errors} errors)"
             )
         else:
             result_text = (
@@ -441,9 +890,440 @@ def _run_search(
                 f"({completed}/{planned_requests} requests, {errors} errors)"
             )
         
+        for info in (anytime_info, refine_info):
+            if info is not None and "note" in info:
+                result_text += f"\n[dim]{info['note']}[/dim]"
+        if prune_stats is not None:
+            result_text += f"\n[dim]{prune_stats.summary()}[/dim]"
+        if verbose and transport_stats is not None:
+            result_text += f"\n[dim]{_transport_summary(transport_stats)}[/dim]"
         console.print(Panel(result_text, title="Search Complete", border_style="green", expand=False))
 
 
+def _run_sweep(
+    *,
+    routes: list[tuple[str, str]],
+    start_date: date,
+    end_date: date,
+    trip: TripType,
+    min_stay_days: int,
+    max_stay_days: int,
+    adults: int,
+    currency: str,
+    nonstop: bool,
+    max_offers: int,
+    workers: int,
+    rate: float,
+    max_requests: int,
+    force: bool,
+    json_output: bool,
+    verbose: bool,
+    dry_run: bool,
+    top_n: int,
+    output: Optional[str] = None,
+    export: Optional[Path] = None,
+    strategy: Strategy = Strategy.exhaustive,
+    refine_step: int = 3,
+    prune: bool = False,
+) -> None:
+    _check_export(export)
+
+    if not routes:
+        raise typer.BadParameter("No routes given. Use --route, --routes-file or --origins/--destinations")
+    if trip == TripType.return_trip and max_stay_days < min_stay_days:
+        raise typer.BadParameter("--max-stay must be >= --min-stay")
+
+    departure_dates = list(_iter_dates(start_date, end_date))
+    if not departure_dates:
+        raise typer.BadParameter("Empty date range")
+
+    per_route = _plan_requests(
+        trip=trip,
+        departure_dates=departure_dates,
+        end_date=end_date,
+        min_stay_days=min_stay_days,
+        max_stay_days=max_stay_days,
+    )
+    planned_requests = per_route * len(routes)
+    refine = strategy == Strategy.refine
+    total_pairs = planned_requests
+
+    if refine:
+        planned_requests = min(planned_requests, max_requests)
+    elif planned_requests > max_requests and not force:
+        raise typer.BadParameter(
+            f"Planned {planned_requests} API requests across {len(routes)} routes (> {max_requests}). "
+            "Narrow the routes / date range / stay window, raise --max-requests, pass --strategy refine, "
+            "or pass --force."
+        )
+
+    if dry_run:
+        typer.echo(
+            json.dumps(
+                {
+                    "planned_requests": planned_requests,
+                    "routes": len(routes),
+                    "per_route": per_route,
+                    "trip": trip.value,
+                    **({"refine": {"pairs": total_pairs, "step": refine_step}} if refine else {}),
+                },
+                indent=2,
+            )
+        )
+        return
+
+    # One client (one OAuth token) and one rate budget shared by every route.
+    engine = _new_engine(rate=rate)
+    sink = _open_sink(output, export)
+    from amadeus import ResponseError
+
+    prune_stats = PruneStats(max_offers) if prune else None
+    # Rebound by the main thread after every result, so workers never see a heap mid-update.
+    cutoff: Optional[Decimal] = None
+
+    pairs = list(
+        _iter_requests(
+            trip=trip,
+            departure_dates=departure_dates,
+            end_date=end_date,
+            min_stay_days=min_stay_days,
+            max_stay_days=max_stay_days,
+        )
+    )
+
+    def tasks() -> Iterable[tuple[str, str, date, Optional[date]]]:
+        # Interleave routes date by date so partial results cover the whole matrix.
+        for departure_date, return_date in pairs:
+            for route_origin, route_destination in routes:
+                yield route_origin, route_destination, departure_date, return_date
+
+    def price(task: tuple[str, str, date, Optional[date]]) -> tuple[Optional[Decimal], Optional[dict[str, Any]]]:
+        route_origin, route_destination, departure_date, return_date = task
+        query = _offer_query(
+            origin=route_origin,
+            destination=route_destination,
+            departure_date=departure_date,
+            return_date=return_date,
+            adults=adults,
+            currency=currency,
+            max_offers=max_offers,
+            nonstop=nonstop,
+            max_price=max_price_filter(cutoff, adults) if prune else None,
+        )
+        return engine.cheapest(query, observe=_prune_observer(prune_stats, query))
+
+    top = TopN(top_n)
+    matrices: dict[tuple[str, str], PriceMatrix] = {}
+    route_best: dict[tuple[str, str], CheapestResult] = {}
+    best: Optional[CheapestResult] = None
+    completed = 0
+    errors = 0
+
+    def handle(
+        task: tuple[str, str, date, Optional[date]],
+        outcome: Optional[tuple[Optional[Decimal], Optional[dict[str, Any]]]],
+        error: Optional[Exception],
+    ) -> Optional[Decimal]:
+        nonlocal best, completed, errors, cutoff
+        route_origin, route_destination, departure_date, return_date = task
+        completed += 1
+        if error is not None:
+            if not isinstance(error, ResponseError):
+                raise error
+            errors += 1
+            if verbose:
+                console.print(
+                    f"[red]API error for {route_origin}->{route_destination} "
+                    f"{_format_pair(departure_date, return_date)}: {error}[/red]",
+                )
+            return None
+        total_price, offer = outcome or (None, None)
+        if total_price is None or offer is None:
+            return None
+
+        result = CheapestResult(
+            origin=route_origin,
+            destination=route_destination,
+            currency=currency,
+            trip_type=trip,
+            departure_date=departure_date,
+            return_date=return_date,
+            total_price=total_price,
+            raw_offer=offer,
+        )
+        sink.write(result)
+        top.push(result)
+        if return_date is not None:
+            route_matrix = matrices.get((route_origin, route_destination))
+            if route_matrix is None:
+                route_matrix = matrices[(route_origin, route_destination)] = PriceMatrix(
+                    origin=route_origin,
+                    destination=route_destination,
+                    currency=currency,
+                    start_date=start_date,
+                    days=len(departure_dates),
+                    min_stay=min_stay_days,
+                    max_stay=max_stay_days,
+                    pruned=prune,
+                )
+            route_matrix.set(departure_date, return_date, total_price)
+        current = route_best.get((route_origin, route_destination))
+        if current is None or result.total_price < current.total_price:
+            route_best[(route_origin, route_destination)] = replace(result, raw_offer=compact_offer(offer))
+        if best is None or result.total_price < best.total_price:
+            best = route_best[(route_origin, route_destination)]
+            console.print(
+                f"[bold green]New best:[/bold green] {result.total_price} {result.currency} "
+                f"{route_origin}->{route_destination} ({_format_pair(departure_date, return_date)})"
+            )
+        cutoff = top.cutoff if top_n else best.total_price
+        return total_price
+
+    with sink, _progress() as progress:
+        task_id = progress.add_task(f"Sweeping {len(routes)} routes", total=planned_requests)
+        if refine:
+            # Every route refines independently; each round's batches share the pool and rate budget.
+            samplers = {(o, d): RefineSampler(pairs, step=refine_step) for o, d in routes}
+            while completed < max_requests:
+                batch = [(o, d, *pair) for (o, d), sampler in samplers.items() for pair in sampler.next_batch()]
+                if not batch:
+                    break
+                for task, outcome, error in engine.run(batch[: max_requests - completed], price, workers=workers):
+                    total_price = handle(task, outcome, error)
+                    samplers[(task[0], task[1])].observe(
+                        (task[2], task[3]), float(total_price) if total_price is not None else None
+                    )
+                    progress.update(task_id, advance=1)
+            progress.update(task_id, total=completed)
+        else:
+            for task, outcome, error in engine.run(tasks(), price, workers=workers):
+                handle(task, outcome, error)
+                progress.update(task_id, advance=1)
+
+    for route_matrix in matrices.values():
+        _save_matrix(route_matrix)
+
+    transport_stats = engine.transport_stats()
+    requests_info: dict[str, Any] = {"planned": planned_requests, "completed": completed, "errors": errors}
+    if refine:
+        requests_info["exhaustive"] = total_pairs
+    per_route_best = sorted(route_best.values(), key=lambda r: r.total_price)
+
+    if json_output:
+        typer.echo(
+            json.dumps(
+                {
+                    "found": best is not None,
+                    "trip": trip.value,
+                    "currency": currency,
+                    "best": _result_json(best, with_route=True) if best else None,
+                    "routes": [
+                        {
+                            "origin": o,
+                            "destination": d,
+                            "best": _result_json(route_best[(o, d)]) if (o, d) in route_best else None,
+                        }
+                        for o, d in routes
+                    ],
+                    "top": [_result_json(r, with_route=True) for r in top.results()],
+                    "requests": requests_info,
+                    **({"pruning": prune_stats.to_json()} if prune_stats is not None else {}),
+                    **({"transport": transport_stats} if transport_stats is not None else {}),
+                },
+                indent=2,
+            ),
+            err=sink.to_stdout,
+        )
+    elif best is not None:
+        from rich.panel import Panel
+
+        _print_top_n(top.results(), top_n=top_n, show_route=True)
+        _print_top_n(
+            per_route_best,
+            top_n=len(per_route_best),
+            show_route=True,
+            title=f"Best per route ({len(per_route_best)}/{len(routes)} routes priced)",
+        )
+        console.print(
+            Panel(
+                f"Best overall: {best.origin}->{best.destination}\n"
+                f"{_format_pair(best.departure_date, best.return_date)}\n"
+                f"[bold green]= {best.total_price} {best.currency}[/bold green]\n"
+                f"({completed}/{planned_requests} requests, {errors} errors)"
+                + (f"\n[dim]{prune_stats.summary()}[/dim]" if prune_stats is not None else "")
+                + (f"\n[dim]{_transport_summary(transport_stats)}[/dim]" if verbose and transport_stats else ""),
+                title="Sweep Complete",
+                border_style="green",
+                expand=False,
+            )
+        )
+    else:
+        typer.echo("No flights found for the given criteria.", err=sink.to_stdout)
+
+    if best is None:
+        raise typer.Exit(code=2)
+
+
+def _run_alert_hook(command: str, result: CheapestResult, previous_price: float) -> None:
+    import subprocess
+
+    env = {
+        **os.environ,
+        "FLIGHT_ORIGIN": result.origin,
+        "FLIGHT_DESTINATION": result.destination,
+        "FLIGHT_DEPARTURE_DATE": result.departure_date.isoformat(),
+        "FLIGHT_RETURN_DATE": result.return_date.isoformat() if result.return_date else "",
+        "FLIGHT_PRICE": str(result.total_price),
+        "FLIGHT_PREVIOUS_PRICE": f"{previous_price:.2f}",
+        "FLIGHT_CURRENCY": result.currency,
+    }
+    try:
+        subprocess.run(command, shell=True, env=env, check=False, timeout=60)
+    except (OSError, subprocess.SubprocessError) as e:
+        console.print(f"[red]Alert command failed: {e}[/red]")
+
+
+def _run_watch(
+    *,
+    origin: str,
+    destination: str,
+    start_date: date,
+    end_date: date,
+    trip: TripType,
+    min_stay_days: int,
+    max_stay_days: int,
+    adults: int,
+    currency: str,
+    nonstop: bool,
+    max_offers: int,
+    budget_per_hour: float,
+    hot_interval_minutes: float,
+    cold_interval_minutes: float,
+    max_checks: int,
+    alert_below: Optional[Decimal],
+    on_alert: Optional[str],
+    state_path: Optional[Path],
+    verbose: bool,
+) -> None:
+    if trip == TripType.return_trip and max_stay_days < min_stay_days:
+        raise typer.BadParameter("--max-stay must be >= --min-stay")
+
+    pairs = list(
+        _iter_requests(
+            trip=trip,
+            departure_dates=list(_iter_dates(start_date, end_date)),
+            end_date=end_date,
+            min_stay_days=min_stay_days,
+            max_stay_days=max_stay_days,
+        )
+    )
+    if not pairs:
+        raise typer.BadParameter("Empty date range")
+
+    path = state_path or _watch_path(origin, destination, currency, trip)
+    planner = WatchPlanner(
+        pairs,
+        hot_interval=hot_interval_minutes * 60,
+        cold_interval=cold_interval_minutes * 60,
+        states=load_states(path),
+    )
+    meta = {"origin": origin, "destination": destination, "currency": currency, "trip": trip.value}
+
+    engine = _new_engine()
+    from amadeus import ResponseError
+
+    spacing = 3600.0 / budget_per_hour
+    next_slot = time.monotonic()
+    checks = 0
+    alerts = 0
+    console.print(
+        f"Watching {origin}->{destination}: {len(pairs)} date pairs, "
+        f"budget {budget_per_hour:g} requests/hour (Ctrl-C to stop)"
+    )
+
+    try:
+        while max_checks <= 0 or checks < max_checks:
+            # Departed pairs can be neither checked nor booked, so they drop out of the warm-up and the best price.
+            today = date.today()
+            due = planner.next_due(today=today)
+            if due is None:
+                console.print("All watched departure dates are in the past.")
+                break
+            pair, due_at = due
+            wait = max(due_at - time.time(), next_slot - time.monotonic(), 0.0)
+            if wait > 0:
+                if verbose:
+                    console.print(f"[dim]Next check {_format_pair(*pair)} in {wait:.0f}s[/dim]")
+                time.sleep(wait)
+            next_slot = time.monotonic() + spacing
+
+            departure_date, return_date = pair
+            query = _offer_query(
+                origin=origin,
+                destination=destination,
+                departure_date=departure_date,
+                return_date=return_date,
+                adults=adults,
+                currency=currency,
+                max_offers=max_offers,
+                nonstop=nonstop,
+            )
+            checks += 1
+            try:
+                price, offer = engine.cheapest(query)
+            except ResponseError as e:
+                # Keep the last known price but push the pair back so errors don't hot-loop.
+                planner.states[pair].checked_at = time.time()
+                console.print(f"[red]API error for {_format_pair(departure_date, return_date)}: {e}[/red]")
+                continue
+
+            warmed_up = planner.warmed_up(today=today)
+            previous_price = planner.record(pair, float(price) if price is not None else None, time.time(), today=today)
+            save_states(path, planner, meta)
+
+            if previous_price is None or price is None or offer is None:
+                if verbose:
+                    shown = f"{price} {currency}" if price is not None else "no offers"
+                    console.print(f"[dim]Checked {_format_pair(departure_date, return_date)}: {shown}[/dim]")
+                continue
+            if not warmed_up:
+                console.print(
+                    f"[bold green]Best so far:[/bold green] {price} {currency} "
+                    f"({_format_pair(departure_date, return_date)})"
+                )
+                continue
+            if alert_below is not None and price > alert_below:
+                continue
+
+            alerts += 1
+            result = CheapestResult(
+                origin=origin,
+                destination=destination,
+                currency=currency,
+                trip_type=trip,
+                departure_date=departure_date,
+                return_date=return_date,
+                total_price=price,
+                raw_offer=compact_offer(offer),
+            )
+            console.bell()
+            console.print(
+                f"[bold green]Price drop:[/bold green] {price} {currency} (was {previous_price:.2f}) "
+                f"{origin}->{destination} {_format_pair(departure_date, return_date)}"
+            )
+            if on_alert:
+                _run_alert_hook(on_alert, result, previous_price)
+    except KeyboardInterrupt:
+        console.print("Stopped.")
+
+    best = planner.best(today=date.today())
+    summary = f"{checks} checks, {alerts} alerts"
+    if best is not None:
+        (best_departure, best_return), best_price = best
+        summary += f"; best {best_price:.2f} {currency} ({_format_pair(best_departure, best_return)})"
+    console.print(summary)
+
+
 @app.callback()
 def main(ctx: typer.Context) -> None:
     """Interactive mode when no subcommand is provided."""
@@ -518,6 +1398,12 @@ def main(ctx: typer.Context) -> None:
     )
 
 
+def _report_profile(profiler: Profiler, path: Path) -> None:
+    err = Console(stderr=True)
+    err.print(profiler.report(), markup=False, highlight=False, soft_wrap=True)
+    err.print(f"Profile saved to {profiler.dump(path)} (browse it with python -m pstats {path})", markup=False, soft_wrap=True)
+
+
 @app.command()
 def search(
     origin: Optional[str] = typer.Argument(None, help="Origin IATA airport code (e.g. LHR)."),
@@ -540,6 +1426,67 @@ def search(
     top_n: int = typer.Option(5, "--top", min=0, help="Show the top N results (runner-ups)."),
     remember: bool = typer.Option(True, "--remember/--no-remember", help="Remember these choices as defaults."),
     dry_run: bool = typer.Option(False, "--dry-run", help="Print planned request count, do not call the API."),
+    compose_one_way: bool = typer.Option(
+        False,
+        "--compose-one-way",
+        help="Return trips: price one-way legs per date and combine them in memory instead of querying every pair.",
+    ),
+    validate_top: int = typer.Option(
+        0,
+        "--validate-top",
+        min=0,
+        help="With --compose-one-way, re-price the K cheapest combinations as real round trips.",
+    ),
+    keep_offers: int = typer.Option(
+        0,
+        "--keep-offers",
+        min=0,
+        help="Retain the full offer JSON for the N cheapest results (included in --json output).",
+    ),
+    output: Optional[str] = typer.Option(
+        None,
+        "--output",
+        help="Stream every priced pair as NDJSON to this file while searching ('-' for stdout).",
+    ),
+    export: Optional[Path] = typer.Option(
+        None,
+        "--export",
+        dir_okay=False,
+        help="Write the full price matrix when done (.csv, or .parquet with pyarrow installed).",
+    ),
+    matrix_path: Optional[Path] = typer.Option(
+        None,
+        "--matrix",
+        dir_okay=False,
+        help="Where to save the return-trip price matrix (default: .flight_price_cli_matrices/ in the repo root).",
+    ),
+    anytime: bool = typer.Option(
+        False,
+        "--anytime",
+        help="Price the pairs most likely to be cheap first and stop at --max-requests / --time-budget.",
+    ),
+    time_budget: Optional[float] = typer.Option(
+        None, "--time-budget", min=1.0, help="With --anytime, stop after this many seconds."
+    ),
+    strategy: Strategy = typer.Option(
+        Strategy.exhaustive,
+        "--strategy",
+        case_sensitive=False,
+        help="'refine' prices every --refine-step-th date first, then only the dates around the cheapest fares.",
+    ),
+    refine_step: int = typer.Option(3, "--refine-step", min=2, help="Initial sampling step for --strategy refine."),
+    prune: bool = typer.Option(
+        False,
+        "--prune",
+        help="Send the current top-N cutoff as maxPrice so dominated dates return small or empty responses "
+        "(those dates are then missing from --output/--export and the saved matrix).",
+    ),
+    profile: Optional[Path] = typer.Option(
+        None,
+        "--profile",
+        dir_okay=False,
+        help="Profile the search, save the stats to this file and print the hottest functions to stderr.",
+    ),
 ) -> None:
     """
     Searches all dates in [start, end] to find the cheapest one-way date or cheapest departure/return combo.
@@ -568,11 +1515,119 @@ def search(
         else typer.prompt("End date (YYYY-MM-DD)", default=state.get("end_date"), value_proc=_parse_date)
     )
 
-    _run_search(
-        origin=origin_code,
-        destination=destination_code,
-        start_date=start_date,
-        end_date=end_date,
+    profiler = Profiler() if profile is not None else None
+    try:
+        with profiler if profiler is not None else nullcontext():
+            _run_search(
+                origin=origin_code,
+                destination=destination_code,
+                start_date=start_date,
+                end_date=end_date,
+                trip=trip,
+                min_stay_days=min_stay_days,
+                max_stay_days=max_stay_days,
+                adults=adults,
+                currency=currency.strip().upper(),
+                nonstop=nonstop,
+                max_offers=max_offers,
+                throttle_seconds=throttle_seconds,
+                max_requests=max_requests,
+                force=force,
+                json_output=json_output,
+                verbose=verbose,
+                dry_run=dry_run,
+                top_n=top_n,
+                stream=stream,
+                remember=remember,
+                compose_one_way=compose_one_way,
+                validate_top=validate_top,
+                keep_offers=keep_offers,
+                output=output,
+                export=export,
+                matrix_path=matrix_path,
+                anytime=anytime,
+                time_budget=time_budget,
+                strategy=strategy,
+                refine_step=refine_step,
+                prune=prune,
+            )
+    finally:
+        if profiler is not None and profiler.stats is not None:
+            _report_profile(profiler, profile)
+
+
+@app.command()
+def sweep(
+    origins: list[str] = typer.Option([], "--origins", help="Origin IATA codes (repeat or comma-separate)."),
+    destinations: list[str] = typer.Option(
+        [], "--destinations", help="Destination IATA codes (repeat or comma-separate)."
+    ),
+    route: list[str] = typer.Option([], "--route", help="Explicit route, e.g. LHR-JFK (repeatable)."),
+    routes_file: Optional[Path] = typer.Option(
+        None,
+        "--routes-file",
+        exists=True,
+        dir_okay=False,
+        help="File with one ORIGIN DESTINATION route per line ('#' starts a comment).",
+    ),
+    start: str = typer.Option(..., "--start", help="Start date (YYYY-MM-DD)."),
+    end: str = typer.Option(..., "--end", help="End date (YYYY-MM-DD)."),
+    trip: TripType = typer.Option(TripType.return_trip, "--trip", case_sensitive=False),
+    min_stay_days: int = typer.Option(1, "--min-stay", min=0, help="Minimum stay length (return trips)."),
+    max_stay_days: int = typer.Option(14, "--max-stay", min=0, help="Maximum stay length (return trips)."),
+    adults: int = typer.Option(1, "--adults", min=1),
+    currency: str = typer.Option("USD", "--currency"),
+    nonstop: bool = typer.Option(False, "--nonstop", help="Only consider direct flights."),
+    max_offers: int = typer.Option(10, "--max-offers", min=1, help="Max offers per API response."),
+    workers: int = typer.Option(4, "--workers", min=1, help="Concurrent API requests."),
+    rate: float = typer.Option(
+        10.0, "--rate", min=0.0, help="Shared request budget in requests/second across all routes (0 = unlimited)."
+    ),
+    max_requests: int = typer.Option(1000, "--max-requests", min=1, help="Hard cap on API requests."),
+    force: bool = typer.Option(False, "--force", help="Allow exceeding --max-requests."),
+    json_output: bool = typer.Option(False, "--json", help="Output result as JSON."),
+    verbose: bool = typer.Option(False, "--verbose", help="Print API errors as they happen."),
+    top_n: int = typer.Option(10, "--top", min=0, help="Show the global top N results across routes."),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Print planned request count, do not call the API."),
+    output: Optional[str] = typer.Option(
+        None,
+        "--output",
+        help="Stream every priced pair as NDJSON to this file while searching ('-' for stdout).",
+    ),
+    export: Optional[Path] = typer.Option(
+        None,
+        "--export",
+        dir_okay=False,
+        help="Write the full price matrix when done (.csv, or .parquet with pyarrow installed).",
+    ),
+    strategy: Strategy = typer.Option(
+        Strategy.exhaustive,
+        "--strategy",
+        case_sensitive=False,
+        help="'refine' prices every --refine-step-th date first, then only the dates around the cheapest fares.",
+    ),
+    refine_step: int = typer.Option(3, "--refine-step", min=2, help="Initial sampling step for --strategy refine."),
+    prune: bool = typer.Option(
+        False,
+        "--prune",
+        help="Send the current top-N cutoff as maxPrice so dominated dates return small or empty responses "
+        "(those dates are then missing from --output/--export and the saved matrix).",
+    ),
+) -> None:
+    """
+    Searches many routes over the same date range with one client and one shared rate budget,
+    ranking results globally and per route.
+    """
+    routes = _load_routes(
+        origins=_parse_code_list(origins),
+        destinations=_parse_code_list(destinations),
+        routes=route,
+        routes_file=routes_file,
+    )
+    _run_sweep(
+        routes=routes,
+        start_date=_parse_date(start),
+        end_date=_parse_date(end),
         trip=trip,
         min_stay_days=min_stay_days,
         max_stay_days=max_stay_days,
@@ -580,13 +1635,171 @@ def search(
         currency=currency.strip().upper(),
         nonstop=nonstop,
         max_offers=max_offers,
-        throttle_seconds=throttle_seconds,
+        workers=workers,
+        rate=rate,
         max_requests=max_requests,
         force=force,
         json_output=json_output,
         verbose=verbose,
         dry_run=dry_run,
         top_n=top_n,
-        stream=stream,
-        remember=remember,
+        output=output,
+        export=export,
+        strategy=strategy,
+        refine_step=refine_step,
+        prune=prune,
+    )
+
+
+@app.command()
+def query(
+    origin: Optional[str] = typer.Argument(None, help="Origin IATA airport code of a saved matrix."),
+    destination: Optional[str] = typer.Argument(None, help="Destination IATA airport code of a saved matrix."),
+    currency: str = typer.Option("USD", "--currency"),
+    matrix_path: Optional[Path] = typer.Option(
+        None, "--matrix", exists=True, dir_okay=False, help="Price matrix file (overrides ORIGIN/DESTINATION)."
+    ),
+    start: Optional[str] = typer.Option(None, "--start", help="Earliest departure date (YYYY-MM-DD)."),
+    end: Optional[str] = typer.Option(None, "--end", help="Latest return date (YYYY-MM-DD)."),
+    min_stay_days: Optional[int] = typer.Option(None, "--min-stay", min=0, help="Minimum stay length."),
+    max_stay_days: Optional[int] = typer.Option(None, "--max-stay", min=0, help="Maximum stay length."),
+    depart_on: Optional[str] = typer.Option(None, "--depart-on", help="Departure weekdays, e.g. thu,fri."),
+    return_on: Optional[str] = typer.Option(None, "--return-on", help="Return weekdays, e.g. sun,mon."),
+    top_n: int = typer.Option(10, "--top", min=1, help="Show the top N results."),
+    heatmap: bool = typer.Option(False, "--heatmap", help="Render a calendar heatmap of the cheapest return per day."),
+    json_output: bool = typer.Option(False, "--json", help="Output result as JSON."),
+) -> None:
+    """
+    Re-ranks the price matrix saved by a previous return search under new constraints, without any API calls.
+    """
+    if matrix_path is None:
+        if not origin or not destination:
+            raise typer.BadParameter("Give ORIGIN and DESTINATION, or --matrix PATH")
+        matrix_path = _matrix_path(_parse_iata(origin), _parse_iata(destination), currency.strip().upper())
+    try:
+        matrix = PriceMatrix.load(matrix_path)
+    except FileNotFoundError as e:
+        raise typer.BadParameter(f"No saved price matrix at {matrix_path}; run a return search first") from e
+    except ValueError as e:
+        raise typer.BadParameter(str(e)) from e
+    if matrix.pruned:
+        typer.echo(
+            "Warning: this price matrix was saved by a --prune search; dates dearer than its cutoff "
+            "were not priced, so the cheapest dates under new constraints may be missing",
+            err=True,
+        )
+
+    try:
+        constraints: dict[str, Any] = dict(
+            min_stay=min_stay_days,
+            max_stay=max_stay_days,
+            start=_parse_date(start) if start else None,
+            end=_parse_date(end) if end else None,
+            departure_weekdays=parse_weekdays(depart_on),
+            return_weekdays=parse_weekdays(return_on),
+        )
+    except ValueError as e:
+        raise typer.BadParameter(str(e)) from e
+
+    ranked = matrix.cheapest(top_n, **constraints)
+    results = [
+        CheapestResult(
+            origin=matrix.origin,
+            destination=matrix.destination,
+            currency=matrix.currency,
+            trip_type=TripType.return_trip,
+            departure_date=departure_date,
+            return_date=return_date,
+            total_price=Decimal(f"{price:.2f}"),
+            raw_offer={},
+        )
+        for departure_date, return_date, price in ranked
+    ]
+
+    if json_output:
+        typer.echo(
+            json.dumps(
+                {
+                    "found": bool(results),
+                    "origin": matrix.origin,
+                    "destination": matrix.destination,
+                    "currency": matrix.currency,
+                    "priced_at": matrix.created_at.isoformat(),
+                    "pruned": matrix.pruned,
+                    "top": [_result_json(r) for r in results],
+                },
+                indent=2,
+            )
+        )
+    else:
+        if heatmap:
+            _print_heatmap(matrix, matrix.cheapest_by_departure(**constraints))
+        _print_top_n(results, top_n=top_n)
+        if results:
+            console.print(
+                f"[dim]{len(matrix)} saved prices from {matrix.start_date} to {matrix.end_date}, "
+                f"priced {matrix.created_at:%Y-%m-%d %H:%M} UTC[/dim]"
+            )
+    if not results:
+        if not json_output:
+            typer.echo("No saved prices match the given constraints.")
+        raise typer.Exit(code=2)
+
+
+@app.command()
+def watch(
+    origin: str = typer.Argument(..., help="Origin IATA airport code (e.g. LHR)."),
+    destination: str = typer.Argument(..., help="Destination IATA airport code (e.g. JFK)."),
+    start: str = typer.Option(..., "--start", help="Start date (YYYY-MM-DD)."),
+    end: str = typer.Option(..., "--end", help="End date (YYYY-MM-DD)."),
+    trip: TripType = typer.Option(TripType.return_trip, "--trip", case_sensitive=False),
+    min_stay_days: int = typer.Option(1, "--min-stay", min=0, help="Minimum stay length (return trips)."),
+    max_stay_days: int = typer.Option(14, "--max-stay", min=0, help="Maximum stay length (return trips)."),
+    adults: int = typer.Option(1, "--adults", min=1),
+    currency: str = typer.Option("USD", "--currency"),
+    nonstop: bool = typer.Option(False, "--nonstop", help="Only consider direct flights."),
+    max_offers: int = typer.Option(10, "--max-offers", min=1, help="Max offers per API response."),
+    budget_per_hour: float = typer.Option(60.0, "--budget", min=0.1, help="Maximum API requests per hour."),
+    hot_interval_minutes: float = typer.Option(
+        60.0, "--hot-interval", min=1.0, help="Re-check interval (minutes) for pairs at the best price."
+    ),
+    cold_interval_minutes: float = typer.Option(
+        720.0, "--cold-interval", min=1.0, help="Longest re-check interval (minutes), for pairs far above best."
+    ),
+    max_checks: int = typer.Option(0, "--max-checks", min=0, help="Stop after N checks (0 = run until Ctrl-C)."),
+    alert_below: Optional[float] = typer.Option(None, "--alert-below", help="Only alert when the new best is <= this price."),
+    on_alert: Optional[str] = typer.Option(
+        None,
+        "--on-alert",
+        help="Shell command to run on a price drop (FLIGHT_PRICE, FLIGHT_DEPARTURE_DATE, ... in its environment).",
+    ),
+    state_path: Optional[Path] = typer.Option(
+        None, "--state", dir_okay=False, help="Watch state file (default: .flight_price_cli_watch/ in the repo root)."
+    ),
+    verbose: bool = typer.Option(False, "--verbose", help="Print every check and wait."),
+) -> None:
+    """
+    Keeps re-pricing a route within a request budget, checking pairs near the current best most often,
+    and alerts when a new best price appears.
+    """
+    _run_watch(
+        origin=_parse_iata(origin),
+        destination=_parse_iata(destination),
+        start_date=_parse_date(start),
+        end_date=_parse_date(end),
+        trip=trip,
+        min_stay_days=min_stay_days,
+        max_stay_days=max_stay_days,
+        adults=adults,
+        currency=currency.strip().upper(),
+        nonstop=nonstop,
+        max_offers=max_offers,
+        budget_per_hour=budget_per_hour,
+        hot_interval_minutes=hot_interval_minutes,
+        cold_interval_minutes=cold_interval_minutes,
+        max_checks=max_checks,
+        alert_below=Decimal(str(alert_below)) if alert_below is not None else None,
+        on_alert=on_alert,
+        state_path=state_path,
+        verbose=verbose,
     )
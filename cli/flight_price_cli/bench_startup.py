@@ -0,0 +1,90 @@
+"""
+Cold-start benchmark for the CLI entry point.
+
+Runs `--help` and a `search --dry-run` in fresh interpreters, reports the median
+wall time of each, and fails if a module that should only load once a search
+really runs (Amadeus SDK, dotenv, rich progress/table/panel) was imported.
+Neither scenario needs Amadeus credentials.
+
+    python -m cli.flight_price_cli.bench_startup --runs 10 --max-ms 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+SEARCH_ONLY_MODULES = ("amadeus", "dotenv", "rich.progress", "rich.table", "rich.panel")
+# Typer renders --help with rich tables/panels itself, so only the search-time modules are checked there.
+SCENARIOS = {
+    "help": (["--help"], ("amadeus", "dotenv", "rich.progress")),
+    "dry-run": (
+        [
+            "search", "LHR", "JFK",
+            "--trip", "return",
+            "--start", "2026-01-10",
+            "--end", "2026-01-20",
+            "--no-remember",
+            "--dry-run",
+        ],
+        SEARCH_ONLY_MODULES,
+    ),
+}
+
+
+def _command(args: list[str], *extra: str) -> list[str]:
+    return [sys.executable, *extra, "-m", "cli.flight_price_cli", *args]
+
+
+def _time_once(args: list[str]) -> float:
+    started = time.perf_counter()
+    subprocess.run(_command(args), cwd=REPO_ROOT, check=True, capture_output=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def _heavy_imports(args: list[str], modules: tuple[str, ...]) -> list[str]:
+    proc = subprocess.run(
+        _command(args, "-X", "importtime"),
+        cwd=REPO_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    imported = {line.rsplit("|", 1)[-1].strip() for line in proc.stderr.splitlines() if "|" in line}
+    return sorted(m for m in imported if m in modules)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per scenario.")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if a median exceeds this.")
+    opts = parser.parse_args()
+
+    failed = False
+    report = {}
+    for name, (args, modules) in SCENARIOS.items():
+        _time_once(args)  # warm the bytecode cache; we measure interpreter + import cost, not compilation
+        timings = [_time_once(args) for _ in range(opts.runs)]
+        heavy = _heavy_imports(args, modules)
+        median = statistics.median(timings)
+        report[name] = {
+            "median_ms": round(median, 1),
+            "min_ms": round(min(timings), 1),
+            "max_ms": round(max(timings), 1),
+            "heavy_imports": heavy,
+        }
+        if heavy or (opts.max_ms is not None and median > opts.max_ms):
+            failed = True
+
+    print(json.dumps(report, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import csv
+import json
+import sys
+import tempfile
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from typing import IO, Any, Iterator, Optional
+
+from .results import CheapestResult
+
+PRICE_FIELDS = (
+    "origin",
+    "destination",
+    "trip",
+    "departure_date",
+    "return_date",
+    "stay_days",
+    "total_price",
+    "currency",
+    "offer_id",
+    "composed",
+)
+EXPORT_FORMATS = {".csv": "csv", ".parquet": "parquet"}
+PARQUET_BATCH_ROWS = 10_000
+
+
+def price_record(result: CheapestResult) -> dict[str, Any]:
+    """Flat, JSON-safe row for one priced (route, date pair)."""
+    return {
+        "origin": result.origin,
+        "destination": result.destination,
+        "trip": result.trip_type.value,
+        "departure_date": result.departure_date.isoformat(),
+        "return_date": result.return_date.isoformat() if result.return_date else None,
+        "stay_days": (result.return_date - result.departure_date).days if result.return_date else None,
+        "total_price": str(result.total_price),
+        "currency": result.currency,
+        "offer_id": result.raw_offer.get("id"),
+        "composed": result.composed,
+    }
+
+
+def export_format(path: Path) -> str:
+    fmt = EXPORT_FORMATS.get(path.suffix.lower())
+    if fmt is None:
+        raise ValueError(f"Unsupported export format {path.suffix!r} (use .csv or .parquet)")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)") from e
+    return fmt
+
+
+class PriceSink:
+    """
+    Streams every priced pair as NDJSON while a sweep runs.
+
+    Rows go to `output` ("-" for stdout) and are flushed per line so the stream can
+    be piped. When only a columnar `export` is requested, rows are spooled to a
+    temporary NDJSON file instead, and converted in a streaming pass on close, so
+    the full price matrix is never held in memory.
+    """
+
+    def __init__(self, output: Optional[str], export: Optional[Path]) -> None:
+        self.output = output
+        self.export = export
+        self.export_fmt = export_format(export) if export is not None else None
+        self.rows = 0
+        self._spool: Optional[IO[str]] = None
+        self._stream: Optional[IO[str]] = None
+        if output == "-":
+            self._stream = sys.stdout
+        elif output:
+            self._stream = open(output, "w", encoding="utf-8")
+        if export is not None and (self._stream is None or self._stream is sys.stdout):
+            self._spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+
+    def __enter__(self) -> PriceSink:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @property
+    def enabled(self) -> bool:
+        return self._stream is not None or self._spool is not None
+
+    @property
+    def to_stdout(self) -> bool:
+        return self.output == "-"
+
+    def write(self, result: CheapestResult) -> None:
+        if not self.enabled:
+            return
+        line = json.dumps(price_record(result), separators=(",", ":")) + "\n"
+        if self._stream is not None:
+            self._stream.write(line)
+            self._stream.flush()
+        if self._spool is not None:
+            self._spool.write(line)
+        self.rows += 1
+
+    def close(self) -> None:
+        source: Optional[IO[str]] = self._spool
+        if self._stream is not None and self._stream is not sys.stdout:
+            self._stream.close()
+            if source is None and self.output:
+                source = open(self.output, "r", encoding="utf-8")
+        if source is not None:
+            try:
+                source.seek(0)
+                if self.export is not None:
+                    _write_table(_iter_rows(source), self.export, self.export_fmt or "csv")
+            finally:
+                source.close()
+        self._spool = None
+        self._stream = None
+
+
+def _iter_rows(source: IO[str]) -> Iterator[dict[str, Any]]:
+    for line in source:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _write_table(rows: Iterator[dict[str, Any]], path: Path, fmt: str) -> None:
+    if fmt == "csv":
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=PRICE_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("origin", pa.string()),
+            ("destination", pa.string()),
+            ("trip", pa.string()),
+            ("departure_date", pa.date32()),
+            ("return_date", pa.date32()),
+            ("stay_days", pa.int16()),
+            ("total_price", pa.decimal128(12, 2)),
+            ("currency", pa.string()),
+            ("offer_id", pa.string()),
+            ("composed", pa.bool_()),
+        ]
+    )
+
+    def convert(row: dict[str, Any]) -> dict[str, Any]:
+        return {
+            **row,
+            "departure_date": date.fromisoformat(row["departure_date"]),
+            "return_date": date.fromisoformat(row["return_date"]) if row["return_date"] else None,
+            "total_price": Decimal(row["total_price"]).quantize(Decimal("0.01")),
+        }
+
+    with pq.ParquetWriter(str(path), schema) as writer:
+        batch: list[dict[str, Any]] = []
+        for row in rows:
+            batch.append(convert(row))
+            if len(batch) >= PARQUET_BATCH_ROWS:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
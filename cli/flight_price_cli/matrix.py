@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import sys
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+MAGIC = b"FPMX1\n"
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def parse_weekdays(value: Optional[str]) -> Optional[frozenset[int]]:
+    """'fri,sat' -> {4, 5}; None/empty means no weekday constraint."""
+    if not value:
+        return None
+    days: set[int] = set()
+    for part in value.split(","):
+        name = part.strip().lower()[:3]
+        if name not in WEEKDAYS:
+            raise ValueError(f"Unknown weekday {part.strip()!r} (use mon,tue,...,sun)")
+        days.add(WEEKDAYS.index(name))
+    return frozenset(days)
+
+
+class PriceMatrix:
+    """
+    Dense departure x stay-length grid of return prices for one route.
+
+    Row `i` is departure `start_date + i`, column `s` is a stay of `min_stay + s`
+    days. Prices live in a flat float64 `array` with NaN for cells that were not
+    priced (or had no offers), so a month-long sweep with a two-week stay window
+    is a few kilobytes and can be re-ranked offline without any API calls.
+
+    A `pruned` matrix comes from a search that sent `maxPrice` upstream, so its
+    NaN cells may just have been dearer than the cutoff at the time. Ranking it
+    under narrower constraints can therefore miss the cheapest pair in them.
+    """
+
+    def __init__(
+        self,
+        *,
+        origin: str,
+        destination: str,
+        currency: str,
+        start_date: date,
+        days: int,
+        min_stay: int,
+        max_stay: int,
+        prices: Optional[array] = None,
+        created_at: Optional[datetime] = None,
+        pruned: bool = False,
+    ) -> None:
+        self.origin = origin
+        self.destination = destination
+        self.currency = currency
+        self.start_date = start_date
+        self.days = days
+        self.min_stay = min_stay
+        self.max_stay = max_stay
+        self.n_stays = max_stay - min_stay + 1
+        self.prices = prices if prices is not None else array("d", [math.nan]) * (days * self.n_stays)
+        self.created_at = created_at or datetime.now(timezone.utc)
+        self.pruned = pruned
+        if len(self.prices) != self.days * self.n_stays:
+            raise ValueError("Price array does not match matrix dimensions")
+
+    @property
+    def end_date(self) -> date:
+        return self.start_date + timedelta(days=self.days - 1)
+
+    def __len__(self) -> int:
+        return sum(1 for p in self.prices if not math.isnan(p))
+
+    def _index(self, departure_date: date, return_date: date) -> Optional[int]:
+        row = (departure_date - self.start_date).days
+        col = (return_date - departure_date).days - self.min_stay
+        if 0 <= row < self.days and 0 <= col < self.n_stays:
+            return row * self.n_stays + col
+        return None
+
+    def set(self, departure_date: date, return_date: date, price: Decimal | float) -> None:
+        """Record a price, keeping the cheaper one if the cell is already filled."""
+        i = self._index(departure_date, return_date)
+        if i is None:
+            return
+        value = float(price)
+        current = self.prices[i]
+        if math.isnan(current) or value < current:
+            self.prices[i] = value
+
+    def fill_missing(self, other: PriceMatrix) -> int:
+        """Copy prices for cells this matrix has not priced from another matrix of the same route."""
+        filled = 0
+        for departure_date, return_date, price in other.cells():
+            if self._index(departure_date, return_date) is not None and self.get(departure_date, return_date) is None:
+                self.set(departure_date, return_date, price)
+                filled += 1
+        return filled
+
+    def get(self, departure_date: date, return_date: date) -> Optional[float]:
+        i = self._index(departure_date, return_date)
+        if i is None or math.isnan(self.prices[i]):
+            return None
+        return self.prices[i]
+
+    def cells(
+        self,
+        *,
+        min_stay: Optional[int] = None,
+        max_stay: Optional[int] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        departure_weekdays: Optional[frozenset[int]] = None,
+        return_weekdays: Optional[frozenset[int]] = None,
+    ) -> Iterator[tuple[date, date, float]]:
+        """Priced (departure, return, price) cells that satisfy the constraints."""
+        lo = max(0, (min_stay if min_stay is not None else self.min_stay) - self.min_stay)
+        hi = min(self.n_stays - 1, (max_stay if max_stay is not None else self.max_stay) - self.min_stay)
+        first = max(0, (start - self.start_date).days) if start else 0
+        last = min(self.days - 1, (end - self.start_date).days) if end else self.days - 1
+        prices = self.prices
+        for row in range(first, last + 1):
+            departure_date = self.start_date + timedelta(days=row)
+            if departure_weekdays is not None and departure_date.weekday() not in departure_weekdays:
+                continue
+            base = row * self.n_stays
+            for col in range(lo, hi + 1):
+                price = prices[base + col]
+                if math.isnan(price):
+                    continue
+                return_date = departure_date + timedelta(days=self.min_stay + col)
+                if end is not None and return_date > end:
+                    break
+                if return_weekdays is not None and return_date.weekday() not in return_weekdays:
+                    continue
+                yield departure_date, return_date, price
+
+    def cheapest(self, n: int, **constraints: Any) -> list[tuple[date, date, float]]:
+        return heapq.nsmallest(n, self.cells(**constraints), key=lambda c: (c[2], c[0], c[1]))
+
+    def cheapest_by_departure(self, **constraints: Any) -> dict[date, float]:
+        best: dict[date, float] = {}
+        for departure_date, _, price in self.cells(**constraints):
+            if departure_date not in best or price < best[departure_date]:
+                best[departure_date] = price
+        return best
+
+    def header(self) -> dict[str, Any]:
+        return {
+            "origin": self.origin,
+            "destination": self.destination,
+            "currency": self.currency,
+            "start_date": self.start_date.isoformat(),
+            "days": self.days,
+            "min_stay": self.min_stay,
+            "max_stay": self.max_stay,
+            "created_at": self.created_at.isoformat(),
+            "pruned": self.pruned,
+        }
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = array("d", self.prices)
+        if sys.byteorder != "little":
+            data.byteswap()
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(json.dumps(self.header(), sort_keys=True).encode("utf-8") + b"\n")
+            f.write(data.tobytes())
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> PriceMatrix:
+        with open(path, "rb") as f:
+            if f.readline() != MAGIC:
+                raise ValueError(f"{path} is not a price matrix file")
+            header = json.loads(f.readline())
+            prices = array("d")
+            prices.frombytes(f.read())
+        if sys.byteorder != "little":
+            prices.byteswap()
+        return cls(
+            origin=header["origin"],
+            destination=header["destination"],
+            currency=header["currency"],
+            start_date=date.fromisoformat(header["start_date"]),
+            days=int(header["days"]),
+            min_stay=int(header["min_stay"]),
+            max_stay=int(header["max_stay"]),
+            prices=prices,
+            created_at=datetime.fromisoformat(header["created_at"]),
+            pruned=bool(header.get("pruned", False)),
+        )
+
+
+def price_buckets(values: Iterable[float], buckets: int) -> list[float]:
+    """Upper bounds splitting `values` into `buckets` equally sized quantile bands."""
+    ordered = sorted(values)
+    if not ordered:
+        return []
+    return [ordered[max(0, -(-len(ordered) * (b + 1) // buckets) - 1)] for b in range(buckets)]
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import heapq
+import math
+from datetime import date
+from enum import Enum
+from typing import Iterable, Optional
+
+from .matrix import PriceMatrix
+
+Pair = tuple[date, Optional[date]]
+
+
+class Strategy(str, Enum):
+    exhaustive = "exhaustive"
+    refine = "refine"
+
+
+# Weak prior for departures Mon..Sun: midweek is usually cheapest, Fri/Sun dearest.
+DEFAULT_WEEKDAY_FACTORS = (1.0, 0.96, 0.96, 1.0, 1.04, 0.99, 1.04)
+
+
+class _Factor:
+    """Running mean price for one category (a weekday, a stay length)."""
+
+    __slots__ = ("total", "count")
+
+    def __init__(self) -> None:
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, price: float) -> None:
+        self.total += price
+        self.count += 1
+
+
+class PriceModel:
+    """
+    Multiplicative price estimate for date pairs on one route.
+
+    A prediction is `mean * departure-weekday factor * return-weekday factor *
+    stay-length factor`, where each factor is the category mean over the overall
+    mean, shrunk towards a prior by `shrinkage` pseudo-observations. Pairs priced
+    by an earlier search are blended with their last known price. The model only
+    has to order pairs by expected cheapness, not predict fares exactly.
+    """
+
+    def __init__(self, *, shrinkage: float = 3.0, history_weight: float = 0.6) -> None:
+        self.shrinkage = shrinkage
+        self.history_weight = history_weight
+        self.total = 0.0
+        self.count = 0
+        self.departure_weekday = [_Factor() for _ in range(7)]
+        self.return_weekday = [_Factor() for _ in range(7)]
+        self.stay: dict[int, _Factor] = {}
+        self.history: dict[Pair, float] = {}
+
+    @classmethod
+    def from_matrix(cls, matrix: Optional[PriceMatrix], **kwargs: float) -> PriceModel:
+        model = cls(**kwargs)
+        if matrix is not None:
+            for departure_date, return_date, price in matrix.cells():
+                model.observe(departure_date, return_date, price)
+                model.history[(departure_date, return_date)] = price
+        return model
+
+    def observe(self, departure_date: date, return_date: Optional[date], price: float) -> None:
+        self.total += price
+        self.count += 1
+        self.departure_weekday[departure_date.weekday()].add(price)
+        if return_date is not None:
+            self.return_weekday[return_date.weekday()].add(price)
+            self.stay.setdefault((return_date - departure_date).days, _Factor()).add(price)
+
+    def _factor(self, factor: Optional[_Factor], mean: float, prior: float = 1.0) -> float:
+        if factor is None or not factor.count:
+            return prior
+        observed = (factor.total / factor.count) / mean
+        return (factor.count * observed + self.shrinkage * prior) / (factor.count + self.shrinkage)
+
+    def predict(self, departure_date: date, return_date: Optional[date]) -> float:
+        mean = self.total / self.count if self.count else 1.0
+        estimate = mean * self._factor(
+            self.departure_weekday[departure_date.weekday()],
+            mean,
+            DEFAULT_WEEKDAY_FACTORS[departure_date.weekday()],
+        )
+        if return_date is not None:
+            estimate *= self._factor(self.return_weekday[return_date.weekday()], mean)
+            estimate *= self._factor(self.stay.get((return_date - departure_date).days), mean)
+        past = self.history.get((departure_date, return_date))
+        if past is not None:
+            estimate = self.history_weight * past + (1 - self.history_weight) * estimate
+        return estimate
+
+
+class AnytimeQueue:
+    """
+    Hands out pairs cheapest-predicted first, re-ranking as prices arrive.
+
+    Re-scoring every remaining pair after each response would be quadratic, so the
+    queue is re-sorted every `rescore_every` pops; in between the model keeps
+    learning from each observation. The relative error of each prediction is
+    tracked so the queue can estimate how many unpriced pairs might still beat
+    the best price found.
+    """
+
+    DEFAULT_SPREAD = 0.15
+
+    def __init__(self, pairs: Iterable[Pair], model: PriceModel, *, rescore_every: int = 16) -> None:
+        self.model = model
+        self.rescore_every = max(1, rescore_every)
+        self.remaining: list[Pair] = list(pairs)
+        self._since_rescore = self.rescore_every
+        self._squared_errors = 0.0
+        self._errors = 0
+
+    def __len__(self) -> int:
+        return len(self.remaining)
+
+    def pop(self) -> Pair:
+        if self._since_rescore >= self.rescore_every:
+            # Sorted most expensive first so the next pick is a cheap pop() from the end.
+            self.remaining.sort(key=lambda p: self.model.predict(*p), reverse=True)
+            self._since_rescore = 0
+        self._since_rescore += 1
+        return self.remaining.pop()
+
+    def observe(self, pair: Pair, price: float) -> None:
+        if self.model.count:
+            predicted = self.model.predict(*pair)
+            if predicted > 0:
+                self._squared_errors += (price / predicted - 1) ** 2
+                self._errors += 1
+        self.model.observe(pair[0], pair[1], price)
+
+    @property
+    def spread(self) -> float:
+        """Root-mean-square relative prediction error (a prior until a few prices are in)."""
+        if self._errors < 5:
+            return self.DEFAULT_SPREAD
+        return max(0.01, math.sqrt(self._squared_errors / self._errors))
+
+    def expected_better(self, price: float) -> float:
+        """Expected number of unpriced pairs cheaper than `price`, assuming normal relative errors."""
+        spread = self.spread
+        expected = 0.0
+        for pair in self.remaining:
+            predicted = self.model.predict(*pair)
+            if predicted <= 0:
+                continue
+            z = (price / predicted - 1) / spread
+            expected += 0.5 * (1 + math.erf(z / math.sqrt(2)))
+        return expected
+
+
+class RefineSampler:
+    """
+    Coarse-to-fine sampling of a departure x stay-length grid.
+
+    Fares on neighbouring dates move together, so the first batch prices every
+    `step`-th departure and stay length. Each following batch halves the spacing and
+    prices the unpriced cells around the `seeds` cheapest prices found so far. Once
+    the spacing is one day, each batch prices the nearest unpriced cells around the
+    current cheapest ones, widening each one's neighbourhood a ring at a time, until
+    the grid is filled. Each of those cells remembers how far out around it is
+    already priced, so a batch only looks at the next ring. The caller stops early
+    when its request budget runs out, and by then the cells most likely to hold the
+    cheapest fares have been priced.
+    Call `observe()` for every pair of a batch before asking for the next one.
+    """
+
+    def __init__(self, pairs: Iterable[Pair], *, step: int = 3, seeds: int = 3) -> None:
+        self.pairs = list(pairs)
+        self.step = max(1, step)
+        self.seeds = max(1, seeds)
+        self.prices: dict[Pair, Optional[float]] = {}
+        self._coords: dict[Pair, tuple[int, int]] = {}
+        if self.pairs:
+            first_departure = min(departure_date for departure_date, _ in self.pairs)
+            min_stay = min(self._stay(pair) for pair in self.pairs)
+            for pair in self.pairs:
+                self._coords[pair] = ((pair[0] - first_departure).days, self._stay(pair) - min_stay)
+        self._cells = {coords: pair for pair, coords in self._coords.items()}
+        self._rows = max((row for row, _ in self._cells), default=-1) + 1
+        self._cols = max((col for _, col in self._cells), default=-1) + 1
+        # A neighbourhood this wide around any cell covers the whole grid.
+        self._extent = max(self._rows, self._cols) - 1 if self._cells else 0
+        # Cell -> radius within which every cell around it is priced.
+        self._priced_radius: dict[tuple[int, int], int] = {}
+        self._started = False
+
+    @staticmethod
+    def _stay(pair: Pair) -> int:
+        departure_date, return_date = pair
+        return (return_date - departure_date).days if return_date is not None else 0
+
+    def observe(self, pair: Pair, price: Optional[float]) -> None:
+        """Record a priced pair; `None` means the pair returned no offers."""
+        self.prices[pair] = price
+
+    def next_batch(self) -> list[Pair]:
+        """The next pairs to price, or an empty list once every pair is priced."""
+        if not self._started:
+            self._started = True
+            step = self.step
+            batch = [pair for pair, (row, col) in self._coords.items() if row % step == 0 and col % step == 0]
+            # A grid narrower than the step still gets its first stay length / departure sampled.
+            return batch or self.pairs[:1]
+        while self.step > 1:
+            radius = self.step
+            self.step = max(1, radius // 2)
+            batch = self._around_cheapest(radius, self.step)
+            if batch:
+                return batch
+        batch = self._nearest_unpriced()
+        if batch:
+            return batch
+        # Only reached when no pair returned offers, so there is nothing to refine around.
+        return [pair for pair in self.pairs if pair not in self.prices]
+
+    def _cheapest(self) -> list[tuple[int, int]]:
+        priced = ((price, self._coords[pair]) for pair, price in self.prices.items() if price is not None)
+        return [coords for _, coords in heapq.nsmallest(self.seeds, priced)]
+
+    def _around_cheapest(self, radius: int, spacing: int) -> list[Pair]:
+        batch: list[Pair] = []
+        seen: set[Pair] = set()
+        offsets = range(-radius, radius + 1, spacing)
+        for row, col in self._cheapest():
+            for d_row in offsets:
+                for d_col in offsets:
+                    pair = self._cells.get((row + d_row, col + d_col))
+                    if pair is not None and pair not in self.prices and pair not in seen:
+                        seen.add(pair)
+                        batch.append(pair)
+        return batch
+
+    def _ring(self, row: int, col: int, radius: int) -> Iterable[Pair]:
+        """Unpriced cells exactly `radius` rows or stay lengths away from (row, col), within the grid."""
+        first_col, last_col = max(0, col - radius), min(self._cols - 1, col + radius)
+        for ring_row in range(max(0, row - radius), min(self._rows - 1, row + radius) + 1):
+            if abs(ring_row - row) == radius:
+                ring_cols: Iterable[int] = range(first_col, last_col + 1)
+            else:
+                ring_cols = [c for c in (col - radius, col + radius) if first_col <= c <= last_col]
+            for ring_col in ring_cols:
+                pair = self._cells.get((ring_row, ring_col))
+                if pair is not None and pair not in self.prices:
+                    yield pair
+
+    def _nearest_unpriced(self) -> list[Pair]:
+        batch: list[Pair] = []
+        seen: set[Pair] = set()
+        for row, col in self._cheapest():
+            radius = self._priced_radius.get((row, col), 0)
+            while radius < self._extent:
+                ring = [pair for pair in self._ring(row, col, radius + 1) if pair not in seen]
+                if ring:
+                    seen.update(ring)
+                    batch += ring
+                    break
+                radius += 1
+            # The ring just returned is checked again next time, in case the caller skipped part of it.
+            self._priced_radius[(row, col)] = radius
+        return batch
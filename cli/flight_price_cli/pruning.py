@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+from typing import Any, Optional
+
+
+def max_price_filter(cutoff: Optional[Decimal], adults: int) -> Optional[int]:
+    """
+    The `maxPrice` to send for a top-N `cutoff`, or None when nothing can be pruned yet.
+
+    Amadeus applies `maxPrice` per traveler in whole currency units, so the total
+    cutoff is split across adults and rounded up: the filter may let through offers
+    slightly above the cutoff, but never drops one that would make the top N.
+    """
+    if cutoff is None:
+        return None
+    return max(1, math.ceil(cutoff / max(1, adults)))
+
+
+class PruneStats:
+    """
+    Counts what sending the top-N cutoff as `maxPrice` saved.
+
+    The API does not say how many offers a filter removed, so savings are
+    estimated: without the filter a response is assumed to have held as many
+    offers as the unfiltered responses did on average (at most `max_offers`),
+    and the bytes and JSON decode time per offer are taken from those same
+    unfiltered responses.
+    """
+
+    def __init__(self, max_offers: int) -> None:
+        self.max_offers = max_offers
+        self.requests = 0
+        self.filtered = 0
+        self.emptied = 0
+        self._unfiltered = 0
+        self._unfiltered_offers = 0
+        # offers in a filtered response -> number of such responses
+        self._filtered_offers: Counter[int] = Counter()
+        self._offers = 0
+        self._bytes = 0
+        self._decode_seconds_per_byte: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, response: Any, max_price: Optional[int]) -> None:
+        offers = len(response.data or [])
+        body = getattr(response, "body", None)
+        size = len(body) if isinstance(body, (str, bytes)) else 0
+        with self._lock:
+            self.requests += 1
+            if max_price is not None:
+                self.filtered += 1
+                self._filtered_offers[offers] += 1
+                if not offers:
+                    self.emptied += 1
+                return
+            self._unfiltered += 1
+            self._unfiltered_offers += offers
+            if not offers or not size:
+                return
+            self._offers += offers
+            self._bytes += size
+            calibrate = self._decode_seconds_per_byte is None
+        if calibrate:
+            # Time one decode of a real response body to turn skipped bytes into skipped parse time.
+            started = time.perf_counter()
+            json.loads(body)
+            self._decode_seconds_per_byte = (time.perf_counter() - started) / size
+
+    @property
+    def offers_skipped(self) -> int:
+        """Offers the filtered responses are estimated to have left out, 0 until an unfiltered response is in."""
+        with self._lock:
+            if not self._unfiltered:
+                return 0
+            expected = min(self.max_offers, self._unfiltered_offers / self._unfiltered)
+            return round(sum(count * max(0.0, expected - offers) for offers, count in self._filtered_offers.items()))
+
+    @property
+    def bytes_skipped(self) -> int:
+        if not self._offers:
+            return 0
+        return round(self.offers_skipped * self._bytes / self._offers)
+
+    @property
+    def parse_seconds_skipped(self) -> float:
+        return self.bytes_skipped * (self._decode_seconds_per_byte or 0.0)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "filtered": self.filtered,
+            "emptied": self.emptied,
+            "offers_skipped": self.offers_skipped,
+            "bytes_skipped": self.bytes_skipped,
+            "parse_ms_skipped": round(self.parse_seconds_skipped * 1000, 1),
+        }
+
+    def summary(self) -> str:
+        return (
+            f"maxPrice pruning: {self.filtered}/{self.requests} requests filtered, {self.emptied} came back empty, "
+            f"~{self.offers_skipped} offers / ~{self.bytes_skipped / 1024:.0f} KiB / "
+            f"~{self.parse_seconds_skipped * 1000:.0f} ms parsing skipped"
+        )
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass, replace
+from datetime import date
+from decimal import Decimal
+from enum import Enum
+from itertools import count
+from typing import Any, Optional
+
+
+class TripType(str, Enum):
+    one_way = "one-way"
+    return_trip = "return"
+
+
+@dataclass(frozen=True)
+class CheapestResult:
+    origin: str
+    destination: str
+    currency: str
+    trip_type: TripType
+    departure_date: date
+    return_date: Optional[date]
+    total_price: Decimal
+    raw_offer: dict[str, Any]
+    composed: bool = False
+
+
+def compact_offer(offer: dict[str, Any]) -> dict[str, Any]:
+    """Keep only the fields the CLI reports, so the full offer JSON can be garbage collected."""
+    return {"id": offer.get("id")}
+
+
+class TopN:
+    """
+    Bounded top-K of results ordered by price, earliest arrival first on ties.
+
+    Entries live in a max-heap keyed on price so each push is O(log K) and the
+    worst entry is evicted in place. Results are stored with a compact offer;
+    the full offer JSON is retained only for the `keep_offers` cheapest ones.
+    """
+
+    def __init__(self, k: int, *, keep_offers: int = 0) -> None:
+        self.k = max(0, k)
+        self.keep_offers = max(0, min(keep_offers, self.k))
+        self._seq = count()
+        # (-price, -seq, result): the root is the most expensive, latest-seen entry.
+        self._heap: list[tuple[Decimal, int, CheapestResult]] = []
+        self._offer_heap: list[tuple[Decimal, int]] = []
+        self._offers: dict[int, dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    @property
+    def cutoff(self) -> Optional[Decimal]:
+        """The price a new result has to beat to make the top K, once K results are in."""
+        if self.k <= 0 or len(self._heap) < self.k:
+            return None
+        return -self._heap[0][0]
+
+    def push(self, result: CheapestResult) -> bool:
+        """Offer a result; returns True when it made the top K."""
+        if self.k <= 0:
+            return False
+        seq = next(self._seq)
+        key = (-result.total_price, -seq)
+        if len(self._heap) >= self.k and key <= self._heap[0][:2]:
+            return False
+
+        entry = (key[0], key[1], replace(result, raw_offer=compact_offer(result.raw_offer)))
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        else:
+            heapq.heapreplace(self._heap, entry)
+        self._retain_offer(key, seq, result.raw_offer)
+        return True
+
+    def _retain_offer(self, key: tuple[Decimal, int], seq: int, offer: dict[str, Any]) -> None:
+        if self.keep_offers <= 0:
+            return
+        if len(self._offer_heap) < self.keep_offers:
+            heapq.heappush(self._offer_heap, key)
+        elif key > self._offer_heap[0]:
+            evicted = heapq.heapreplace(self._offer_heap, key)
+            self._offers.pop(-evicted[1], None)
+        else:
+            return
+        self._offers[seq] = offer
+
+    def results(self) -> list[CheapestResult]:
+        """Results sorted cheapest first, with full offers restored where retained."""
+        ordered = sorted(self._heap, reverse=True)
+        return [
+            replace(result, raw_offer=self._offers[-neg_seq]) if -neg_seq in self._offers else result
+            for _, neg_seq, result in ordered
+        ]
@@ -0,0 +1,759 @@
+import csv
+import json
+import math
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from dataclasses import replace
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib.util import find_spec
+from io import StringIO
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import typer
+from amadeus import ResponseError
+from flight_engine import run_tasks
+from rich.console import Console
+from typer.testing import CliRunner
+
+from . import app
+from .export import PriceSink, price_record
+from .matrix import PriceMatrix, parse_weekdays, price_buckets
+from .planner import AnytimeQueue, PriceModel, RefineSampler, Strategy
+from .pruning import PruneStats, max_price_filter
+from .results import CheapestResult, TopN, TripType, compact_offer
+from .watch import PairState, WatchPlanner, load_states, parse_pair_key, save_states
+
+DAY = date(2026, 9, 1)
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def load_fare_grids():
+    """The fixture routes as (origin, destination, fares keyed like FakeEngine), and the grid's search window"""
+    data = json.loads((FIXTURES / "fare_grids.json").read_text(encoding="utf-8"))
+    start = date.fromisoformat(data["start_date"])
+    window = dict(start_date=start, end_date=start + timedelta(days=data["days"] - 1),
+                  min_stay_days=data["min_stay"], max_stay_days=data["max_stay"], currency=data["currency"])
+    routes = [
+        (route["origin"], route["destination"],
+         {(route["origin"], route["destination"], *parse_pair_key(key)): price for key, price in route["fares"].items()})
+        for route in data["routes"]
+    ]
+    return routes, window
+
+
+class FakeEngine:
+    """Answers searches from a {(origin, destination, departure, return): price} table, like the API would."""
+
+    def __init__(self, fares, clock=None):
+        self.fares = fares
+        self.clock = clock
+        self.queries = []
+        self.checked_at = []
+
+    def cheapest(self, query, observe=None):
+        self.queries.append(query)
+        if self.clock is not None:
+            self.checked_at.append(self.clock.now)
+        price = self.fares.get((query.origin, query.destination, query.departure_date, query.return_date))
+        if callable(price):
+            price = price()
+        if isinstance(price, Exception):
+            raise price
+        offers = []
+        if price is not None and (query.max_price is None or price <= query.max_price * query.adults):
+            offer_id = f"{query.origin}{query.departure_date:%m%d}{query.return_date or date.min:%m%d}"
+            offers.append({"id": offer_id, "price": {"total": str(price)}})
+        if observe is not None:
+            observe(Mock(data=offers, body=json.dumps({"data": offers})))
+        if not offers:
+            return None, None
+        return Decimal(str(price)), offers[0]
+
+    def run(self, tasks, fn, workers=None):
+        return run_tasks(tasks, fn, workers=workers or 1)
+
+    def transport_stats(self):
+        return None
+
+
+def result(price, day=0, offer_id=None):
+    return CheapestResult(
+        origin="BRU", destination="BUD", currency="EUR", trip_type=TripType.one_way,
+        departure_date=DAY + timedelta(days=day), return_date=None, total_price=Decimal(price),
+        raw_offer={"id": offer_id or f"o{day}", "itineraries": [{"segments": []}], "price": {"total": price}},
+    )
+
+
+class FakeClock:
+    """Stands in for the `time` module: sleeping moves the clock on instead of waiting"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def run_search(fares, **options):
+    """The --json payload of a search against `fares`, and the engine that served it"""
+    engine = FakeEngine(fares)
+    settings = dict(
+        origin="BRU", destination="BUD", start_date=DAY, end_date=DAY + timedelta(days=6),
+        trip=TripType.return_trip, min_stay_days=1, max_stay_days=4, adults=1, currency="EUR",
+        nonstop=False, max_offers=10, throttle_seconds=0.0, max_requests=1000, force=False,
+        json_output=True, verbose=False, dry_run=False, top_n=5, stream=False, remember=False,
+    )
+    settings.update(options)
+    out = StringIO()
+    with tempfile.TemporaryDirectory() as tmp, redirect_stdout(out), \
+            patch.object(app, "_new_engine", return_value=engine), \
+            patch.object(app, "console", Console(file=StringIO())):
+        settings.setdefault("matrix_path", Path(tmp) / "search.fpm")
+        app._run_search(**settings)
+    return json.loads(out.getvalue()), engine
+
+
+def run_sweep(fares, routes, **options):
+    """The --json payload of a sweep over `routes` against `fares`, and the engine that served it"""
+    engine = FakeEngine(fares)
+    settings = dict(
+        start_date=DAY, end_date=DAY + timedelta(days=2), trip=TripType.one_way, min_stay_days=1,
+        max_stay_days=4, adults=1, currency="EUR", nonstop=False, max_offers=10, workers=3, rate=0.0,
+        max_requests=1000, force=False, json_output=True, verbose=False, dry_run=False, top_n=3,
+    )
+    settings.update(options)
+    out = StringIO()
+    with tempfile.TemporaryDirectory() as tmp, redirect_stdout(out), \
+            patch.object(app, "_new_engine", return_value=engine), \
+            patch.object(app, "_matrix_path", side_effect=lambda o, d, c: Path(tmp) / f"{o}-{d}-{c}.fpm"), \
+            patch.object(app, "console", Console(file=StringIO())):
+        try:
+            app._run_sweep(routes=routes, **settings)
+        except typer.Exit:
+            pass
+    return json.loads(out.getvalue()), engine
+
+
+def run_watch(fares, state_path, **options):
+    """The engine that served a watch over `fares` on a fake clock, and the alerts it raised"""
+    clock = FakeClock()
+    engine = FakeEngine(fares, clock)
+    alerts = []
+    settings = dict(
+        origin="BRU", destination="BUD", start_date=date.today(), end_date=date.today() + timedelta(days=1),
+        trip=TripType.one_way, min_stay_days=1, max_stay_days=4, adults=1, currency="EUR", nonstop=False,
+        max_offers=10, budget_per_hour=30.0, hot_interval_minutes=1.0, cold_interval_minutes=10.0, max_checks=5,
+        alert_below=None, on_alert="notify", verbose=False,
+    )
+    settings.update(options)
+    with patch.object(app, "_new_engine", return_value=engine), patch.object(app, "time", clock), \
+            patch.object(app, "console", Console(file=StringIO())), \
+            patch.object(app, "_run_alert_hook", side_effect=lambda command, result, previous: alerts.append(
+                (result.departure_date, result.total_price, previous))):
+        app._run_watch(state_path=state_path, **settings)
+    return engine, alerts
+
+
+class ComposeOneWayTests(unittest.TestCase):
+    def test_composed_prices_are_the_sum_of_the_legs(self):
+        outbound = {DAY: (Decimal("100"), {"id": "o1"}), DAY + timedelta(days=1): (Decimal("80"), {"id": "o2"})}
+        inbound = {DAY + timedelta(days=2): (Decimal("50"), {"id": "i1"}), DAY + timedelta(days=3): (Decimal("40"), {"id": "i2"})}
+
+        pairs = list(app._compose_return_pairs(outbound, inbound, end_date=DAY + timedelta(days=3),
+                                               min_stay_days=1, max_stay_days=2))
+
+        self.assertEqual([(d.day, r.day, price) for d, r, price, _ in pairs], [
+            (1, 3, Decimal("150")),
+            (2, 3, Decimal("130")),
+            (2, 4, Decimal("120")),
+        ])
+        self.assertEqual(pairs[-1][3], {"id": "o2+i2", "outbound": {"id": "o2"}, "inbound": {"id": "i2"}})
+
+    def test_missing_legs_produce_no_pair(self):
+        outbound = {DAY: (Decimal("100"), {"id": "o1"})}
+        inbound = {DAY + timedelta(days=3): (Decimal("40"), {"id": "i2"})}
+
+        pairs = list(app._compose_return_pairs(outbound, inbound, end_date=DAY + timedelta(days=6),
+                                               min_stay_days=1, max_stay_days=4))
+        self.assertEqual([(d, r) for d, r, _, _ in pairs], [(DAY, DAY + timedelta(days=3))])
+        self.assertEqual(list(app._compose_return_pairs({}, inbound, end_date=DAY + timedelta(days=6),
+                                                        min_stay_days=1, max_stay_days=4)), [])
+
+    def test_search_picks_the_cheapest_pair_of_legs(self):
+        fares = {("BRU", "BUD", DAY + timedelta(days=d), None): 100 - 5 * d for d in range(3)}
+        # No flights home on the 4th, which would have been the cheapest return from the 3rd
+        fares.update({("BUD", "BRU", DAY + timedelta(days=d), None): 60 + d for d in range(1, 7) if d != 3})
+
+        payload, engine = run_search(fares, end_date=DAY + timedelta(days=6), compose_one_way=True)
+
+        legs = {(q.origin, q.departure_date) for q in engine.queries}
+        self.assertEqual(len(legs), len(engine.queries))
+        self.assertTrue(all(q.return_date is None for q in engine.queries))
+        # Departing on the 3rd (90) and returning on the 5th (64): the 4th has no return leg
+        self.assertEqual((payload["departure_date"], payload["return_date"]), ("2026-09-03", "2026-09-05"))
+        self.assertEqual(payload["total_price"], "154")
+        self.assertTrue(payload["composed"])
+        self.assertNotIn("2026-09-04", [entry["return_date"] for entry in payload["top"]])
+
+    def test_plan_validates_no_more_pairs_than_exist(self):
+        # Two departures with a one-night stay: 2 outbound + 2 inbound legs and 2 pairs to validate
+        plan, _ = run_search({}, end_date=DAY + timedelta(days=2), min_stay_days=1, max_stay_days=1,
+                             compose_one_way=True, validate_top=50, max_requests=6, dry_run=True)
+
+        self.assertEqual(plan["planned_requests"], 6)
+        self.assertEqual(plan["compose_one_way"], {"outbound": 2, "inbound": 2, "validate": 2})
+
+
+class TopNTests(unittest.TestCase):
+    def test_keeps_the_k_cheapest(self):
+        top = TopN(3)
+        pushed = [top.push(result(price, day)) for day, price in enumerate(["300", "100", "250", "400", "200", "50"])]
+
+        self.assertEqual(pushed, [True, True, True, False, True, True])
+        self.assertEqual(len(top), 3)
+        self.assertEqual([r.total_price for r in top.results()], [Decimal("50"), Decimal("100"), Decimal("200")])
+
+    def test_ties_keep_the_earliest_seen(self):
+        top = TopN(2)
+        for day in range(4):
+            top.push(result("100", day))
+
+        self.assertEqual([(r.departure_date - DAY).days for r in top.results()], [0, 1])
+        # A later result at the cutoff price does not displace an earlier one
+        self.assertFalse(top.push(result("100", 9)))
+
+    def test_cutoff_is_the_price_to_beat_once_full(self):
+        top = TopN(2)
+        self.assertIsNone(top.cutoff)
+        top.push(result("300", 0))
+        self.assertIsNone(top.cutoff)
+        top.push(result("100", 1))
+        self.assertEqual(top.cutoff, Decimal("300"))
+        top.push(result("200", 2))
+        self.assertEqual(top.cutoff, Decimal("200"))
+        self.assertIsNone(TopN(0).cutoff)
+        self.assertFalse(TopN(0).push(result("1")))
+
+    def test_only_the_kept_offers_are_retained_in_full(self):
+        top = TopN(4, keep_offers=2)
+        for day, price in enumerate(["300", "100", "250", "400", "200", "50"]):
+            top.push(result(price, day))
+
+        ranked = top.results()
+        self.assertEqual([r.raw_offer["id"] for r in ranked], ["o5", "o1", "o4", "o2"])
+        self.assertEqual([r.raw_offer == compact_offer(r.raw_offer) for r in ranked], [False, False, True, True])
+        self.assertIn("itineraries", ranked[0].raw_offer)
+        # Evicted offers are dropped, not just hidden
+        self.assertEqual(sorted(top._offers), [1, 5])
+        self.assertEqual(compact_offer({"id": "x", "itineraries": []}), {"id": "x"})
+        # keep_offers never exceeds k
+        self.assertEqual(TopN(2, keep_offers=5).keep_offers, 2)
+
+
+class SweepTests(unittest.TestCase):
+    def load_routes(self, text, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "routes.txt"
+            path.write_text(text, encoding="utf-8")
+            return app._load_routes(**{"origins": [], "destinations": [], "routes": [], **options}, routes_file=path)
+
+    def test_route_files_skip_comments_and_duplicates(self):
+        routes = self.load_routes(
+            "# weekend trips\nbru-bud\n\nBRU BCN  # the cheap one\nBRU,BUD\nlhr-lhr\n",
+            routes=["AMS-BUD"], origins=["BRU"], destinations=["BCN", "MAD"],
+        )
+        self.assertEqual(routes, [("AMS", "BUD"), ("BRU", "BUD"), ("BRU", "BCN"), ("BRU", "MAD")])
+
+    def test_malformed_route_lines_are_rejected(self):
+        for text in ("BRU-BUD\nBRU\n", "BRU-BUD-MAD\n", "BRUX-BUD\n", "BR1-BUD\n"):
+            with self.subTest(text=text), self.assertRaises(typer.BadParameter):
+                self.load_routes(text)
+
+    def test_ranks_routes_and_counts_errors(self):
+        fares = {("BRU", "BUD", DAY + timedelta(days=d), None): 120 - d for d in range(3)}
+        fares.update({("BRU", "BCN", DAY + timedelta(days=d), None): 90 + d for d in range(3)})
+        fares[("BRU", "BCN", DAY + timedelta(days=2), None)] = ResponseError(Mock(status_code=500, result={}, parsed=True))
+
+        payload, engine = run_sweep(fares, [("BRU", "BUD"), ("BRU", "BCN"), ("BRU", "MAD")])
+
+        self.assertEqual(len(engine.queries), 9)
+        self.assertEqual(payload["requests"], {"planned": 9, "completed": 9, "errors": 1})
+        self.assertEqual((payload["best"]["destination"], payload["best"]["total_price"]), ("BCN", "90"))
+        self.assertEqual([route["best"] and route["best"]["total_price"] for route in payload["routes"]],
+                         ["118", "90", None])
+        self.assertEqual([entry["total_price"] for entry in payload["top"]], ["90", "91", "118"])
+
+
+class ExportTests(unittest.TestCase):
+    def results(self):
+        return [
+            replace(result("120.5", 0), trip_type=TripType.return_trip, return_date=DAY + timedelta(days=4)),
+            result("99", 1),
+            replace(result("150", 2, offer_id="o2+i6"), trip_type=TripType.return_trip,
+                    return_date=DAY + timedelta(days=6), composed=True),
+        ]
+
+    def write(self, output, export):
+        with PriceSink(output, export) as sink:
+            for r in self.results():
+                sink.write(r)
+        return sink
+
+    def test_ndjson_stream_and_csv_export_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output, export = Path(tmp) / "prices.ndjson", Path(tmp) / "prices.csv"
+            sink = self.write(str(output), export)
+            streamed = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+            with open(export, newline="", encoding="utf-8") as f:
+                exported = list(csv.DictReader(f))
+
+        expected = [price_record(r) for r in self.results()]
+        self.assertEqual(sink.rows, 3)
+        self.assertEqual(streamed, expected)
+        self.assertEqual(expected[0]["stay_days"], 4)
+        self.assertEqual(exported, [
+            {name: "" if value is None else str(value) for name, value in row.items()} for row in expected
+        ])
+
+    def test_export_alone_spools_the_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            export = Path(tmp) / "prices.csv"
+            self.write(None, export)
+            with open(export, newline="", encoding="utf-8") as f:
+                exported = list(csv.DictReader(f))
+            self.assertEqual([p.name for p in Path(tmp).iterdir()], ["prices.csv"])
+
+        self.assertEqual([(row["departure_date"], row["total_price"], row["composed"]) for row in exported], [
+            ("2026-09-01", "120.5", "False"), ("2026-09-02", "99", "False"), ("2026-09-03", "150", "True"),
+        ])
+
+    @unittest.skipIf(find_spec("pyarrow") is None, "Parquet export needs pyarrow")
+    def test_parquet_export_round_trip(self):
+        import pyarrow.parquet as pq
+
+        with tempfile.TemporaryDirectory() as tmp:
+            export = Path(tmp) / "prices.parquet"
+            self.write(None, export)
+            rows = pq.read_table(export).to_pylist()
+
+        self.assertEqual([(row["departure_date"], row["return_date"], row["total_price"]) for row in rows], [
+            (DAY, DAY + timedelta(days=4), Decimal("120.50")),
+            (DAY + timedelta(days=1), None, Decimal("99.00")),
+            (DAY + timedelta(days=2), DAY + timedelta(days=6), Decimal("150.00")),
+        ])
+
+    def test_search_streams_every_priced_pair(self):
+        fares = {("BRU", "BUD", DAY + timedelta(days=d), DAY + timedelta(days=d + 2)): 100 + d for d in range(5)}
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / "prices.ndjson"
+            run_search(fares, min_stay_days=2, max_stay_days=2, output=str(output))
+            streamed = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+
+        self.assertEqual([(row["departure_date"], row["total_price"]) for row in streamed],
+                         [((DAY + timedelta(days=d)).isoformat(), str(100 + d)) for d in range(5)])
+
+
+class PriceMatrixTests(unittest.TestCase):
+    def matrix(self, **options):
+        matrix = PriceMatrix(origin="BRU", destination="BUD", currency="EUR", start_date=DAY, days=14,
+                             min_stay=1, max_stay=6, **options)
+        for day in range(14):
+            for stay in range(1, 7):
+                # Friday the 11th to Sunday the 13th was never priced
+                if (day, stay) != (10, 2):
+                    matrix.set(DAY + timedelta(days=day), DAY + timedelta(days=day + stay), 300 - 10 * day + stay)
+        return matrix
+
+    def test_save_and_load_keep_unpriced_cells(self):
+        matrix = self.matrix()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "matrices" / "BRU-BUD-EUR.fpm"
+            matrix.save(path)
+            loaded = PriceMatrix.load(path)
+            self.assertEqual([p.name for p in path.parent.iterdir()], ["BRU-BUD-EUR.fpm"])
+            (Path(tmp) / "other.fpm").write_bytes(b"not a matrix\n")
+            with self.assertRaises(ValueError):
+                PriceMatrix.load(Path(tmp) / "other.fpm")
+
+        self.assertEqual(loaded.header(), matrix.header())
+        self.assertEqual(len(loaded), 14 * 6 - 1)
+        self.assertTrue(math.isnan(loaded.prices[10 * 6 + 1]))
+        self.assertIsNone(loaded.get(DAY + timedelta(days=10), DAY + timedelta(days=12)))
+        self.assertEqual(list(loaded.cells()), list(matrix.cells()))
+
+    def test_set_keeps_the_cheaper_price_and_fill_missing_only_fills_gaps(self):
+        matrix = self.matrix()
+        matrix.set(DAY, DAY + timedelta(days=1), 500)
+        self.assertEqual(matrix.get(DAY, DAY + timedelta(days=1)), 301)
+        # Out of the grid: ignored
+        matrix.set(DAY, DAY + timedelta(days=9), 1)
+        self.assertEqual(len(matrix), 14 * 6 - 1)
+
+        newer = PriceMatrix(origin="BRU", destination="BUD", currency="EUR", start_date=DAY, days=14,
+                            min_stay=1, max_stay=6)
+        newer.set(DAY, DAY + timedelta(days=1), 320)
+        self.assertEqual(newer.fill_missing(matrix), 14 * 6 - 2)
+        self.assertEqual(newer.get(DAY, DAY + timedelta(days=1)), 320)
+        self.assertEqual(newer.get(DAY + timedelta(days=1), DAY + timedelta(days=3)), 292)
+
+    def test_weekday_and_date_constraints(self):
+        self.assertEqual(parse_weekdays("Fri, saturday"), frozenset({4, 5}))
+        self.assertIsNone(parse_weekdays(""))
+        with self.assertRaises(ValueError):
+            parse_weekdays("fri,someday")
+
+        cells = list(self.matrix().cells(departure_weekdays=parse_weekdays("fri"), return_weekdays=parse_weekdays("sun")))
+        # Friday the 4th to Sunday the 6th; the 11th to the 13th is unpriced
+        self.assertEqual(cells, [(DAY + timedelta(days=3), DAY + timedelta(days=5), 272)])
+        within = list(self.matrix().cells(start=DAY + timedelta(days=12), end=DAY + timedelta(days=14), max_stay=2))
+        self.assertEqual([(d.day, r.day) for d, r, _ in within], [(13, 14), (13, 15), (14, 15)])
+
+    def test_price_buckets_split_into_equal_bands(self):
+        self.assertEqual(price_buckets(range(10, 0, -1), 5), [2, 4, 6, 8, 10])
+        self.assertEqual(price_buckets([], 5), [])
+
+    def test_query_reranks_a_saved_matrix_offline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "BRU-BUD-EUR.fpm"
+            self.matrix().save(path)
+            runner = CliRunner()
+            weekend = runner.invoke(app.app, ["query", "--matrix", str(path), "--depart-on", "thu,fri",
+                                              "--return-on", "sun", "--top", "3", "--json"])
+            short = runner.invoke(app.app, ["query", "--matrix", str(path), "--max-stay", "1", "--top", "2", "--json"])
+            none = runner.invoke(app.app, ["query", "--matrix", str(path), "--depart-on", "mon", "--return-on", "mon"])
+            heatmap = runner.invoke(app.app, ["query", "--matrix", str(path), "--heatmap", "--top", "1"])
+
+        self.assertEqual(weekend.exit_code, 0, weekend.output)
+        top = [(r["departure_date"], r["return_date"], r["total_price"]) for r in json.loads(weekend.output)["top"]]
+        self.assertEqual(top, [
+            ("2026-09-10", "2026-09-13", "213.00"),
+            ("2026-09-04", "2026-09-06", "272.00"),
+            ("2026-09-03", "2026-09-06", "283.00"),
+        ])
+        self.assertEqual([r["total_price"] for r in json.loads(short.output)["top"]], ["171.00", "181.00"])
+        self.assertEqual(none.exit_code, 2)
+        self.assertIn("No saved prices match", none.output)
+        self.assertIn("Cheapest return by departure date", heatmap.output)
+
+
+class WatchPlannerTests(unittest.TestCase):
+    def planner(self, prices, checked_at=100.0):
+        pairs = [(DAY + timedelta(days=d), None) for d in range(len(prices))]
+        states = {pair: PairState(price, checked_at) for pair, price in zip(pairs, prices) if price != "unchecked"}
+        return WatchPlanner(pairs, hot_interval=60, cold_interval=600, states=states), pairs
+
+    def test_interval_grows_with_the_distance_from_the_best_price(self):
+        planner, pairs = self.planner([100, 110, 150, None])
+
+        self.assertEqual([planner.interval(pair, 100) for pair in pairs], [60, 120, 360, 600])
+        # Far above the best, or with no best at all, a pair is checked at the cold interval
+        self.assertEqual(planner.interval(pairs[2], 50), 600)
+        self.assertEqual(planner.interval(pairs[0], None), 600)
+
+    def test_unchecked_pairs_first_then_the_hottest_due(self):
+        planner, pairs = self.planner([150, 100, "unchecked"])
+        self.assertEqual(planner.next_due(), (pairs[2], 0.0))
+
+        planner.record(pairs[2], 200, 100.0)
+        self.assertEqual(planner.next_due(), (pairs[1], 160.0))
+        # Departed pairs are never due, and once they are gone the last pair is the best one left
+        self.assertEqual(planner.next_due(today=DAY + timedelta(days=2)), (pairs[2], 160.0))
+        self.assertIsNone(planner.next_due(today=DAY + timedelta(days=3)))
+
+    def test_record_returns_the_best_it_beat(self):
+        planner, pairs = self.planner(["unchecked", "unchecked", "unchecked"])
+
+        self.assertIsNone(planner.record(pairs[0], 100, 1.0))
+        self.assertIsNone(planner.record(pairs[1], 100, 2.0))
+        self.assertIsNone(planner.record(pairs[2], None, 3.0))
+        self.assertEqual(planner.record(pairs[1], 90, 4.0), 100)
+        self.assertEqual(planner.best(), (pairs[1], 90))
+
+    def test_departed_pairs_leave_the_warm_up_and_the_best(self):
+        planner, pairs = self.planner([50, "unchecked", 100, "unchecked"])
+        self.assertFalse(planner.warmed_up())
+
+        planner.record(pairs[3], 120, 200.0, today=DAY + timedelta(days=2))
+        self.assertTrue(planner.warmed_up(today=DAY + timedelta(days=2)))
+        self.assertEqual(planner.best(today=DAY + timedelta(days=2)), (pairs[2], 100))
+        # A drop is measured against fares still on sale, not the departed 50
+        self.assertEqual(planner.record(pairs[3], 80, 300.0, today=DAY + timedelta(days=2)), 100)
+
+    def test_state_file_round_trip(self):
+        planner, pairs = self.planner([100, None, "unchecked"])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "watch" / "BRU-BUD-EUR-one-way.json"
+            save_states(path, planner, {"origin": "BRU", "destination": "BUD"})
+            saved = json.loads(path.read_text(encoding="utf-8"))
+            states = load_states(path)
+            path.write_text('{"pairs": {"not-a-date/": {"price": 1}, "2026-09-02/": {"price": 5, "checked_at": 9}}}')
+            partial = load_states(path)
+            path.write_text("{")
+            corrupt = load_states(path)
+
+        self.assertEqual(saved["origin"], "BRU")
+        self.assertEqual(states, {pairs[0]: PairState(100, 100.0), pairs[1]: PairState(None, 100.0)})
+        self.assertEqual(WatchPlanner(pairs, hot_interval=60, cold_interval=600, states=states).to_json(), saved["pairs"])
+        self.assertEqual(partial, {pairs[1]: PairState(5, 9.0)})
+        self.assertEqual(corrupt, {})
+
+
+class WatchTests(unittest.TestCase):
+    def test_checks_stay_within_the_budget_and_drops_alert(self):
+        today = date.today()
+        later = iter([120])
+        fares = {
+            ("BRU", "BUD", today, None): 100,
+            ("BRU", "BUD", today + timedelta(days=1), None): lambda: next(later, 80),
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "watch.json"
+            # The window started two days ago: the departed dates must not hold back the first pass
+            engine, alerts = run_watch(fares, path, start_date=today - timedelta(days=2))
+            states = load_states(path)
+
+        self.assertTrue(all(q.departure_date >= today for q in engine.queries))
+        # 30 requests an hour: one every two minutes, though the best pair is due every minute
+        self.assertEqual([t - engine.checked_at[0] for t in engine.checked_at], [0, 120, 240, 360, 480])
+        # The pair at the best price is checked more often than the one above it
+        self.assertEqual([(q.departure_date - today).days for q in engine.queries], [0, 1, 0, 0, 1])
+        self.assertEqual(alerts, [(today + timedelta(days=1), Decimal("80"), 100.0)])
+        self.assertEqual({pair[0]: state.price for pair, state in states.items()},
+                         {today: 100, today + timedelta(days=1): 80})
+
+    def test_the_first_pass_does_not_alert(self):
+        today = date.today()
+        fares = {("BRU", "BUD", today + timedelta(days=d), None): 100 - d for d in range(2)}
+        with tempfile.TemporaryDirectory() as tmp:
+            _, alerts = run_watch(fares, Path(tmp) / "watch.json", max_checks=2)
+        self.assertEqual(alerts, [])
+
+
+class FixedModel:
+    """Predicts whatever `prices` says, so tests control the queue's order"""
+
+    count = 0
+
+    def __init__(self, prices):
+        self.prices = prices
+
+    def predict(self, departure_date, return_date):
+        return self.prices[departure_date]
+
+
+class AnytimeTests(unittest.TestCase):
+    def test_model_learns_weekday_and_stay_patterns(self):
+        model = PriceModel()
+        # Before any price is in, the weekday prior favours midweek departures
+        self.assertLess(model.predict(DAY, None), model.predict(DAY + timedelta(days=3), None))
+
+        for week in range(4):
+            friday = DAY + timedelta(days=3 + 7 * week)
+            model.observe(friday, friday + timedelta(days=2), 80)
+            model.observe(friday - timedelta(days=3), friday + timedelta(days=4), 200)
+        friday = DAY + timedelta(days=31)
+        self.assertLess(model.predict(friday, friday + timedelta(days=2)),
+                        model.predict(friday - timedelta(days=3), friday + timedelta(days=4)))
+
+        # A price from an earlier search pulls the estimate towards it
+        model.history[(friday, friday + timedelta(days=2))] = 500
+        self.assertGreater(model.predict(friday, friday + timedelta(days=2)), 200)
+
+    def test_pops_cheapest_expected_first(self):
+        days = [DAY + timedelta(days=d) for d in range(6)]
+        queue = AnytimeQueue([(day, None) for day in days], FixedModel(dict(zip(days, [50, 10, 40, 20, 60, 30]))))
+
+        self.assertEqual([(queue.pop()[0] - DAY).days for _ in range(6)], [1, 3, 5, 2, 0, 4])
+        self.assertEqual(len(queue), 0)
+
+    def test_rescores_every_16_pops(self):
+        days = [DAY + timedelta(days=d) for d in range(40)]
+        model = FixedModel({day: d for d, day in enumerate(days)})
+        queue = AnytimeQueue([(day, None) for day in days], model)
+
+        popped = [queue.pop()[0]]
+        # The fares turn around, but the queue keeps its order until the next rescore
+        model.prices = {day: -d for d, day in enumerate(days)}
+        popped += [queue.pop()[0] for _ in range(16)]
+
+        self.assertEqual([(day - DAY).days for day in popped], list(range(16)) + [39])
+
+    def test_prices_every_pair_once_when_the_budget_allows(self):
+        fares = {("BRU", "BUD", DAY + timedelta(days=d), DAY + timedelta(days=d + stay)): 200 - 3 * d + 5 * stay
+                 for d in range(7) for stay in range(1, 5) if d + stay <= 6}
+
+        payload, engine = run_search(fares, anytime=True)
+        pairs = {(q.departure_date, q.return_date) for q in engine.queries}
+        self.assertEqual((len(engine.queries), len(pairs)), (len(fares), len(fares)))
+        self.assertEqual(payload["anytime"]["confidence"], "exact")
+        self.assertEqual(payload["total_price"], str(min(fares.values())))
+
+        capped, engine = run_search(fares, anytime=True, max_requests=5)
+        self.assertEqual(len(engine.queries), 5)
+        self.assertEqual((capped["anytime"]["priced"], capped["anytime"]["stopped_by"]), (5, "requests"))
+        self.assertIn("expected_better", capped["anytime"])
+
+
+class RefineTests(unittest.TestCase):
+    def test_starts_coarse_and_fills_the_grid_without_repeats(self):
+        pairs = [(DAY + timedelta(days=d), DAY + timedelta(days=d + stay)) for d in range(10) for stay in range(1, 8)]
+        sampler = RefineSampler(pairs, step=3)
+
+        first = sampler.next_batch()
+        self.assertEqual(sorted({(d - DAY).days for d, _ in first}), [0, 3, 6, 9])
+        self.assertEqual(sorted({(r - d).days for d, r in first}), [1, 4, 7])
+
+        priced, batch = [], first
+        while batch:
+            for pair in batch:
+                # Nothing on the first three days
+                sampler.observe(pair, None if pair[0] < DAY + timedelta(days=3) else (pair[0] - DAY).days)
+            priced += batch
+            batch = sampler.next_batch()
+        self.assertEqual(sorted(priced), sorted(pairs))
+
+        # Without a single offer there is nothing to refine around, so the rest comes in one batch
+        empty = RefineSampler(pairs, step=3)
+        for pair in empty.next_batch():
+            empty.observe(pair, None)
+        self.assertEqual(len(empty.next_batch()), len(pairs) - len(first))
+
+    def test_filling_a_large_grid_looks_at_each_cell_a_bounded_number_of_times(self):
+        class CountingCells(dict):
+            lookups = 0
+
+            def get(self, key, default=None):
+                CountingCells.lookups += 1
+                return super().get(key, default)
+
+        pairs = [(DAY + timedelta(days=d), DAY + timedelta(days=d + stay)) for d in range(120) for stay in range(1, 15)]
+        sampler = RefineSampler(pairs, step=3)
+        sampler._cells = CountingCells(sampler._cells)
+        priced, batch = 0, sampler.next_batch()
+        while batch:
+            for pair in batch:
+                # Cheapest in the middle of the window, dearer further out
+                sampler.observe(pair, abs((pair[0] - DAY).days - 60) + (pair[1] - pair[0]).days)
+            priced += len(batch)
+            batch = sampler.next_batch()
+
+        self.assertEqual(priced, len(pairs))
+        # Rescanning every neighbourhood from radius 1 on each batch would take millions
+        self.assertLess(CountingCells.lookups, 20 * len(pairs))
+
+    def test_matches_the_exhaustive_search_on_the_fixtures(self):
+        routes, window = load_fare_grids()
+        for origin, destination, fares in routes:
+            with self.subTest(route=f"{origin}-{destination}"):
+                exhaustive, engine = run_search(fares, origin=origin, destination=destination, **window)
+                self.assertEqual(len(engine.queries), len(fares))
+
+                budget = len(fares) // 2
+                refined, engine = run_search(fares, origin=origin, destination=destination, strategy=Strategy.refine,
+                                             max_requests=budget, **window)
+                self.assertEqual(refined["total_price"], exhaustive["total_price"])
+                self.assertEqual((refined["departure_date"], refined["return_date"]),
+                                 (exhaustive["departure_date"], exhaustive["return_date"]))
+                self.assertEqual(len(engine.queries), budget)
+
+                # Without a budget the refinement keeps going until every pair is priced, each once
+                filled, engine = run_search(fares, origin=origin, destination=destination, strategy=Strategy.refine,
+                                            **window)
+                self.assertEqual(len({(q.departure_date, q.return_date) for q in engine.queries}), len(fares))
+                self.assertEqual(len(engine.queries), len(fares))
+                self.assertEqual(filled["total_price"], exhaustive["total_price"])
+
+    def test_sweep_matches_the_exhaustive_sweep_on_the_fixtures(self):
+        routes, window = load_fare_grids()
+        fares = {key: price for _, _, route_fares in routes for key, price in route_fares.items()}
+        legs = [(origin, destination) for origin, destination, _ in routes]
+        window.update(trip=TripType.return_trip, top_n=1)
+
+        exhaustive, engine = run_sweep(fares, legs, **window)
+        self.assertEqual(len(engine.queries), len(fares))
+        refined, engine = run_sweep(fares, legs, strategy=Strategy.refine, max_requests=len(fares) // 2, **window)
+
+        self.assertEqual(refined["routes"], exhaustive["routes"])
+        self.assertEqual(refined["requests"]["completed"], len(fares) // 2)
+
+
+def offers_response(offers):
+    data = [{"id": str(i), "price": {"total": "100.00"}} for i in range(offers)]
+    return Mock(data=data, body=json.dumps({"data": data}))
+
+
+class PruningTests(unittest.TestCase):
+    def test_max_price_is_the_cutoff_per_adult_rounded_up(self):
+        self.assertIsNone(max_price_filter(None, 1))
+        self.assertEqual(max_price_filter(Decimal("300"), 2), 150)
+        self.assertEqual(max_price_filter(Decimal("301"), 2), 151)
+        self.assertEqual(max_price_filter(Decimal("299.01"), 1), 300)
+        self.assertEqual(max_price_filter(Decimal("0.40"), 1), 1)
+        self.assertEqual(max_price_filter(Decimal("99"), 0), 99)
+
+    def test_skipped_offers_are_estimated_from_unfiltered_responses(self):
+        stats = PruneStats(max_offers=100)
+        # A filtered response before any unfiltered one has nothing to compare against yet
+        stats.record(offers_response(0), max_price=150)
+        self.assertEqual(stats.offers_skipped, 0)
+
+        for offers in (4, 6, 2):
+            stats.record(offers_response(offers), max_price=None)
+        for offers in (1, 4, 7):
+            stats.record(offers_response(offers), max_price=150)
+
+        # The route averages 4 offers, not --max-offers: 4 + 3 + 0 + 0 skipped
+        self.assertEqual(stats.offers_skipped, 7)
+        self.assertEqual((stats.requests, stats.filtered, stats.emptied), (7, 4, 1))
+        bytes_per_offer = sum(len(offers_response(n).body) for n in (4, 6, 2)) / 12
+        self.assertEqual(stats.bytes_skipped, round(7 * bytes_per_offer))
+        self.assertEqual(stats.to_json()["offers_skipped"], 7)
+
+    def test_estimate_is_capped_at_max_offers(self):
+        stats = PruneStats(max_offers=5)
+        stats.record(offers_response(12), max_price=None)
+        stats.record(offers_response(0), max_price=150)
+        self.assertEqual(stats.offers_skipped, 5)
+
+    def test_pruned_search_keeps_the_same_top_results(self):
+        fares = {("BRU", "BUD", DAY + timedelta(days=d), DAY + timedelta(days=d + stay)): 150 + 7 * d - 3 * stay
+                 for d in range(7) for stay in range(1, 5) if d + stay <= 6}
+
+        plain, _ = run_search(fares, top_n=3)
+        pruned, engine = run_search(fares, top_n=3, prune=True)
+
+        self.assertEqual(pruned["top"], plain["top"])
+        self.assertEqual([q.max_price for q in engine.queries[:3]], [None, None, None])
+        self.assertTrue(all(q.max_price is not None for q in engine.queries[3:]))
+        self.assertEqual(pruned["pruning"]["filtered"], len(fares) - 3)
+
+    def test_pruned_matrix_is_flagged_when_queried_or_reused(self):
+        fares = {("BRU", "BUD", DAY + timedelta(days=d), DAY + timedelta(days=d + stay)): 150 + 7 * d - 3 * stay
+                 for d in range(7) for stay in range(1, 5) if d + stay <= 6}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "BRU-BUD-EUR.fpm"
+            run_search(fares, top_n=3, prune=True, matrix_path=path)
+            matrix = PriceMatrix.load(path)
+            queried = CliRunner().invoke(app.app, ["query", "--matrix", str(path), "--max-stay", "2"])
+            # An anytime search does not take the pruned grid as its prior
+            with patch.object(app.typer, "echo", wraps=app.typer.echo) as echo:
+                run_search(fares, top_n=3, anytime=True, matrix_path=path)
+
+        self.assertTrue(matrix.pruned)
+        self.assertLess(len(matrix), len(fares))
+        self.assertEqual(queried.exit_code, 0, queried.output)
+        self.assertIn("--prune search", queried.output)
+        self.assertTrue(any("was pruned" in str(call.args[0]) for call in echo.call_args_list))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+Pair = tuple[date, Optional[date]]
+
+
+@dataclass
+class PairState:
+    price: Optional[float] = None
+    checked_at: float = 0.0
+
+    @property
+    def checked(self) -> bool:
+        return self.checked_at > 0
+
+
+def pair_key(pair: Pair) -> str:
+    departure_date, return_date = pair
+    return f"{departure_date.isoformat()}/{return_date.isoformat() if return_date else ''}"
+
+
+def parse_pair_key(key: str) -> Pair:
+    departure, _, ret = key.partition("/")
+    return date.fromisoformat(departure), date.fromisoformat(ret) if ret else None
+
+
+class WatchPlanner:
+    """
+    Decides which date pair to re-price next.
+
+    Every pair remembers its last price and when it was checked. A pair's re-check
+    interval grows with its distance from the current best price: pairs at the best
+    price are due every `hot_interval` seconds, a pair 10% above best every
+    `2 * hot_interval` and so on, capped at `cold_interval`. Pairs that returned no
+    offers are treated as cold, and never-checked pairs are due immediately.
+    """
+
+    def __init__(
+        self,
+        pairs: Iterable[Pair],
+        *,
+        hot_interval: float,
+        cold_interval: float,
+        states: Optional[dict[Pair, PairState]] = None,
+        heat: float = 10.0,
+    ) -> None:
+        self.hot_interval = hot_interval
+        self.cold_interval = max(cold_interval, hot_interval)
+        self.heat = heat
+        known = states or {}
+        self.states: dict[Pair, PairState] = {pair: known.get(pair, PairState()) for pair in pairs}
+
+    def _watched(self, today: Optional[date]) -> Iterator[tuple[Pair, PairState]]:
+        for pair, state in self.states.items():
+            if today is None or pair[0] >= today:
+                yield pair, state
+
+    def best(self, *, today: Optional[date] = None) -> Optional[tuple[Pair, float]]:
+        """The cheapest (pair, price) seen, among pairs departing on or after `today`."""
+        priced = [(state.price, pair) for pair, state in self._watched(today) if state.price is not None]
+        if not priced:
+            return None
+        price, pair = min(priced)
+        return pair, price
+
+    def interval(self, pair: Pair, best_price: Optional[float]) -> float:
+        state = self.states[pair]
+        if state.price is None or best_price is None or best_price <= 0:
+            return self.cold_interval
+        gap = max(0.0, (state.price - best_price) / best_price)
+        return min(self.cold_interval, self.hot_interval * (1 + self.heat * gap))
+
+    def next_due(self, *, today: Optional[date] = None) -> Optional[tuple[Pair, float]]:
+        """The (pair, due timestamp) to check next, skipping departures before `today`."""
+        best = self.best(today=today)
+        best_price = best[1] if best else None
+        candidate: Optional[tuple[Pair, float]] = None
+        for pair, state in self._watched(today):
+            due_at = state.checked_at + self.interval(pair, best_price) if state.checked else 0.0
+            if candidate is None or due_at < candidate[1]:
+                candidate = (pair, due_at)
+        return candidate
+
+    def warmed_up(self, *, today: Optional[date] = None) -> bool:
+        """True once every pair departing on or after `today` has been priced at least once."""
+        return all(state.checked for _, state in self._watched(today))
+
+    def record(self, pair: Pair, price: Optional[float], now: float, *, today: Optional[date] = None) -> Optional[float]:
+        """Store a check; returns the previous best price (as of `today`) when this one beats it."""
+        best = self.best(today=today)
+        self.states[pair] = PairState(price=price, checked_at=now)
+        if price is None or best is None or price >= best[1]:
+            return None
+        return best[1]
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            pair_key(pair): {"price": state.price, "checked_at": state.checked_at}
+            for pair, state in self.states.items()
+            if state.checked
+        }
+
+
+def load_states(path: Path) -> dict[Pair, PairState]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+    states: dict[Pair, PairState] = {}
+    for key, value in (data.get("pairs") or {}).items():
+        try:
+            states[parse_pair_key(key)] = PairState(
+                price=value.get("price"),
+                checked_at=float(value.get("checked_at") or 0.0),
+            )
+        except (ValueError, AttributeError):
+            continue
+    return states
+
+
+def save_states(path: Path, planner: WatchPlanner, meta: dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({**meta, "pairs": planner.to_json()}, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    tmp.replace(path)
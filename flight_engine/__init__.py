@@ -0,0 +1,35 @@
+"""Amadeus flight search engine shared by the Django app and the CLI."""
+
+from .airports import Airport, AirportIndex, load_airports
+from .cache import TTLCache
+from .coalesce import CallLockTable, SingleFlight
+from .engine import SearchEngine, new_client
+from .fx import FxRates, FxTable
+from .offers import cheapest_offer, offer_total
+from .profiling import Profiler
+from .query import OfferQuery
+from .scheduler import RateLimiter, run_tasks
+from .store import ResultStore
+from .tokens import SharedAccessToken, TokenStore
+
+__all__ = [
+    "Airport",
+    "AirportIndex",
+    "CallLockTable",
+    "FxRates",
+    "FxTable",
+    "OfferQuery",
+    "Profiler",
+    "RateLimiter",
+    "ResultStore",
+    "SearchEngine",
+    "SharedAccessToken",
+    "SingleFlight",
+    "TTLCache",
+    "TokenStore",
+    "cheapest_offer",
+    "load_airports",
+    "new_client",
+    "offer_total",
+    "run_tasks",
+]
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import csv
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+EARTH_RADIUS_KM = 6371.0
+DATASET = Path(__file__).with_name("data") / "airports.csv"
+
+# Airport sizes, smallest first; the dataset uses OurAirports' `<size>_airport` types.
+SIZES = ("small", "medium", "large")
+
+
+@dataclass(frozen=True)
+class Airport:
+    code: str
+    name: str
+    city: str
+    country: str
+    latitude: float
+    longitude: float
+    size: str
+
+
+def haversine_km(latitude_1: float, longitude_1: float, latitude_2: float, longitude_2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi_1, phi_2 = math.radians(latitude_1), math.radians(latitude_2)
+    d_phi = phi_2 - phi_1
+    d_lambda = math.radians(longitude_2 - longitude_1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi_1) * math.cos(phi_2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class AirportIndex:
+    """
+    Airports bucketed on a latitude/longitude grid for radius queries.
+
+    A query only visits the grid cells overlapping the bounding box of its circle
+    (wrapping across the antimeridian, and spanning every longitude near the
+    poles) and computes exact great-circle distances for the airports in them.
+    With the default 2-degree cells a few-hundred-kilometre radius touches a
+    handful of cells instead of the whole dataset.
+    """
+
+    def __init__(self, airports: Iterable[Airport], *, cell_degrees: float = 2.0) -> None:
+        self.cell_degrees = cell_degrees
+        self._columns = math.ceil(360 / cell_degrees)
+        self._by_code: dict[str, Airport] = {}
+        self._cells: dict[tuple[int, int], list[Airport]] = {}
+        for airport in airports:
+            self._by_code[airport.code] = airport
+            self._cells.setdefault(self._cell(airport.latitude, airport.longitude), []).append(airport)
+
+    @classmethod
+    def from_csv(cls, path: Path, **kwargs: float) -> AirportIndex:
+        """Load an OurAirports-style CSV, keeping rows with an IATA code and a known size."""
+        airports = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                code = (row.get("iata_code") or "").strip().upper()
+                size = (row.get("type") or "").replace("_airport", "")
+                if len(code) != 3 or size not in SIZES:
+                    continue
+                airports.append(Airport(
+                    code=code,
+                    name=row["name"],
+                    city=row.get("municipality") or "",
+                    country=row.get("iso_country") or "",
+                    latitude=float(row["latitude_deg"]),
+                    longitude=float(row["longitude_deg"]),
+                    size=size,
+                ))
+        return cls(airports, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._by_code)
+
+    def __iter__(self) -> Iterator[Airport]:
+        return iter(self._by_code.values())
+
+    def get(self, code: str) -> Optional[Airport]:
+        return self._by_code.get(code.strip().upper())
+
+    def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees) % self._columns
+
+    def _candidate_cells(self, latitude: float, longitude: float, radius_km: float) -> Iterable[tuple[int, int]]:
+        angle = radius_km / EARTH_RADIUS_KM
+        lat_span = math.degrees(angle)
+        first_row = math.floor(max(-90.0, latitude - lat_span) / self.cell_degrees)
+        last_row = math.floor(min(90.0, latitude + lat_span) / self.cell_degrees)
+        cos_latitude = math.cos(math.radians(latitude))
+        if latitude + lat_span >= 90 or latitude - lat_span <= -90 or math.sin(angle) >= cos_latitude:
+            # The circle reaches a pole, so it covers every longitude.
+            columns: Iterable[int] = range(self._columns)
+        else:
+            # Widest longitude extent of a spherical circle around `latitude`.
+            lon_span = math.degrees(math.asin(math.sin(angle) / cos_latitude))
+            first = math.floor((longitude - lon_span) / self.cell_degrees)
+            last = math.floor((longitude + lon_span) / self.cell_degrees)
+            columns = {column % self._columns for column in range(first, last + 1)}
+        for row in range(first_row, last_row + 1):
+            for column in columns:
+                yield row, column
+
+    def within(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        *,
+        min_size: Optional[str] = None,
+    ) -> list[tuple[Airport, float]]:
+        """(airport, distance in km) pairs within `radius_km` of a point, nearest first."""
+        allowed = SIZES[SIZES.index(min_size):] if min_size else SIZES
+        found = []
+        for cell in self._candidate_cells(latitude, longitude, radius_km):
+            for airport in self._cells.get(cell, ()):
+                if airport.size not in allowed:
+                    continue
+                distance = haversine_km(latitude, longitude, airport.latitude, airport.longitude)
+                if distance <= radius_km:
+                    found.append((airport, distance))
+        found.sort(key=lambda item: (item[1], item[0].code))
+        return found
+
+    def near(self, code: str, radius_km: float, *, min_size: Optional[str] = None) -> list[tuple[Airport, float]]:
+        """Airports within `radius_km` of the airport `code` (itself included), nearest first."""
+        airport = self.get(code)
+        if airport is None:
+            raise KeyError(code)
+        return self.within(airport.latitude, airport.longitude, radius_km, min_size=min_size)
+
+
+@lru_cache(maxsize=1)
+def load_airports() -> AirportIndex:
+    """The index over the bundled airport dataset, built once per process."""
+    return AirportIndex.from_csv(DATASET)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+MISSING: Any = object()
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with a per-entry time to live and LRU eviction.
+
+    Empty results are cached like any other value, so a route without offers is
+    not re-queried on every page load. `ttl <= 0` disables caching entirely.
+
+    With a `grace` period, an expired entry is kept for `grace` more seconds.
+    `get()` ignores it, but `lookup()` still returns it, flagged as stale, so the
+    caller can serve it while it fetches a fresh value.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        *,
+        maxsize: int = 1024,
+        grace: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.grace = max(0.0, grace)
+        self.clock = clock
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        # key -> (stored at, value)
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _entry(self, key: Hashable, now: float) -> Optional[tuple[float, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] + self.ttl + self.grace <= now:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            now = self.clock()
+            entry = self._entry(key, now)
+            if entry is None or entry[0] + self.ttl <= now:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def lookup(self, key: Hashable) -> Optional[tuple[Any, bool]]:
+        """(value, stale) for an entry that is fresh or within its grace period, else None."""
+        with self._lock:
+            now = self.clock()
+            entry = self._entry(key, now)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            stale = entry[0] + self.ttl <= now
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return entry[1], stale
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since the entry for `key` was stored, without counting a hit or a miss."""
+        with self._lock:
+            now = self.clock()
+            entry = self._entry(key, now)
+            return None if entry is None else now - entry[0]
+
+    def set(self, key: Hashable, value: Any, *, age: float = 0.0) -> None:
+        """Store `value`, fetched `age` seconds ago (a result another process fetched earlier)."""
+        if self.ttl <= 0 or age >= self.ttl + self.grace:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() - max(0.0, age), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Hashable, Optional, TypeVar, Union
+
+from .cache import MISSING
+
+R = TypeVar("R")
+
+_CLAIMED: Any = object()
+_BUSY: Any = object()
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Runs one call per key at a time within a process; concurrent callers share it.
+
+    The first caller for a key runs `fn`. Callers arriving while it is in flight
+    wait for it and get its result, or its exception, instead of repeating the
+    upstream request. The key is forgotten as soon as the call finishes, so a
+    later caller starts a new call. Caching results is left to the caller.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.shared = 0
+        self._inflight: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], R]) -> R:
+        with self._lock:
+            call = self._inflight.get(key)
+            if call is None:
+                call = self._inflight[key] = _Call()
+                leader = True
+                self.calls += 1
+            else:
+                leader = False
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+        return call.value
+
+
+class CallLockTable:
+    """
+    Cross-process counterpart of `SingleFlight`, through a small SQLite file.
+
+    A process about to make an upstream call claims the call's key in the table.
+    Other processes that want the same call find the claim and wait for it to end.
+    When it ends they read the result, which the claimant leaves behind for
+    `result_ttl` seconds. If a claimant fails, the next process retries the call
+    itself. A claimant that dies holding a claim loses it after `claim_ttl` seconds.
+    Results are stored as JSON, so only JSON-serializable results are shared.
+
+    Each result keeps the time its call started. `fetch()` returns it with the
+    result, so a caller can tell how old the result is. A caller can also pass
+    `max_age` to make the call itself rather than read an older result.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        claim_ttl: float = 30.0,
+        result_ttl: float = 10.0,
+        poll_interval: float = 0.05,
+        timeout: float = 30.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path)
+        self.claim_ttl = claim_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.clock = clock
+        self.owner = uuid.uuid4().hex
+        self.calls = 0
+        self.shared = 0
+        self._local = threading.local()
+
+    def _connection(self) -> Any:
+        # sqlite3 connections may not cross threads, so each thread opens its own.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            import sqlite3
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+            connection = sqlite3.connect(str(self.path), timeout=self.timeout, isolation_level=None)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS calls (key TEXT PRIMARY KEY, owner TEXT, claimed_until REAL NOT NULL, "
+                "result TEXT, result_until REAL NOT NULL DEFAULT 0, fetched_at REAL NOT NULL DEFAULT 0)"
+            )
+            try:
+                # Tables created before results kept their fetch time
+                connection.execute("ALTER TABLE calls ADD COLUMN fetched_at REAL NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+
+    def _claim(self, key: str, max_age: Optional[float]) -> Any:
+        """A fresh stored (result, fetched at), else `_CLAIMED` if this process now holds the claim, else `_BUSY`."""
+        connection = self._connection()
+        now = self.clock()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT owner, claimed_until, result, result_until, fetched_at FROM calls WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[2] is not None and row[3] > now and (max_age is None or now - row[4] < max_age):
+                return json.loads(row[2]), row[4]
+            if row is not None and row[0] is not None and row[1] > now:
+                return _BUSY
+            connection.execute(
+                "INSERT OR REPLACE INTO calls (key, owner, claimed_until) VALUES (?, ?, ?)",
+                (key, self.owner, now + self.claim_ttl),
+            )
+            # Claiming is rare enough to sweep rows nobody will read again here.
+            connection.execute(
+                "DELETE FROM calls WHERE claimed_until <= ? AND result_until <= ?", (now, now)
+            )
+            return _CLAIMED
+        finally:
+            connection.execute("COMMIT")
+
+    def _release(self, key: str, value: Any, fetched_at: float) -> None:
+        result, result_until = (None, 0.0) if value is MISSING else (json.dumps(value), self.clock() + self.result_ttl)
+        self._connection().execute(
+            "UPDATE calls SET owner = NULL, claimed_until = 0, result = ?, result_until = ?, fetched_at = ? "
+            "WHERE key = ? AND owner = ?",
+            (result, result_until, fetched_at, key, self.owner),
+        )
+
+    def do(self, key: Hashable, fn: Callable[[], R], *, max_age: Optional[float] = None) -> R:
+        return self.fetch(key, fn, max_age=max_age)[0]
+
+    def fetch(self, key: Hashable, fn: Callable[[], R], *, max_age: Optional[float] = None) -> tuple[R, float]:
+        """Like `do()`, with the time (by `clock`) the call that produced the result started."""
+        name = self._key(key)
+        deadline = self.clock() + self.claim_ttl
+        while True:
+            claimed = self._claim(name, max_age)
+            if claimed is _CLAIMED:
+                break
+            if claimed is not _BUSY:
+                self.shared += 1
+                return claimed
+            if self.clock() >= deadline:
+                # The claimant is taking too long; make the call rather than fail.
+                fetched_at = self.clock()
+                return fn(), fetched_at
+            time.sleep(self.poll_interval)
+
+        self.calls += 1
+        value: Any = MISSING
+        fetched_at = self.clock()
+        try:
+            value = fn()
+        finally:
+            try:
+                self._release(name, value, fetched_at)
+            except (TypeError, ValueError):
+                # Not JSON-serializable: release the claim without sharing the result.
+                self._release(name, MISSING, fetched_at)
+        return value, fetched_at
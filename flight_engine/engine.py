@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import replace
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, Callable, Hashable, Iterable, Iterator, Optional, TypeVar
+
+from .cache import TTLCache
+from .coalesce import CallLockTable, SingleFlight
+from .fx import FxRates, convert_offer, convert_price_metrics
+from .offers import cheapest_offer
+from .query import OfferQuery
+from .scheduler import RateLimiter, run_tasks
+from .tokens import SharedAccessToken, TokenStore
+
+if TYPE_CHECKING:
+    from amadeus import Client
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def new_client(*, pooled: bool = True, token_store: Optional[TokenStore] = None, **kwargs: Any) -> Client:
+    """
+    Build an Amadeus client; the SDK is imported here so importing the engine stays cheap.
+
+    Unless `pooled=False` or an `http` handler is passed, the client talks to the
+    API over a keep-alive `PooledTransport` and decodes with the fastest JSON parser.
+    Its OAuth token is a `SharedAccessToken`, renewed ahead of expiry and shared
+    through `token_store` with other processes when one is given.
+    """
+    from amadeus import Client
+
+    if pooled and "http" not in kwargs:
+        from .transport import PooledTransport, install_fast_json
+
+        install_fast_json()
+        kwargs["http"] = PooledTransport()
+    client = Client(**kwargs)
+    # The SDK creates its own AccessToken only when the client has none yet.
+    client.access_token = SharedAccessToken(client, token_store)
+    return client
+
+
+def _params_key(endpoint: str, params: dict[str, Any]) -> Hashable:
+    return endpoint, tuple(sorted((k, str(v)) for k, v in params.items()))
+
+
+class SearchEngine:
+    """
+    Cached, rate-limited access to the Amadeus endpoints the app and the CLI use.
+
+    Every upstream call goes through one client (one OAuth token), one optional
+    `TTLCache` keyed on the normalized request and one optional `RateLimiter`;
+    cache hits never wait for a rate-limit slot. Identical requests made while one
+    is in flight wait for it and share its result: within the process always, and
+    across processes when a `CallLockTable` is given. `run()` fans work out over a
+    bounded thread pool, so concurrent callers share the same budget.
+
+    When the cache has a grace period, an expired entry is served immediately while
+    a background thread refreshes it. At most `refresh_budget` refreshes run at once
+    and each key is refreshed once at a time, so a burst of requests for popular
+    expired routes costs one upstream call per route and never queues behind it.
+    A result read from the lock table enters the cache with the age it already has,
+    and a refresh only takes one from there that is still within the TTL.
+
+    With a `canonical_currency` and `FxRates`, offers and price metrics are always
+    fetched and cached in the canonical currency. Requests in another currency get
+    converted copies, flagged with the rate used, so one upstream call serves every
+    currency. While no rates are available, other currencies are fetched directly.
+    """
+
+    def __init__(
+        self,
+        client: Optional[Client] = None,
+        *,
+        cache: Optional[TTLCache] = None,
+        limiter: Optional[RateLimiter] = None,
+        workers: int = 1,
+        locks: Optional[CallLockTable] = None,
+        refresh_budget: int = 2,
+        canonical_currency: Optional[str] = None,
+        fx: Optional[FxRates] = None,
+    ) -> None:
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.cache = cache
+        self.limiter = limiter
+        self.workers = max(1, workers)
+        self.locks = locks
+        self.inflight = SingleFlight()
+        self.refresh_budget = refresh_budget
+        self.refreshes_skipped = 0
+        self._refreshing: set[Hashable] = set()
+        self._refresh_lock = threading.Lock()
+        self.canonical_currency = canonical_currency.upper() if canonical_currency else None
+        self.fx = fx
+
+    @property
+    def client(self) -> Client:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = new_client()
+        return self._client
+
+    def warm_up(self) -> None:
+        """Get the OAuth token (and with it a pooled connection) before the first search needs them."""
+        token = getattr(self.client, "access_token", None)
+        if isinstance(token, SharedAccessToken):
+            token.token()
+
+    def transport_stats(self) -> Optional[dict[str, Any]]:
+        """Connection reuse counters when the client uses a `PooledTransport`."""
+        stats = getattr(getattr(self._client, "http", None), "stats", None)
+        return stats.to_json() if stats is not None else None
+
+    def _call(self, key: Hashable, fetch: Callable[[], R]) -> R:
+        max_age = None
+        if self.cache is not None:
+            entry = self.cache.lookup(key)
+            if entry is not None:
+                value, stale = entry
+                if stale:
+                    self._revalidate(key, fetch)
+                return value
+            if self.cache.ttl > 0:
+                # A shared result too old for the cache would be served once as if it were fresh
+                max_age = self.cache.ttl + self.cache.grace
+        return self.inflight.do(key, lambda: self._fetch(key, fetch, max_age=max_age))
+
+    def _revalidate(self, key: Hashable, fetch: Callable[[], Any]) -> None:
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            if len(self._refreshing) >= self.refresh_budget:
+                # Over budget: keep serving the stale entry; a later request retries the refresh.
+                self.refreshes_skipped += 1
+                return
+            self._refreshing.add(key)
+
+        def run() -> None:
+            try:
+                # The shared result may be the very one going stale here, so only a fresh one will do
+                self.inflight.do(key, lambda: self._fetch(key, fetch, max_age=self.cache.ttl))
+            except Exception as e:
+                # The stale entry stays in use until its grace period ends.
+                logger.warning("Background cache refresh failed: %s", e)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name="flight-engine-refresh", daemon=True).start()
+
+    def _fetch(self, key: Hashable, fetch: Callable[[], R], *, max_age: Optional[float] = None) -> R:
+        def upstream() -> R:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            return fetch()
+
+        age = 0.0
+        if self.locks is not None:
+            value, fetched_at = self.locks.fetch(key, upstream, max_age=max_age)
+            age = self.locks.clock() - fetched_at
+        else:
+            value = upstream()
+        if self.cache is not None:
+            self.cache.set(key, value, age=age)
+        return value
+
+    def conversion(self, currency: str) -> Optional[dict[str, Any]]:
+        """How results in `currency` are converted from the canonical currency, or None when they are not."""
+        currency = currency.upper()
+        if self.fx is None or self.canonical_currency is None or currency == self.canonical_currency:
+            return None
+        table = self.fx.table()
+        rate = table.rate(self.canonical_currency, currency) if table is not None else None
+        if rate is None:
+            return None
+        return {"from": self.canonical_currency, "to": currency, "rate": str(rate), "as_of": table.as_of}
+
+    def _canonical_query(self, query: OfferQuery) -> OfferQuery:
+        # maxPrice is in the requested currency, so such searches are never converted
+        if query.max_price is None and self.conversion(query.currency) is not None:
+            return replace(query, currency=self.canonical_currency)
+        return query
+
+    def offers(self, query: OfferQuery, *, observe: Optional[Callable[[Any], None]] = None) -> list[dict[str, Any]]:
+        """Raw flight offers for `query`, in the order the API returned them (converted when flagged so)."""
+        conversion = self.conversion(query.currency) if query.max_price is None else None
+        if conversion is not None:
+            offers = self.offers(replace(query, currency=self.canonical_currency), observe=observe)
+            rate = Decimal(conversion["rate"])
+            return [convert_offer(offer, rate, conversion["to"], conversion) for offer in offers]
+
+        def fetch() -> list[dict[str, Any]]:
+            response = self.client.shopping.flight_offers_search.get(**query.to_params())
+            if observe is not None:
+                observe(response)
+            return response.data or []
+
+        return self._call(("offers", query), fetch)
+
+    def offers_age(self, query: OfferQuery) -> Optional[float]:
+        """Seconds since the cached offers for `query` were fetched, or None when none are cached."""
+        return self.cache.age(("offers", self._canonical_query(query))) if self.cache is not None else None
+
+    def cheapest(
+        self, query: OfferQuery, *, observe: Optional[Callable[[Any], None]] = None
+    ) -> tuple[Optional[Decimal], Optional[dict[str, Any]]]:
+        return cheapest_offer(self.offers(query, observe=observe))
+
+    def price_metrics(self, **params: Any) -> Any:
+        """Raw Itinerary Price Metrics data (converted when flagged so)."""
+        conversion = self.conversion(params["currencyCode"]) if params.get("currencyCode") else None
+        if conversion is not None:
+            data = self.price_metrics(**{**params, "currencyCode": self.canonical_currency})
+            return convert_price_metrics(data, Decimal(conversion["rate"]), conversion["to"], conversion)
+        return self._call(
+            _params_key("metrics", params),
+            lambda: self.client.analytics.itinerary_price_metrics.get(**params).data,
+        )
+
+    def trip_purpose(self, **params: Any) -> Any:
+        """Raw Trip Purpose Prediction data."""
+        return self._call(
+            _params_key("trip_purpose", params),
+            lambda: self.client.travel.predictions.trip_purpose.get(**params).data,
+        )
+
+    def locations(self, **params: Any) -> Any:
+        """Raw Airport & City Search data."""
+        return self._call(
+            _params_key("locations", params),
+            lambda: self.client.reference_data.locations.get(**params).data,
+        )
+
+    def run(
+        self, tasks: Iterable[T], fn: Callable[[T], R], *, workers: Optional[int] = None
+    ) -> Iterator[tuple[T, Optional[R], Optional[Exception]]]:
+        """`run_tasks` on this engine's pool size; rate limiting happens inside each upstream call."""
+        return run_tasks(tasks, fn, workers=workers or self.workers)
+
+    def prefetch(self, params_list: Iterable[dict[str, Any]]) -> None:
+        """
+        Warm the cache with offers for Amadeus-style search params, concurrently.
+
+        Errors are dropped here: the caller re-runs each search afterwards and
+        handles failures per search as before.
+        """
+        if self.cache is None or self.workers <= 1:
+            return
+        for _ in self.run(params_list, lambda params: self.offers(OfferQuery.from_params(params))):
+            pass
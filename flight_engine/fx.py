@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Euro foreign exchange reference rates, published by the ECB every working day around 16:00 CET.
+ECB_DAILY_URL = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
+
+_CENT = Decimal("0.01")
+
+
+@dataclass(frozen=True)
+class FxTable:
+    """Units of each currency per one unit of `base`, as published on `as_of`."""
+
+    base: str
+    rates: dict[str, Decimal]
+    as_of: str
+    fetched_at: float
+
+    def rate(self, source: str, target: str) -> Optional[Decimal]:
+        """Units of `target` per unit of `source`, or None when either currency is not in the table."""
+        source_rate = Decimal(1) if source == self.base else self.rates.get(source)
+        target_rate = Decimal(1) if target == self.base else self.rates.get(target)
+        if not source_rate or not target_rate:
+            return None
+        return target_rate / source_rate
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "base": self.base,
+            "rates": {currency: str(rate) for currency, rate in self.rates.items()},
+            "as_of": self.as_of,
+            "fetched_at": self.fetched_at,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> FxTable:
+        return cls(
+            base=data["base"],
+            rates={currency: Decimal(rate) for currency, rate in data["rates"].items()},
+            as_of=data["as_of"],
+            fetched_at=float(data["fetched_at"]),
+        )
+
+
+def parse_ecb_rates(body: bytes, fetched_at: float) -> FxTable:
+    """An `FxTable` from the ECB's daily reference rates XML."""
+    from xml.etree import ElementTree
+
+    rates: dict[str, Decimal] = {}
+    as_of = ""
+    for element in ElementTree.fromstring(body).iter():
+        if not element.tag.endswith("Cube"):
+            continue
+        if element.get("time"):
+            as_of = element.get("time", "")
+        if element.get("currency") and element.get("rate"):
+            try:
+                rates[element.get("currency", "")] = Decimal(element.get("rate", ""))
+            except InvalidOperation:
+                continue
+    if not rates:
+        raise ValueError("No exchange rates in the response")
+    return FxTable(base="EUR", rates=rates, as_of=as_of, fetched_at=fetched_at)
+
+
+class FxRates:
+    """
+    A locally cached exchange rate table, refreshed from the ECB on a schedule.
+
+    The table is kept in memory and, when `path` is given, in a JSON file. A
+    restarted process therefore reuses the rates it already had. Once the table is
+    `refresh_interval` seconds old it is refreshed on a background thread while the
+    old rates stay in use. A table older than `max_age` is not used. After a failed
+    fetch, nothing is tried again for `retry_interval` seconds, so an unreachable
+    feed costs one timeout rather than one per request.
+    """
+
+    def __init__(
+        self,
+        url: str = ECB_DAILY_URL,
+        *,
+        path: Optional[Union[str, Path]] = None,
+        refresh_interval: float = 6 * 3600.0,
+        max_age: float = 4 * 86400.0,
+        retry_interval: float = 300.0,
+        timeout: float = 5.0,
+        clock: Callable[[], float] = time.time,
+        fetch: Optional[Callable[[], FxTable]] = None,
+    ) -> None:
+        self.url = url
+        self.path = Path(path) if path else None
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.clock = clock
+        self._fetch = fetch or self._fetch_ecb
+        self._table: Optional[FxTable] = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._background = threading.Lock()
+
+    def _fetch_ecb(self) -> FxTable:
+        from urllib.request import urlopen
+
+        with urlopen(self.url, timeout=self.timeout) as response:
+            return parse_ecb_rates(response.read(), self.clock())
+
+    def _load(self) -> Optional[FxTable]:
+        if self.path is None or not self.path.exists():
+            return None
+        try:
+            return FxTable.from_json(json.loads(self.path.read_text(encoding="utf-8")))
+        except (OSError, ValueError, KeyError, InvalidOperation) as e:
+            logger.warning("Ignoring unreadable exchange rate cache %s: %s", self.path, e)
+            return None
+
+    def _save(self, table: FxTable) -> None:
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.path.with_suffix(".tmp")
+            temporary.write_text(json.dumps(table.to_json()), encoding="utf-8")
+            temporary.replace(self.path)
+        except OSError as e:
+            logger.warning("Could not save exchange rates to %s: %s", self.path, e)
+
+    def _usable(self, table: Optional[FxTable]) -> bool:
+        return table is not None and self.clock() - table.fetched_at < self.max_age
+
+    def refresh(self) -> Optional[FxTable]:
+        """Fetch the current rates; on failure keep the table there is and back off."""
+        try:
+            table = self._fetch()
+        except Exception as e:
+            logger.warning("Exchange rate refresh failed: %s", e)
+            self._retry_at = self.clock() + self.retry_interval
+            return self._table
+        self._table = table
+        self._save(table)
+        return table
+
+    def table(self) -> Optional[FxTable]:
+        """The current rate table, or None when no usable rates could be had."""
+        table = self._table
+        if table is None or not self._usable(table):
+            with self._lock:
+                if self._table is None:
+                    self._table = self._load()
+                if not self._usable(self._table) and self.clock() >= self._retry_at:
+                    self.refresh()
+                table = self._table
+            if not self._usable(table):
+                return None
+        if self.clock() - table.fetched_at >= self.refresh_interval and self.clock() >= self._retry_at:
+            self._refresh_in_background()
+        return table
+
+    def _refresh_in_background(self) -> None:
+        if not self._background.acquire(blocking=False):
+            return
+
+        def run() -> None:
+            try:
+                with self._lock:
+                    self.refresh()
+            finally:
+                self._background.release()
+
+        threading.Thread(target=run, name="fx-rates-refresh", daemon=True).start()
+
+
+def convert_amount(value: Any, rate: Decimal) -> Any:
+    """`value` (a decimal string, as the API sends amounts) times `rate`, to the cent."""
+    try:
+        return str((Decimal(str(value)) * rate).quantize(_CENT, rounding=ROUND_HALF_UP))
+    except (InvalidOperation, TypeError):
+        return value
+
+
+def _convert_price(price: dict[str, Any], rate: Decimal, currency: str) -> None:
+    for field in ("total", "base", "grandTotal"):
+        if field in price:
+            price[field] = convert_amount(price[field], rate)
+    for item in price.get("fees", []) + price.get("taxes", []) + price.get("additionalServices", []):
+        if "amount" in item:
+            item["amount"] = convert_amount(item["amount"], rate)
+    if "currency" in price:
+        price["currency"] = currency
+
+
+def convert_offer(offer: dict[str, Any], rate: Decimal, currency: str, converted: dict[str, str]) -> dict[str, Any]:
+    """A copy of a flight offer with every price in `currency`, flagged with `price.converted`."""
+    offer = copy.deepcopy(offer)
+    _convert_price(offer.setdefault("price", {}), rate, currency)
+    for traveler in offer.get("travelerPricings", []):
+        _convert_price(traveler.get("price", {}), rate, currency)
+    offer["price"]["converted"] = converted
+    return offer
+
+
+def convert_price_metrics(data: Any, rate: Decimal, currency: str, converted: dict[str, str]) -> Any:
+    """A copy of Itinerary Price Metrics data in `currency`, each item flagged with `converted`."""
+    data = copy.deepcopy(data)
+    for item in data or []:
+        for metric in item.get("priceMetrics", []):
+            if "amount" in metric:
+                metric["amount"] = convert_amount(metric["amount"], rate)
+        item["currencyCode"] = currency
+        item["converted"] = converted
+    return data
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from decimal import Decimal, InvalidOperation
+from typing import Any, Iterable, Optional
+
+
+def offer_total(offer: dict[str, Any]) -> Decimal:
+    price = offer.get("price") or {}
+    value = price.get("grandTotal") or price.get("total")
+    if value is None:
+        raise ValueError("Offer missing price.total / price.grandTotal")
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError) as e:
+        raise ValueError(f"Invalid price value: {value!r}") from e
+
+
+def cheapest_offer(offers: Iterable[dict[str, Any]]) -> tuple[Optional[Decimal], Optional[dict[str, Any]]]:
+    """The (total, offer) with the lowest total, or (None, None) when there are no offers."""
+    best: Optional[tuple[Decimal, dict[str, Any]]] = None
+    for offer in offers:
+        total = offer_total(offer)
+        if best is None or total < best[0]:
+            best = (total, offer)
+    return best if best is not None else (None, None)
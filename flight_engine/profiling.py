@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import io
+import sys
+import threading
+import time
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Callable, Optional, TypeVar, Union
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class Profiler:
+    """
+    Deterministic (cProfile) profile of a block of code, its `run_tasks` work included.
+
+    Searches run their upstream calls on `run_tasks` worker threads, which a plain
+    cProfile of the calling thread would only see as time spent waiting. Before
+    Python 3.12 each task the block hands to `run_tasks` runs under a profiler of
+    its own, which is stopped when the task ends and merged on exit. Threads the
+    block has nothing to do with, such as other requests or background refreshes,
+    are left alone. From 3.12 on, cProfile already sees every thread.
+    Profiling is process-wide, so only one `Profiler` may run at a time; starting
+    a second one raises `RuntimeError`.
+    """
+
+    _running = threading.Lock()
+    _active: Optional[Profiler] = None
+
+    def __init__(self) -> None:
+        self.elapsed = 0.0
+        self.stats: Any = None
+        self._profiler: Any = None
+        self._task_profilers: list[Any] = []
+        # Threads whose work belongs to this profile: the block's own and those running its tasks.
+        self._threads: set[int] = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> Profiler:
+        self.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        import cProfile
+
+        if not Profiler._running.acquire(blocking=False):
+            raise RuntimeError("Another profile is already running in this process")
+        self._profiler = cProfile.Profile()
+        self._threads = {threading.get_ident()}
+        Profiler._active = self
+        self._started = time.perf_counter()
+        self._profiler.enable()
+
+    def stop(self) -> None:
+        self._profiler.disable()
+        self.elapsed = time.perf_counter() - self._started
+        try:
+            import pstats
+
+            with self._lock:
+                Profiler._active = None
+                self._threads.clear()
+                # Only tasks that have finished, so every profiler merged here is already disabled.
+                task_profilers, self._task_profilers = self._task_profilers, []
+            self.stats = pstats.Stats(self._profiler)
+            for profiler in task_profilers:
+                self.stats.add(profiler)
+        finally:
+            Profiler._running.release()
+
+    def _run_task(self, fn: Callable[[T], R], task: T) -> R:
+        import cProfile
+
+        ident = threading.get_ident()
+        with self._lock:
+            # Already covered (a task run inline on the block's thread), or the profile is over.
+            if ident in self._threads or Profiler._active is not self:
+                return fn(task)
+            self._threads.add(ident)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return fn(task)
+        finally:
+            profiler.disable()
+            with self._lock:
+                self._threads.discard(ident)
+                if Profiler._active is self:
+                    self._task_profilers.append(profiler)
+
+    def dump(self, path: Union[str, Path]) -> Path:
+        """Save the profile for `pstats`, snakeviz or similar viewers."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.stats.dump_stats(str(path))
+        return path
+
+    def report(self, limit: int = 15, sort: str = "cumulative") -> str:
+        """The `limit` hottest functions, by cumulative time unless another `pstats` sort key is given."""
+        out = io.StringIO()
+        self.stats.stream = out
+        self.stats.sort_stats(sort).print_stats(limit)
+        lines = [line for line in out.getvalue().splitlines() if line.strip()]
+        return f"Profiled {self.elapsed * 1000:.0f} ms\n" + "\n".join(lines)
+
+
+def profiled(fn: Callable[[T], R]) -> Callable[[T], R]:
+    """`fn`, run under the profile its caller is part of, if any; `run_tasks` wraps its tasks with this."""
+    profiler = Profiler._active
+    if profiler is None or sys.version_info >= (3, 12) or threading.get_ident() not in profiler._threads:
+        return fn
+    return lambda task: profiler._run_task(fn, task)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Mapping, Optional, Union
+
+DateLike = Union[date, str]
+
+
+def _as_date(value: DateLike) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(value.strip())
+
+
+@dataclass(frozen=True)
+class OfferQuery:
+    """
+    One normalized Flight Offers Search request.
+
+    Codes are upper-cased and dates parsed on construction, so equal searches
+    compare (and hash) equal no matter how the caller spelled them. That makes a
+    query usable directly as a cache key.
+    """
+
+    origin: str
+    destination: str
+    departure_date: date
+    return_date: Optional[date] = None
+    adults: int = 1
+    currency: str = "USD"
+    max_offers: Optional[int] = None
+    nonstop: bool = False
+    max_price: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "origin", self.origin.strip().upper())
+        object.__setattr__(self, "destination", self.destination.strip().upper())
+        object.__setattr__(self, "currency", self.currency.strip().upper())
+        object.__setattr__(self, "departure_date", _as_date(self.departure_date))
+        if self.return_date:
+            object.__setattr__(self, "return_date", _as_date(self.return_date))
+        else:
+            object.__setattr__(self, "return_date", None)
+
+    @classmethod
+    def from_params(cls, params: Mapping[str, Any]) -> OfferQuery:
+        """Build a query from Amadeus-style keyword arguments (`originLocationCode`, ...)."""
+        max_offers = params.get("max")
+        max_price = params.get("maxPrice")
+        return cls(
+            origin=params["originLocationCode"],
+            destination=params["destinationLocationCode"],
+            departure_date=params["departureDate"],
+            return_date=params.get("returnDate") or None,
+            adults=int(params.get("adults", 1)),
+            currency=params.get("currencyCode") or "USD",
+            max_offers=int(max_offers) if max_offers is not None else None,
+            nonstop=str(params.get("nonStop", "false")).lower() == "true",
+            max_price=int(max_price) if max_price is not None else None,
+        )
+
+    def to_params(self) -> dict[str, Any]:
+        params: dict[str, Any] = {
+            "originLocationCode": self.origin,
+            "destinationLocationCode": self.destination,
+            "departureDate": self.departure_date.isoformat(),
+            "adults": self.adults,
+            "currencyCode": self.currency,
+        }
+        if self.max_offers is not None:
+            params["max"] = self.max_offers
+        if self.return_date is not None:
+            params["returnDate"] = self.return_date.isoformat()
+        if self.nonstop:
+            params["nonStop"] = "true"
+        if self.max_price is not None:
+            params["maxPrice"] = self.max_price
+        return params
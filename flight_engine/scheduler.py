@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import threading
+import time
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional, TypeVar
+
+from .profiling import profiled
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class RateLimiter:
+    """Thread-safe pacing that hands out at most `rate` request slots per second."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run_tasks(
+    tasks: Iterable[T],
+    fn: Callable[[T], R],
+    *,
+    workers: int = 1,
+    limiter: Optional[RateLimiter] = None,
+) -> Iterator[tuple[T, Optional[R], Optional[Exception]]]:
+    """
+    Run `fn` over `tasks` on a bounded thread pool sharing one rate limiter.
+
+    Yields `(task, result, error)` in completion order. Tasks are pulled lazily so
+    only a couple of requests per worker are ever queued, and exceptions are
+    handed back to the caller instead of aborting the whole sweep.
+    """
+
+    # Work moved to the pool stays part of the caller's profile while it is being profiled.
+    run = profiled(fn) if workers > 1 else fn
+
+    def call(task: T) -> R:
+        if limiter is not None:
+            limiter.acquire()
+        return run(task)
+
+    if workers <= 1:
+        for task in tasks:
+            try:
+                yield task, call(task), None
+            except Exception as e:
+                yield task, None, e
+        return
+
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    task_iter = iter(tasks)
+    pending: dict[Future[R], T] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def fill() -> None:
+            for task in islice(task_iter, 2 * workers - len(pending)):
+                pending[pool.submit(call, task)] = task
+
+        fill()
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = pending.pop(future)
+                    error = future.exception()
+                    if error is not None and not isinstance(error, Exception):
+                        raise error
+                    yield task, (None if error else future.result()), error
+                fill()
+        finally:
+            for future in pending:
+                future.cancel()
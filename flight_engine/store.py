@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+
+class ResultStore:
+    """
+    Search results kept for `ttl` seconds and shared between processes through a small SQLite file.
+
+    A value saved by one worker can be loaded by any other until it expires, after
+    which `load` returns None and the caller decides whether to search again.
+    Values are stored as JSON, so only JSON-serializable values can be saved.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        ttl: float = 1800.0,
+        timeout: float = 30.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.clock = clock
+        self._local = threading.local()
+
+    def _connection(self) -> Any:
+        # sqlite3 connections may not cross threads, so each thread opens its own.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            import sqlite3
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+            connection = sqlite3.connect(str(self.path), timeout=self.timeout, isolation_level=None)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def save(self, key: str, value: Any) -> None:
+        connection = self._connection()
+        now = self.clock()
+        connection.execute(
+            "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), now + self.ttl),
+        )
+        # Saving happens once per search, so expired results are swept here.
+        connection.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+
+    def load(self, key: str) -> Optional[Any]:
+        row = self._connection().execute(
+            "SELECT value FROM results WHERE key = ? AND expires_at > ?", (key, self.clock())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class TokenStore:
+    """
+    OAuth access tokens shared between processes through a small SQLite file.
+
+    Workers read the token another worker already fetched instead of each
+    authenticating on its own. `locked()` holds SQLite's write lock while one
+    process fetches a new token, so the others wait and then read its result
+    rather than fetching in parallel. The file holds credentials and is created
+    readable by its owner only.
+    """
+
+    def __init__(self, path: Union[str, Path], *, timeout: float = 30.0) -> None:
+        self.path = Path(path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> Any:
+        # sqlite3 connections may not cross threads, so each thread opens its own.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            import sqlite3
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+            connection = sqlite3.connect(str(self.path), timeout=self.timeout, isolation_level=None)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tokens "
+                "(key TEXT PRIMARY KEY, access_token TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def load(self, key: str) -> Optional[tuple[str, float]]:
+        row = self._connection().execute(
+            "SELECT access_token, expires_at FROM tokens WHERE key = ?", (key,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def save(self, key: str, access_token: str, expires_at: float) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO tokens (key, access_token, expires_at) VALUES (?, ?, ?)",
+            (key, access_token, expires_at),
+        )
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the store's write lock; other processes block in `locked()` until it is released."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+
+class SharedAccessToken:
+    """
+    Drop-in for the SDK's `AccessToken` that shares the token and renews it early.
+
+    The SDK fetches a token on the first request of every client and again once
+    it has expired, so whichever request comes first pays for the round trip.
+    This keeps the token in an optional `TokenStore` shared by every process using
+    the same credentials and host. Once the token is within `refresh_margin`
+    seconds of expiring it is renewed on a background thread while requests keep
+    using the still-valid one; only a missing or expired token blocks a request.
+    """
+
+    # Like the SDK, never send a token this close to its expiry.
+    EXPIRY_BUFFER = 10
+
+    def __init__(
+        self,
+        client: Any,
+        store: Optional[TokenStore] = None,
+        *,
+        refresh_margin: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.client = client
+        self.store = store
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self.key = hashlib.sha256(f"{client.host}\0{client.client_id}".encode("utf-8")).hexdigest()
+        self.access_token: Optional[str] = None
+        self.expires_at = 0.0
+        self.fetched = 0
+        self._lock = threading.Lock()
+        self._background = threading.Lock()
+
+    def _bearer_token(self) -> str:
+        return f"Bearer {self.token()}"
+
+    def _fresh(self, expires_at: float) -> bool:
+        return self.clock() < expires_at - self.refresh_margin
+
+    def token(self) -> str:
+        if self.access_token is not None:
+            if self._fresh(self.expires_at):
+                return self.access_token
+            if self.clock() < self.expires_at - self.EXPIRY_BUFFER:
+                self._refresh_in_background()
+                return self.access_token
+        return self.refresh()
+
+    def refresh(self) -> str:
+        """Adopt a fresh token from the store, or fetch one (once across processes) when there is none."""
+        with self._lock:
+            if self.access_token is not None and self._fresh(self.expires_at):
+                return self.access_token
+            if self.store is None:
+                self._fetch()
+                return self.access_token
+            if self._adopt():
+                return self.access_token
+            with self.store.locked():
+                # Another process may have fetched while this one waited for the lock.
+                if not self._adopt():
+                    self._fetch()
+                    self.store.save(self.key, self.access_token, self.expires_at)
+            return self.access_token
+
+    def _adopt(self) -> bool:
+        stored = self.store.load(self.key)
+        if stored is None or not self._fresh(stored[1]):
+            return False
+        self.access_token, self.expires_at = stored
+        return True
+
+    def _fetch(self) -> None:
+        started = self.clock()
+        response = self.client._unauthenticated_request(
+            "POST",
+            "/v1/security/oauth2/token",
+            {
+                "grant_type": "client_credentials",
+                "client_id": self.client.client_id,
+                "client_secret": self.client.client_secret,
+            },
+        )
+        self.access_token = response.result.get("access_token")
+        self.expires_at = started + response.result.get("expires_in", 0)
+        self.fetched += 1
+
+    def _refresh_in_background(self) -> None:
+        if not self._background.acquire(blocking=False):
+            return
+
+        def run() -> None:
+            try:
+                self.refresh()
+            except Exception as e:
+                # The current token stays in use; the next request past expiry retries in the foreground.
+                logger.warning("Background token refresh failed: %s", e)
+            finally:
+                self._background.release()
+
+        threading.Thread(target=run, name="amadeus-token-refresh", daemon=True).start()
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import http.client
+import json
+import ssl
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable, Optional
+from urllib.error import URLError
+from urllib.request import Request, getproxies, urlopen
+
+# Errors that mean a pooled keep-alive connection was closed by the server while idle.
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def fast_json_loads() -> Callable[[Any], Any]:
+    """orjson's decoder when it is installed, the stdlib one otherwise."""
+    return orjson.loads if orjson is not None else json.loads
+
+
+def install_fast_json() -> bool:
+    """
+    Make the Amadeus SDK decode responses with the fastest available JSON parser.
+
+    The SDK parses every body with `json.loads` from its parser module and has no
+    hook for it, so that module's `json` reference is replaced. Returns whether a
+    faster parser is in use.
+    """
+    if orjson is None:
+        return False
+    from amadeus.mixins import parser
+
+    parser.json = SimpleNamespace(loads=orjson.loads)
+    return True
+
+
+class PooledResponse:
+    """The fully read response, shaped like what `urlopen` returns to the SDK."""
+
+    def __init__(self, url: str, status: int, reason: str, headers: http.client.HTTPMessage, body: bytes) -> None:
+        self.url = url
+        self.status = self.code = status
+        self.reason = reason
+        self.headers = headers
+        self._body = body
+
+    def read(self) -> bytes:
+        body, self._body = self._body, b""
+        return body
+
+    def getcode(self) -> int:
+        return self.status
+
+    def getheaders(self) -> list[tuple[str, str]]:
+        return list(self.headers.items())
+
+    def info(self) -> http.client.HTTPMessage:
+        return self.headers
+
+    def close(self) -> None:
+        self._body = b""
+
+
+class TransportStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connections_opened = 0
+        self.reused = 0
+        self.retries = 0
+        self.bytes_received = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.reused / self.requests if self.requests else 0.0
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reused": self.reused,
+            "retries": self.retries,
+            "bytes_received": self.bytes_received,
+            "reuse_ratio": round(self.reuse_ratio, 3),
+        }
+
+
+class PooledTransport:
+    """
+    Keep-alive HTTP(S) transport for the Amadeus SDK's `http` option.
+
+    The SDK's default `urlopen` opens (and TLS-handshakes) a new connection per
+    call. This keeps up to `max_idle_per_host` idle connections per host and hands
+    them to the next request, so a sweep pays the handshake once per worker thread.
+    A request on a connection the server has meanwhile closed is retried once on
+    a fresh one. When a proxy is configured in the environment, requests go
+    through `urlopen` unchanged.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_idle_per_host: int = 8,
+        timeout: Optional[float] = 60.0,
+        context: Optional[ssl.SSLContext] = None,
+    ) -> None:
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self.context = context
+        self.stats = TransportStats()
+        self._idle: dict[tuple[str, str], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self._use_urlopen = bool(getproxies())
+
+    def _connect(self, scheme: str, host: str) -> http.client.HTTPConnection:
+        if scheme == "https":
+            if self.context is None:
+                self.context = ssl.create_default_context()
+            return http.client.HTTPSConnection(host, timeout=self.timeout, context=self.context)
+        return http.client.HTTPConnection(host, timeout=self.timeout)
+
+    def _acquire(self, key: tuple[str, str]) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.stats.reused += 1
+                return idle.pop(), True
+            self.stats.connections_opened += 1
+        return self._connect(*key), False
+
+    def _release(self, key: tuple[str, str], connection: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def __call__(self, request: Request) -> Any:
+        if self._use_urlopen:
+            return urlopen(request)
+
+        key = (request.type, request.host)
+        headers = dict(request.header_items())
+        with self._lock:
+            self.stats.requests += 1
+        for attempt in range(2):
+            connection, reused = self._acquire(key)
+            try:
+                connection.request(request.get_method(), request.selector, body=request.data, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                if reused and attempt == 0 and isinstance(e, _STALE_CONNECTION_ERRORS):
+                    with self._lock:
+                        self.stats.retries += 1
+                    continue
+                # The SDK turns URLError into a NetworkError, as it does for urlopen.
+                raise URLError(e) from e
+            with self._lock:
+                self.stats.bytes_received += len(body)
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(key, connection)
+            return PooledResponse(request.full_url, response.status, response.reason, response.msg, body)
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
@@ -0,0 +1,247 @@
+import json
+import logging
+import math
+
+from amadeus import ResponseError
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_POST
+from flight_engine import OfferQuery
+
+from . import views
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = 1
+MAX_SEARCHES = 20
+MAX_ROUTES = 200
+MAX_PAGE_SIZE = 100
+DEFAULT_PAGE_SIZE = 20
+DEFAULT_OFFERS_PER_ROUTE = 3
+
+
+class ApiError(Exception):
+    pass
+
+
+def api_response(payload, status=200):
+    return HttpResponse(json.dumps(payload, separators=(',', ':')), 'application/json', status=status)
+
+
+def non_negative_int(value, name):
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ApiError(f'{name} must be a non-negative integer')
+    return value
+
+
+def boolean(value, name):
+    if not isinstance(value, bool):
+        raise ApiError(f'{name} must be true or false')
+    return value
+
+
+def airport_codes(search, single, plural, index):
+    codes = search.get(plural) or ([search[single]] if search.get(single) else [])
+    if not isinstance(codes, list) or not all(isinstance(code, str) and len(code.strip()) == 3 for code in codes):
+        raise ApiError(f'searches[{index}].{plural} must be a list of IATA codes')
+    return [code.strip().upper() for code in codes]
+
+
+def parse_search(search, index):
+    """One search of a request body, in the shape of the search form: one origin or one destination"""
+    if not isinstance(search, dict):
+        raise ApiError(f'searches[{index}] must be an object')
+    origins = airport_codes(search, 'origin', 'origins', index)
+    destinations = airport_codes(search, 'destination', 'destinations', index)
+    departure_date = search.get('departure_date')
+    return_date = search.get('return_date') or None
+    currency = search.get('currency') or 'USD'
+    if not origins or not destinations or not departure_date:
+        raise ApiError(f'searches[{index}] needs an origin, a destination and a departure_date')
+    if len(origins) > 1 and len(destinations) > 1:
+        raise ApiError(f'searches[{index}] may have several origins or several destinations, not both')
+    try:
+        OfferQuery(origins[0], destinations[0], departure_date, return_date, currency=currency)
+    except (AttributeError, TypeError, ValueError):
+        raise ApiError(f'searches[{index}] has an invalid date or currency')
+    return {
+        'id': search.get('id'),
+        'mode': 'origins' if len(origins) > 1 else 'destinations',
+        'routes': [(origin, destination) for origin in origins for destination in destinations],
+        'departure_date': departure_date,
+        'return_date': return_date,
+        'currency': currency.upper(),
+    }
+
+
+def describe_error(error):
+    if isinstance(error, ResponseError):
+        try:
+            return error.response.result['errors'][0]['detail']
+        except (AttributeError, IndexError, KeyError, TypeError):
+            pass
+    return 'Search failed'
+
+
+def compact_offer(offer):
+    return {
+        'id': offer.get('id'),
+        'price': offer['price']['total'],
+        # Set when the price was converted locally from another currency
+        'converted': offer['price'].get('converted'),
+        'itineraries': [
+            {
+                'duration': itinerary.get('duration'),
+                'segments': [
+                    {
+                        'from': segment['departure']['iataCode'],
+                        'to': segment['arrival']['iataCode'],
+                        'departure': segment['departure']['at'],
+                        'arrival': segment['arrival']['at'],
+                        'carrier': segment.get('carrierCode'),
+                        'number': segment.get('number'),
+                        'duration': segment.get('duration'),
+                    }
+                    for segment in itinerary.get('segments', [])
+                ],
+            }
+            for itinerary in offer.get('itineraries', [])
+        ],
+    }
+
+
+@csrf_exempt
+@require_POST
+@gzip_page
+def search(request):
+    """
+    Versioned JSON search for machine clients: one search object, or {"searches": [...]} for a batch.
+
+    Every distinct route in the batch is searched once, concurrently through the search
+    engine. Routes are returned in request order and paginated with `page` / `page_size`;
+    price metrics, deal ranking and trip purpose are fetched for the requested page only.
+    Searches repeated within the cache TTL (as when walking the pages) are served from cache;
+    each route reports the age of its offers in seconds and whether they are stale.
+    """
+    try:
+        body = json.loads(request.body or b'{}')
+    except ValueError:
+        return api_response({'error': 'Request body must be JSON'}, 400)
+
+    try:
+        if not isinstance(body, dict):
+            raise ApiError('Request body must be a JSON object')
+        raw_searches = body['searches'] if 'searches' in body else [body]
+        if not isinstance(raw_searches, list) or not raw_searches:
+            raise ApiError('searches must be a non-empty list')
+        if len(raw_searches) > MAX_SEARCHES:
+            raise ApiError(f'A batch may hold at most {MAX_SEARCHES} searches')
+        searches = [parse_search(raw, index) for index, raw in enumerate(raw_searches)]
+        if sum(len(search['routes']) for search in searches) > MAX_ROUTES:
+            raise ApiError(f'A batch may cover at most {MAX_ROUTES} routes')
+        page = max(1, non_negative_int(body.get('page', 1), 'page'))
+        page_size = min(MAX_PAGE_SIZE, max(1, non_negative_int(body.get('page_size', DEFAULT_PAGE_SIZE), 'page_size')))
+        offers_per_route = non_negative_int(body.get('offers_per_route', DEFAULT_OFFERS_PER_ROUTE), 'offers_per_route')
+        enrich = boolean(body.get('enrich', True), 'enrich')
+    except ApiError as e:
+        return api_response({'error': str(e)}, 400)
+
+    rows = []
+    for search_index, search in enumerate(searches):
+        for origin, destination in search['routes']:
+            kwargs = views.get_offer_kwargs(origin, destination, search['departure_date'],
+                                            search['return_date'], search['currency'])
+            rows.append((search_index, OfferQuery.from_params(kwargs)))
+
+    # Each distinct route search runs once, however many searches of the batch share it
+    offers, errors = {}, {}
+    for query, result, error in views.engine.run(dict.fromkeys(query for _, query in rows), views.engine.offers):
+        if error is not None:
+            logger.error(f"API search failed for {query.origin} to {query.destination}: {str(error)}")
+            errors[query] = describe_error(error)
+        else:
+            offers[query] = result
+
+    codes = dict.fromkeys(code for _, query in rows for code in (query.origin, query.destination))
+    names = {code: name for code, name, _ in views.engine.run(codes, views.get_airport_name)}
+
+    pages = max(1, math.ceil(len(rows) / page_size))
+    page_rows = rows[(page - 1) * page_size:page * page_size]
+
+    def cheapest(query):
+        route_offers = offers.get(query)
+        return route_offers[0]['price']['total'] if route_offers else None
+
+    enrichments = {}
+    if enrich:
+        def enrich_route(query):
+            return views.get_route_enrichment(
+                query.origin, query.destination, query.departure_date.isoformat(),
+                query.return_date.isoformat() if query.return_date else None, query.currency, cheapest(query),
+            )
+
+        targets = dict.fromkeys(query for _, query in page_rows if query in offers)
+        for query, enrichment, error in views.engine.run(targets, enrich_route):
+            if error is not None:
+                logger.error(f"API enrichment failed for {query.origin} to {query.destination}: {str(error)}")
+            enrichments[query] = enrichment
+
+    routes = []
+    for search_index, query in page_rows:
+        route_offers = offers.get(query, [])
+        enrichment = enrichments.get(query) or {}
+        age = views.engine.offers_age(query) if query in offers else None
+        routes.append({
+            'search': search_index,
+            'origin': query.origin,
+            'origin_name': names.get(query.origin) or query.origin,
+            'destination': query.destination,
+            'destination_name': names.get(query.destination) or query.destination,
+            'offer_count': len(route_offers),
+            'cheapest': cheapest(query),
+            'offers': [compact_offer(offer) for offer in route_offers[:offers_per_route]],
+            'offers_age': round(age) if age is not None else None,
+            'stale': age is not None and age >= views.engine.cache.ttl,
+            'metrics': enrichment.get('metrics'),
+            'deal': enrichment.get('is_good_deal'),
+            'trip_purpose': enrichment.get('trip_purpose') or None,
+            'error': errors.get(query),
+        })
+
+    summaries = []
+    for search_index, search in enumerate(searches):
+        results = [
+            {
+                'flight_offers': [{'price': offer['price']['total']} for offer in offers.get(query, [])],
+                'origin': query.origin,
+                'origin_name': names.get(query.origin) or query.origin,
+                'destination': query.destination,
+                'destination_name': names.get(query.destination) or query.destination,
+            }
+            for row_search, query in rows if row_search == search_index
+        ]
+        summary = None
+        if len(results) > 1:
+            summary = (views.create_origin_summary(results) if search['mode'] == 'origins'
+                       else views.create_country_summary(results))
+        summaries.append({
+            'id': search['id'],
+            'mode': search['mode'],
+            'departure_date': search['departure_date'],
+            'return_date': search['return_date'],
+            'currency': search['currency'],
+            'conversion': views.engine.conversion(search['currency']),
+            'route_count': len(results),
+            'summary': summary,
+        })
+
+    return api_response({
+        'api_version': API_VERSION,
+        'page': page,
+        'page_size': page_size,
+        'pages': pages,
+        'total_routes': len(rows),
+        'searches': summaries,
+        'routes': routes,
+    })
@@ -1,4 +1,5 @@
 import re
+from collections.abc import Mapping
 from datetime import datetime
 
 
@@ -8,45 +9,87 @@ class Flight:
 
     def construct_flights(self):
         offer = {}
-        index = 0
         offer['price'] = self.flight['price']['total']
         offer['id'] = self.flight['id']
 
-        for f in self.flight['itineraries']:
-            # Keys starting from 0 correspond to Outbound flights and the keys starting from 1 tp Return flights
-            if len(self.flight['itineraries'][index]['segments']) == 2:  # one stop flight
-                offer[str(index) + 'firstFlightDepartureAirport'] = self.flight['itineraries'][index]['segments'][0]['departure']['iataCode']
-                offer[str(index) + 'firstFlightAirlineLogo'] = get_airline_logo(self.flight['itineraries'][index]['segments'][0]['carrierCode'])
-                offer[str(index) + 'firstFlightAirline'] = self.flight['itineraries'][index]['segments'][0]['carrierCode']
-                offer[str(index) + 'firstFlightDepartureDate'] = get_hour(self.flight['itineraries'][index]['segments'][0]['departure']['at'])
-                offer[str(index) + 'firstFlightArrivalAirport'] = self.flight['itineraries'][index]['segments'][0]['arrival']['iataCode']
-                offer[str(index) + 'firstFlightArrivalDate'] = get_hour(self.flight['itineraries'][index]['segments'][0]['arrival']['at'])
-                offer[str(index) + 'firstFlightArrivalDuration'] = self.flight['itineraries'][index]['segments'][0]['duration']
-                offer[str(index) + 'secondFlightDepartureAirport'] = self.flight['itineraries'][index]['segments'][1]['departure']['iataCode']
-                offer[str(index) + 'secondFlightDepartureDate'] = get_hour(self.flight['itineraries'][index]['segments'][1]['departure']['at'])
-                offer[str(index) + 'secondFlightAirlineLogo'] = get_airline_logo(self.flight['itineraries'][index]['segments'][1]['carrierCode'])
-                offer[str(index) + 'secondFlightAirline'] = self.flight['itineraries'][index]['segments'][1]['carrierCode']
-                offer[str(index) + 'secondFlightArrivalAirport'] = self.flight['itineraries'][index]['segments'][1]['arrival']['iataCode']
-                offer[str(index) + 'secondFlightArrivalDate'] = get_hour(self.flight['itineraries'][index]['segments'][1]['arrival']['at'])
-                offer[str(index) + 'secondFlightArrivalDuration'] = self.flight['itineraries'][index]['segments'][1]['duration']
-                offer[str(index) + 'FlightTotalDuration'] = self.flight['itineraries'][index]['duration'][2:]
-                offer[str(index) + 'stop_time'] = get_stoptime(self.flight['itineraries'][index]['duration'],
-                                                               offer[str(index) + 'firstFlightArrivalDuration'],
-                                                               offer[str(index) + 'secondFlightArrivalDuration'])
-
-            elif len(self.flight['itineraries'][index]['segments']) == 1:  # direct flight
-                offer[str(index) + 'firstFlightDepartureAirport'] = self.flight['itineraries'][index]['segments'][0]['departure']['iataCode']
-                offer[str(index) + 'firstFlightAirlineLogo'] = get_airline_logo(self.flight['itineraries'][index]['segments'][0]['carrierCode'])
-                offer[str(index) + 'firstFlightAirline'] = self.flight['itineraries'][index]['segments'][0]['carrierCode']
-                offer[str(index) + 'firstFlightDepartureDate'] = get_hour(self.flight['itineraries'][index]['segments'][0]['departure']['at'])
-                offer[str(index) + 'firstFlightArrivalAirport'] = self.flight['itineraries'][index]['segments'][0]['arrival']['iataCode']
-                offer[str(index) + 'firstFlightArrivalDate'] = get_hour(self.flight['itineraries'][index]['segments'][0]['arrival']['at'])
-                offer[str(index) + 'firstFlightArrivalDuration'] = self.flight['itineraries'][index]['segments'][0]['duration']
-                offer[str(index) + 'FlightTotalDuration'] = self.flight['itineraries'][index]['duration'][2:]
-
-            index += 1
+        for index in range(len(self.flight['itineraries'])):
+            offer.update(self.construct_itinerary(index))
         return offer
 
+    def construct_itinerary(self, index):
+        # Keys starting from 0 correspond to Outbound flights and the keys starting from 1 tp Return flights
+        offer = {}
+        itinerary = self.flight['itineraries'][index]
+        segments = itinerary['segments']
+        if len(segments) == 2:  # one stop flight
+            offer[str(index) + 'firstFlightDepartureAirport'] = segments[0]['departure']['iataCode']
+            offer[str(index) + 'firstFlightAirlineLogo'] = get_airline_logo(segments[0]['carrierCode'])
+            offer[str(index) + 'firstFlightAirline'] = segments[0]['carrierCode']
+            offer[str(index) + 'firstFlightDepartureDate'] = get_hour(segments[0]['departure']['at'])
+            offer[str(index) + 'firstFlightArrivalAirport'] = segments[0]['arrival']['iataCode']
+            offer[str(index) + 'firstFlightArrivalDate'] = get_hour(segments[0]['arrival']['at'])
+            offer[str(index) + 'firstFlightArrivalDuration'] = segments[0]['duration']
+            offer[str(index) + 'secondFlightDepartureAirport'] = segments[1]['departure']['iataCode']
+            offer[str(index) + 'secondFlightDepartureDate'] = get_hour(segments[1]['departure']['at'])
+            offer[str(index) + 'secondFlightAirlineLogo'] = get_airline_logo(segments[1]['carrierCode'])
+            offer[str(index) + 'secondFlightAirline'] = segments[1]['carrierCode']
+            offer[str(index) + 'secondFlightArrivalAirport'] = segments[1]['arrival']['iataCode']
+            offer[str(index) + 'secondFlightArrivalDate'] = get_hour(segments[1]['arrival']['at'])
+            offer[str(index) + 'secondFlightArrivalDuration'] = segments[1]['duration']
+            offer[str(index) + 'FlightTotalDuration'] = itinerary['duration'][2:]
+            offer[str(index) + 'stop_time'] = get_stoptime(itinerary['duration'],
+                                                           offer[str(index) + 'firstFlightArrivalDuration'],
+                                                           offer[str(index) + 'secondFlightArrivalDuration'])
+
+        elif len(segments) == 1:  # direct flight
+            offer[str(index) + 'firstFlightDepartureAirport'] = segments[0]['departure']['iataCode']
+            offer[str(index) + 'firstFlightAirlineLogo'] = get_airline_logo(segments[0]['carrierCode'])
+            offer[str(index) + 'firstFlightAirline'] = segments[0]['carrierCode']
+            offer[str(index) + 'firstFlightDepartureDate'] = get_hour(segments[0]['departure']['at'])
+            offer[str(index) + 'firstFlightArrivalAirport'] = segments[0]['arrival']['iataCode']
+            offer[str(index) + 'firstFlightArrivalDate'] = get_hour(segments[0]['arrival']['at'])
+            offer[str(index) + 'firstFlightArrivalDuration'] = segments[0]['duration']
+            offer[str(index) + 'FlightTotalDuration'] = itinerary['duration'][2:]
+
+        return offer
+
+
+class LazyFlight(Mapping):
+    """
+    Read-only view of an offer with the same keys as `Flight.construct_flights()`.
+
+    Price and id are read up front; an itinerary's keys (times, airlines, durations,
+    stop time) are only built the first time the template asks for one of them, so
+    offers that are never displayed cost nothing beyond the raw API data.
+    """
+
+    def __init__(self, flight):
+        self.offer = flight
+        self.flight = Flight(flight)
+        self._itineraries = {}
+        self._base = {'price': flight['price']['total'], 'id': flight['id']}
+
+    def _itinerary(self, index):
+        if index not in self._itineraries:
+            self._itineraries[index] = self.flight.construct_itinerary(index)
+        return self._itineraries[index]
+
+    def __getitem__(self, key):
+        if key in self._base:
+            return self._base[key]
+        prefix = key[:1] if isinstance(key, str) else ''
+        if prefix.isdigit() and int(prefix) < len(self.flight.flight['itineraries']):
+            return self._itinerary(int(prefix))[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from self._base
+        for index in range(len(self.flight.flight['itineraries'])):
+            yield from self._itinerary(index)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
 
 def get_airline_logo(carrier_code):
     return "https://s1.apideeplink.com/images/airlines/" + carrier_code + ".png"
@@ -0,0 +1,146 @@
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+from amadeus import ResponseError
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from flight_engine import OfferQuery, RateLimiter
+
+from ... import views
+from ...api import describe_error
+
+INPUT_FIELDS = ('origin', 'destination', 'departure_date')
+OUTPUT_FIELDS = ('row', 'origin', 'destination', 'departure_date', 'return_date', 'currency', 'offers',
+                 'cheapest', 'min', 'first', 'median', 'third', 'max', 'deal', 'converted_from', 'error')
+OUTPUT_FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+def read_rows(f):
+    """(row number, row) for each data row of an input CSV, with lower-cased column names"""
+    reader = csv.DictReader(f)
+    fields = [name.strip().lower() for name in reader.fieldnames or []]
+    missing = [name for name in INPUT_FIELDS if name not in fields]
+    if missing:
+        raise CommandError(f"Input needs the columns {', '.join(INPUT_FIELDS)} (missing {', '.join(missing)})")
+    reader.fieldnames = fields
+    for number, row in enumerate(reader, start=1):
+        yield number, {name: (value or '').strip() for name, value in row.items() if name}
+
+
+def done_rows(path, fmt):
+    """Row numbers already written to `path`, after dropping a last line cut short by an interruption"""
+    data = path.read_bytes()
+    complete = data[:data.rfind(b'\n') + 1]
+    if complete != data:
+        path.write_bytes(complete)
+    lines = complete.decode('utf-8').splitlines()
+    if fmt == 'csv':
+        return {int(record['row']) for record in csv.DictReader(lines)}
+    return {json.loads(line)['row'] for line in lines if line.strip()}
+
+
+def new_record(task, default_currency):
+    number, row = task
+    record = dict.fromkeys(OUTPUT_FIELDS)
+    record.update(row=number, origin=row['origin'].upper(), destination=row['destination'].upper(),
+                  departure_date=row['departure_date'], return_date=row.get('return_date') or None,
+                  currency=(row.get('currency') or default_currency).upper())
+    return record
+
+
+def price_row(task, default_currency):
+    record = new_record(task, default_currency)
+    kwargs = views.get_offer_kwargs(record['origin'], record['destination'], record['departure_date'],
+                                    record['return_date'], record['currency'])
+    try:
+        query = OfferQuery.from_params(kwargs)
+    except (AttributeError, TypeError, ValueError):
+        record['error'] = 'Invalid route or date'
+        return record
+
+    offers = views.engine.offers(query)
+    record['offers'] = len(offers)
+    record['cheapest'] = offers[0]['price']['total'] if offers else None
+    conversion = views.engine.conversion(record['currency'])
+    record['converted_from'] = conversion['from'] if conversion else None
+    kwargs_metrics, _ = views.get_enrichment_kwargs(record['origin'], record['destination'],
+                                                    record['departure_date'], record['return_date'],
+                                                    record['currency'])
+    try:
+        metrics = views.get_flight_price_metrics(**kwargs_metrics)
+    except ResponseError:
+        # Routes without enough price history have no metrics; the offers are still worth keeping
+        metrics = None
+    if metrics is not None:
+        record.update(metrics)
+        record['deal'] = views.rank_cheapest_flight(record['cheapest'], metrics['first'], metrics['third'])
+    return record
+
+
+class Command(BaseCommand):
+    help = ('Price every (origin, destination, departure_date[, return_date, currency]) row of a CSV '
+            'concurrently, writing each row with its price quartiles and deal rating as it completes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="Input CSV ('-' for standard input)")
+        parser.add_argument('output', help='Output file: .csv, .ndjson or .jsonl; rows are appended as they finish')
+        parser.add_argument('--currency', default='USD', help='Currency for rows without a currency column')
+        parser.add_argument('--workers', type=int, default=settings.FLIGHT_ENGINE_WORKERS,
+                            help='Rows priced concurrently')
+        parser.add_argument('--rate', type=float, default=0.0,
+                            help='Maximum upstream requests per second (0 for no limit)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue an interrupted run, skipping the rows already in the output')
+
+    def handle(self, *args, **options):
+        output = Path(options['output'])
+        fmt = OUTPUT_FORMATS.get(output.suffix.lower())
+        if fmt is None:
+            raise CommandError(f'Unsupported output format {output.suffix!r} (use .csv, .ndjson or .jsonl)')
+        done = set()
+        if output.exists() and output.stat().st_size:
+            if not options['resume']:
+                raise CommandError(f'{output} already exists; pass --resume to continue it')
+            done = done_rows(output, fmt)
+
+        # This process only runs the command, so its engine can take the command's pacing
+        views.engine.limiter = RateLimiter(options['rate']) if options['rate'] else None
+        counts = {'priced': 0, 'failed': 0}
+        started = time.perf_counter()
+        try:
+            source = sys.stdin if options['input'] == '-' else open(options['input'], newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['input']}: {e}")
+
+        def price(task):
+            return price_row(task, options['currency'])
+
+        with source, open(output, 'a', newline='', encoding='utf-8') as sink:
+            writer = csv.DictWriter(sink, OUTPUT_FIELDS) if fmt == 'csv' else None
+            if writer is not None and not sink.tell():
+                writer.writeheader()
+            # Rows are read as the executor asks for them, so the input is never held in memory
+            tasks = (task for task in read_rows(source) if task[0] not in done)
+            for task, record, error in views.engine.run(tasks, price, workers=options['workers']):
+                if error is not None:
+                    self.stderr.write(f'Row {task[0]} failed: {error}')
+                    record = new_record(task, options['currency'])
+                    record['error'] = describe_error(error)
+                counts['failed' if record['error'] else 'priced'] += 1
+                if writer is not None:
+                    writer.writerow(record)
+                else:
+                    sink.write(json.dumps(record) + '\n')
+                sink.flush()
+
+        elapsed = time.perf_counter() - started
+        rows = counts['priced'] + counts['failed']
+        cache = views.engine.cache
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows} rows in {elapsed:.1f} s ({rows / elapsed if elapsed else 0:.1f} rows/s): "
+            f"{counts['priced']} priced, {counts['failed']} failed, {len(done)} already done; "
+            f"{cache.misses} upstream lookups, {cache.hits} served from cache"
+        ))
@@ -0,0 +1,136 @@
+import ast
+import re
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from flight_engine import CallLockTable, OfferQuery, SearchEngine
+
+from ... import views
+
+# The line get_flight_offers logs for every route searched, as written by the 'verbose' formatter
+SEARCH_LOG_LINE = re.compile(
+    r"(?P<logged_at>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})?.*Searching flight offers with parameters: (?P<params>\{.*\})"
+)
+
+
+def read_searches(lines, since=None):
+    """Searched routes as (origin, destination, departure date, return date, currency), oldest first"""
+    for line in lines:
+        match = SEARCH_LOG_LINE.search(line)
+        if not match:
+            continue
+        if since and match['logged_at'] and datetime.strptime(match['logged_at'], '%Y-%m-%d %H:%M:%S') < since:
+            continue
+        try:
+            params = ast.literal_eval(match['params'])
+            query = OfferQuery.from_params(params)
+        except (KeyError, SyntaxError, TypeError, ValueError):
+            continue
+        yield (query.origin, query.destination, query.departure_date.isoformat(),
+               query.return_date.isoformat() if query.return_date else None, query.currency)
+
+
+def request_key(request):
+    kind, params = request
+    return kind, params if isinstance(params, OfferQuery) else tuple(sorted(params.items()))
+
+
+def plan_requests(ranked_searches, budget):
+    """Upstream requests that warm the most searched routes first, up to `budget` requests"""
+    planned, seen = [], set()
+    for origin, destination, departure_date, return_date, currency in ranked_searches:
+        kwargs_metrics, kwargs_trip_purpose = views.get_enrichment_kwargs(
+            origin, destination, departure_date, return_date, currency
+        )
+        requests = [
+            ('offers', OfferQuery.from_params(
+                views.get_offer_kwargs(origin, destination, departure_date, return_date, currency)
+            )),
+            ('price_metrics', kwargs_metrics),
+        ]
+        if kwargs_trip_purpose:
+            requests.append(('trip_purpose', kwargs_trip_purpose))
+        requests += [('locations', views.get_location_kwargs(code)) for code in (origin, destination)]
+        # Routes share airport names, and searches differing only in return date share price metrics
+        requests = [request for request in requests if request_key(request) not in seen]
+        if len(planned) + len(requests) > budget:
+            break
+        planned += requests
+        seen.update(map(request_key, requests))
+    return planned
+
+
+class Command(BaseCommand):
+    help = ('Prefetch offers, price metrics, trip purposes and airport names for the most searched routes '
+            'in the app logs, so the web workers find them in the shared lock table. Run it shortly before the peak.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('logs', nargs='+', help="Log files to read searches from ('-' for standard input)")
+        parser.add_argument('--days', type=int, default=7, help='Only count searches logged in the last N days')
+        parser.add_argument('--budget', type=int, default=200, help='Maximum number of upstream requests')
+        parser.add_argument('--ttl', type=int,
+                            default=settings.FLIGHT_ENGINE_CACHE_TTL + settings.FLIGHT_ENGINE_CACHE_GRACE,
+                            help='Seconds the web workers may serve the warmed results (at most, and by default, '
+                                 'FLIGHT_ENGINE_CACHE_TTL + FLIGHT_ENGINE_CACHE_GRACE)')
+        parser.add_argument('--workers', type=int, default=settings.FLIGHT_ENGINE_WORKERS,
+                            help='Requests made concurrently')
+        parser.add_argument('--dry-run', action='store_true', help='List what would be fetched without calling Amadeus')
+
+    def handle(self, *args, **options):
+        if not settings.FLIGHT_ENGINE_LOCK_TABLE:
+            raise CommandError('FLIGHT_ENGINE_LOCK_TABLE is empty: warmed results would not reach the web workers')
+
+        since = datetime.now() - timedelta(days=options['days'])
+        searches = Counter()
+        for path in options['logs']:
+            try:
+                f = sys.stdin if path == '-' else open(path, encoding='utf-8', errors='replace')
+            except OSError as e:
+                raise CommandError(f'Cannot read {path}: {e}')
+            with f:
+                searches.update(read_searches(f, since))
+
+        # Searches for dates already gone are not worth warming
+        today = date.today().isoformat()
+        ranked = [search for search, _ in searches.most_common() if search[2] >= today]
+        planned = plan_requests(ranked, options['budget'])
+        warmed_routes = sum(kind == 'offers' for kind, _ in planned)
+        self.stdout.write(f'{len(searches)} routes searched in the last {options["days"]} days, '
+                          f'{len(ranked)} still upcoming; warming the top {warmed_routes} '
+                          f'with {len(planned)} requests')
+
+        if options['dry_run']:
+            for kind, params in planned:
+                self.stdout.write(f'  {kind}: {params.to_params() if kind == "offers" else params}')
+            return
+
+        # Results go to the lock table the web workers read, kept for --ttl instead of a few seconds.
+        # The workers take them with their real age and skip any too old for their cache, so none are kept longer.
+        ttl = options['ttl']
+        if settings.FLIGHT_ENGINE_CACHE_TTL > 0:
+            ttl = min(ttl, settings.FLIGHT_ENGINE_CACHE_TTL + settings.FLIGHT_ENGINE_CACHE_GRACE)
+        locks = CallLockTable(settings.FLIGHT_ENGINE_LOCK_TABLE, result_ttl=ttl)
+        # Fetched in the same currency as the web workers fetch, so they find the results under the same keys
+        engine = SearchEngine(views.amadeus, workers=options['workers'], locks=locks,
+                              canonical_currency=views.engine.canonical_currency, fx=views.engine.fx)
+
+        def fetch(request):
+            kind, params = request
+            if kind == 'offers':
+                return engine.offers(params)
+            return getattr(engine, kind)(**params)
+
+        started = time.perf_counter()
+        failed = 0
+        for (kind, params), _, error in engine.run(planned, fetch):
+            if error is not None:
+                failed += 1
+                self.stderr.write(f'{kind} {params} failed: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Warmed {warmed_routes} routes in {time.perf_counter() - started:.1f} s: '
+            f'{locks.calls} upstream requests, {locks.shared} already warm, {failed} failed'
+        ))
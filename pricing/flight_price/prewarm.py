@@ -0,0 +1,37 @@
+import logging
+import threading
+import time
+
+from flight_engine import load_airports
+
+logger = logging.getLogger(__name__)
+
+# How long a booting worker waits for prewarming before it starts serving anyway
+PREWARM_WAIT_SECONDS = 15
+
+
+def prewarm():
+    """Get the shared OAuth token and load reference data and exchange rates so the first request doesn't pay for them"""
+    started = time.perf_counter()
+    # Importing the views builds the Amadeus client, the search engine and the continent airport lists
+    from . import views
+
+    airports = load_airports()
+    if views.engine.fx is not None:
+        rates = views.engine.fx.table()
+        logger.info(f"Exchange rates {'of ' + rates.as_of if rates else 'unavailable'}")
+    try:
+        views.engine.warm_up()
+        token = 'ready'
+    except Exception as e:
+        logger.warning(f"Prewarm could not get an Amadeus token: {str(e)}")
+        token = 'unavailable'
+    logger.info(f"Prewarmed in {(time.perf_counter() - started) * 1000:.0f} ms: "
+                f"{len(airports)} airports indexed, OAuth token {token}")
+
+
+def start_prewarm(wait=PREWARM_WAIT_SECONDS):
+    # Bounded wait: an Amadeus outage delays worker boot by at most `wait` seconds
+    thread = threading.Thread(target=prewarm, name='flight-price-prewarm', daemon=True)
+    thread.start()
+    thread.join(wait)
@@ -0,0 +1,51 @@
+import logging
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from flight_engine import Profiler
+
+logger = logging.getLogger(__name__)
+
+
+def wants_profile(request):
+    """Staff asked for this request to be profiled, with ?profile=1 or an X-Profile: 1 header"""
+    asked = request.GET.get('profile') == '1' or request.headers.get('X-Profile') == '1'
+    if not asked or not settings.FLIGHT_PRICE_PROFILE_DIR:
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_active and user.is_staff)
+
+
+class ProfileMiddleware:
+    """
+    Runs a staff request under cProfile when it asks for it, saving the stats to
+    FLIGHT_PRICE_PROFILE_DIR and logging the hottest functions at DEBUG. The artifact name
+    comes back in the X-Profile-Artifact header. One request is profiled at a time;
+    a request asking while another is being profiled is served normally.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wants_profile(request):
+            return self.get_response(request)
+
+        profiler = Profiler()
+        try:
+            profiler.start()
+        except RuntimeError:
+            logger.info(f"Not profiling {request.path}: another request is being profiled")
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{request.path.strip('/').replace('/', '-') or 'home'}.prof"
+        path = profiler.dump(Path(settings.FLIGHT_PRICE_PROFILE_DIR) / name)
+        logger.info(f"Profile of {request.get_full_path()} saved to {path}")
+        logger.debug(profiler.report())
+        response['X-Profile-Artifact'] = name
+        return response
@@ -1,9 +1,32 @@
-from unittest.mock import patch
+import gzip
+import importlib
+import json
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import Mock, patch
 
-from django.test import SimpleTestCase
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
 from django.urls import reverse
+from flight_engine import (
+    CallLockTable, FxRates, FxTable, OfferQuery, Profiler, RateLimiter, ResultStore, SearchEngine, SharedAccessToken,
+    TokenStore, TTLCache, load_airports, new_client, run_tasks,
+)
+from flight_engine.airports import haversine_km
+from flight_engine.fx import parse_ecb_rates
 
 from . import views
+from .flight import Flight, LazyFlight
+from .profiling import ProfileMiddleware
 
 
 class DjangoCompatibilityTests(SimpleTestCase):
@@ -43,3 +66,646 @@ class AmadeusCompatibilityTests(SimpleTestCase):
         )
 
         self.assertTrue(all(callable(getter) for getter in getters))
+
+
+class SearchEngineTests(SimpleTestCase):
+    def test_normalized_searches_share_one_upstream_call(self):
+        client = Mock()
+        client.shopping.flight_offers_search.get.return_value = Mock(
+            data=[{'id': '1', 'price': {'total': '120.00'}}, {'id': '2', 'price': {'total': '95.50'}}]
+        )
+        engine = SearchEngine(client, cache=TTLCache(60))
+
+        offers = engine.offers(OfferQuery.from_params(
+            views.get_offer_kwargs('bru', 'BUD', '2026-09-01', '', 'eur')
+        ))
+        price, offer = engine.cheapest(OfferQuery('BRU', 'bud', date(2026, 9, 1), currency='EUR'))
+
+        self.assertEqual(len(offers), 2)
+        self.assertEqual((str(price), offer['id']), ('95.50', '2'))
+        client.shopping.flight_offers_search.get.assert_called_once_with(
+            originLocationCode='BRU',
+            destinationLocationCode='BUD',
+            departureDate='2026-09-01',
+            adults=1,
+            currencyCode='EUR',
+        )
+
+    def test_stale_offers_are_served_while_one_refresh_runs_in_the_background(self):
+        now = [0.0]
+        release = threading.Event()
+        prices = iter(['100.00', '90.00', '80.00'])
+        client = Mock()
+        client.shopping.flight_offers_search.get.side_effect = lambda **params: Mock(
+            data=[{'id': '1', 'price': {'total': next(prices)}}]
+        ) if release.wait(5) else None
+        engine = SearchEngine(client, cache=TTLCache(60, grace=120, clock=lambda: now[0]), refresh_budget=1)
+        popular, other = OfferQuery('BRU', 'BUD', '2026-09-01'), OfferQuery('BRU', 'MAD', '2026-09-01')
+        release.set()
+        engine.offers(popular)
+        engine.offers(other)
+        release.clear()
+
+        now[0] = 90.0
+        # A burst on the expired popular route refreshes it once; the other route is over budget
+        served = [engine.offers(popular)[0]['price']['total'] for _ in range(5)]
+        engine.offers(other)
+        self.assertEqual(engine.offers_age(popular), 90.0)
+        release.set()
+        for _ in range(500):
+            if engine.offers_age(popular) == 0.0:
+                break
+            threading.Event().wait(0.01)
+
+        self.assertEqual(served, ['100.00'] * 5)
+        self.assertEqual(engine.offers(popular)[0]['price']['total'], '80.00')
+        self.assertEqual(client.shopping.flight_offers_search.get.call_count, 3)
+        self.assertEqual(engine.refreshes_skipped, 1)
+        now[0] = 300.0
+        self.assertIsNone(engine.offers_age(other))
+
+
+class CurrencyConversionTests(SimpleTestCase):
+    def test_every_currency_is_served_from_one_canonical_search(self):
+        client = Mock()
+        client.shopping.flight_offers_search.get.return_value = Mock(data=[{
+            'id': '1', 'price': {'currency': 'EUR', 'total': '100.00', 'base': '80.00', 'grandTotal': '100.00'},
+        }])
+        client.analytics.itinerary_price_metrics.get.return_value = Mock(data=[{
+            'currencyCode': 'EUR', 'priceMetrics': [{'amount': '90.00', 'quartileRanking': 'MINIMUM'}],
+        }])
+        fx = FxRates(fetch=lambda: FxTable('EUR', {'USD': Decimal('1.10')}, '2026-10-16', fetched_at=0.0),
+                     clock=lambda: 60.0)
+        engine = SearchEngine(client, cache=TTLCache(60), canonical_currency='EUR', fx=fx)
+
+        in_dollars = engine.offers(OfferQuery('BRU', 'BUD', '2026-09-01', currency='USD'))
+        in_euros = engine.offers(OfferQuery('BRU', 'BUD', '2026-09-01', currency='EUR'))
+        metrics = engine.price_metrics(originIataCode='BRU', destinationIataCode='BUD',
+                                       departureDate='2026-09-01', currencyCode='USD')
+
+        client.shopping.flight_offers_search.get.assert_called_once()
+        self.assertEqual(client.shopping.flight_offers_search.get.call_args.kwargs['currencyCode'], 'EUR')
+        self.assertEqual(in_dollars[0]['price'], {
+            'currency': 'USD', 'total': '110.00', 'base': '88.00', 'grandTotal': '110.00',
+            'converted': {'from': 'EUR', 'to': 'USD', 'rate': '1.10', 'as_of': '2026-10-16'},
+        })
+        self.assertNotIn('converted', in_euros[0]['price'])
+        self.assertEqual((metrics[0]['currencyCode'], metrics[0]['priceMetrics'][0]['amount']), ('USD', '99.00'))
+        self.assertEqual(client.analytics.itinerary_price_metrics.get.call_args.kwargs['currencyCode'], 'EUR')
+
+    def test_searches_other_currencies_directly_while_rates_are_unavailable(self):
+        fetch = Mock(side_effect=OSError('unreachable'))
+        engine = SearchEngine(Mock(), canonical_currency='EUR', fx=FxRates(fetch=fetch))
+
+        self.assertIsNone(engine.conversion('USD'))
+        self.assertIsNone(engine.conversion('USD'))
+        fetch.assert_called_once()
+        table = parse_ecb_rates(
+            b'<gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01" '
+            b'xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref"><Cube><Cube time="2026-10-16">'
+            b'<Cube currency="USD" rate="1.0834"/><Cube currency="GBP" rate="0.8650"/></Cube></Cube></gesmes:Envelope>',
+            fetched_at=0.0,
+        )
+        self.assertEqual((table.as_of, table.rate('GBP', 'USD').quantize(Decimal('0.0001'))), ('2026-10-16', Decimal('1.2525')))
+
+
+class _FlightOffersHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.startswith('/v1/security/oauth2/token'):
+            payload = {'access_token': 'token', 'expires_in': 1799}
+        else:
+            payload = {'data': [{'id': '1', 'price': {'total': '80.00', 'grandTotal': '80.00'}}]}
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.amadeus+json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledTransportTests(SimpleTestCase):
+    def test_requests_reuse_one_keep_alive_connection(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _FlightOffersHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        client = new_client(
+            client_id='id', client_secret='secret', host='127.0.0.1', port=server.server_port, ssl=False
+        )
+        engine = SearchEngine(client)
+        for day in (1, 2, 3):
+            price, _ = engine.cheapest(OfferQuery('BRU', 'BUD', date(2026, 9, day)))
+            self.assertEqual(str(price), '80.00')
+
+        stats = engine.transport_stats()
+        # One token request plus three searches, all over the first connection.
+        self.assertEqual((stats['requests'], stats['connections_opened'], stats['reused']), (4, 1, 3))
+
+
+def _segment(departure, arrival, departure_at, arrival_at, duration):
+    return {
+        'departure': {'iataCode': departure, 'at': departure_at},
+        'arrival': {'iataCode': arrival, 'at': arrival_at},
+        'carrierCode': 'SN',
+        'duration': duration,
+    }
+
+
+ONE_STOP_RETURN_OFFER = {
+    'id': '7',
+    'price': {'total': '245.10', 'grandTotal': '245.10'},
+    'itineraries': [
+        {'duration': 'PT5H10M', 'segments': [
+            _segment('BRU', 'VIE', '2026-09-01T07:00:00', '2026-09-01T08:40:00', 'PT1H40M'),
+            _segment('VIE', 'BUD', '2026-09-01T11:20:00', '2026-09-01T12:10:00', 'PT50M'),
+        ]},
+        {'duration': 'PT2H5M', 'segments': [
+            _segment('BUD', 'BRU', '2026-09-08T18:00:00', '2026-09-08T20:05:00', 'PT2H5M'),
+        ]},
+    ],
+}
+
+
+class LazyFlightTests(SimpleTestCase):
+    def test_matches_constructed_offer_and_decodes_itineraries_on_access(self):
+        lazy = LazyFlight(ONE_STOP_RETURN_OFFER)
+
+        self.assertEqual((lazy['price'], lazy['id']), ('245.10', '7'))
+        self.assertEqual(lazy._itineraries, {})
+        self.assertEqual(lazy['0firstFlightDepartureDate'], '07:00')
+        self.assertEqual(list(lazy._itineraries), [0])
+        self.assertEqual(dict(lazy), Flight(ONE_STOP_RETURN_OFFER).construct_flights())
+
+
+class EnrichResultsTests(SimpleTestCase):
+    @patch.object(views, 'get_trip_purpose', return_value='LEISURE')
+    @patch.object(views, 'get_flight_price_metrics')
+    def test_enriches_every_route_in_the_order_requested(self, get_metrics, get_trip_purpose):
+        get_metrics.side_effect = lambda **kwargs: (
+            {'min': '150.00', 'first': '200.00', 'median': '260.00', 'third': '300.00', 'max': '400.00'}
+            if kwargs['destinationIataCode'] == 'BUD' else None
+        )
+
+        response = self.client.get(reverse('enrich_results'), {
+            'departure_date': '2026-09-01',
+            'return_date': '2026-09-08',
+            'currency': 'EUR',
+            'route': ['BRU-BUD-120.00', 'BRU-MAD-'],
+        })
+
+        routes = json.loads(response.content)['routes']
+        self.assertEqual([(r['origin'], r['destination']) for r in routes], [('BRU', 'BUD'), ('BRU', 'MAD')])
+        self.assertEqual((routes[0]['is_good_deal'], routes[0]['trip_purpose']), ('A GOOD DEAL', 'LEISURE'))
+        self.assertEqual(routes[0]['metrics']['min'], '120.00')
+        self.assertEqual((routes[1]['metrics'], routes[1]['is_good_deal']), (None, 'NO FLIGHTS'))
+
+
+class RouteOffersTests(SimpleTestCase):
+    def test_pages_a_routes_remaining_offers_from_the_stored_search(self):
+        client = Mock()
+        client.shopping.flight_offers_search.get.return_value = Mock(data=[
+            dict(ONE_STOP_RETURN_OFFER, id=str(i), price={'total': f'{200 + i}.00', 'currency': 'EUR'})
+            for i in range(15)
+        ])
+        path = Path(tempfile.mkdtemp()) / 'searches.sqlite3'
+        now = [1000.0]
+        # The search and the fragments are served by different workers, each with its own engine
+        searching = SearchEngine(client, cache=TTLCache(300))
+        serving = SearchEngine(client, cache=TTLCache(300))
+
+        with patch.object(views, 'engine', searching), \
+                patch.object(views, 'searches', ResultStore(path, ttl=1800, clock=lambda: now[0])), \
+                patch.object(views, 'get_airport_name', side_effect=lambda code: code):
+            response = self.client.post(reverse('flight_offers'), {
+                'search_mode': 'destinations', 'Origin': 'BRU', 'Destination': 'BUD', 'Currency': 'EUR',
+                'Departuredate': '2026-09-01', 'Returndate': '2026-09-08',
+            })
+        url = f"{reverse('route_offers')}?{response.context['all_results'][0]['offers_query']}"
+
+        with patch.object(views, 'engine', serving), \
+                patch.object(views, 'searches', ResultStore(path, ttl=1800, clock=lambda: now[0])):
+            first = self.client.get(f'{url}&offset=1')
+            last = self.client.get(f'{url}&offset=11')
+            now[0] += 1800
+            expired = self.client.get(f'{url}&offset=1')
+            invalid = self.client.get(reverse('route_offers'), {'origin': 'BRU'})
+
+        self.assertContains(first, '€201.00')
+        self.assertNotContains(first, '€211.00')
+        self.assertContains(first, 'offset=11')
+        self.assertContains(last, '€214.00')
+        self.assertNotContains(last, 'more-offers-btn')
+        self.assertContains(expired, 'Please search again')
+        self.assertNotContains(expired, '€201.00')
+        self.assertEqual(invalid.status_code, 400)
+        # Only the search itself went upstream, not the fragments
+        self.assertEqual(client.shopping.flight_offers_search.get.call_count, 1)
+
+
+class FlexibleDatesTests(SimpleTestCase):
+    def test_prices_a_calendar_around_the_searched_dates(self):
+        departure = date.today() + timedelta(days=30)
+        client = Mock()
+        # Cheaper the later the departure and the earlier the return
+        client.shopping.flight_offers_search.get.side_effect = lambda **params: Mock(data=[{
+            'id': '1',
+            'price': {'total': str(200 - (date.fromisoformat(params['departureDate']) - departure).days * 10
+                                   + (date.fromisoformat(params['returnDate']) - departure).days)},
+        }])
+
+        with patch.object(views, 'engine', SearchEngine(client, cache=TTLCache(60), workers=4)), \
+                patch.object(views, 'get_airport_name', side_effect=lambda code: code):
+            response = self.client.post(reverse('flight_offers'), {
+                'search_mode': 'destinations', 'Origin': 'BRU', 'Destination': 'BUD', 'Currency': 'EUR',
+                'Departuredate': departure.isoformat(), 'Returndate': (departure + timedelta(days=1)).isoformat(),
+                'Flexdays': '1',
+            })
+
+        calendar = response.context['all_results'][0]['calendar']
+        cells = {(row['departure'], return_date): cell for row in calendar['rows']
+                 for return_date, cell in zip(calendar['returns'], row['cells'])}
+        self.assertEqual(len(cells), 9)
+        # Returning a day before departing is no trip at all
+        self.assertEqual([key for key, cell in cells.items() if not cell['valid']],
+                         [(departure + timedelta(days=1), departure)])
+        self.assertEqual([key for key, cell in cells.items() if cell['cheapest']],
+                         [(departure + timedelta(days=1), departure + timedelta(days=1))])
+        self.assertTrue(cells[(departure, departure + timedelta(days=1))]['searched'])
+        # Eight valid cells, the searched dates among them, each searched once
+        self.assertEqual(client.shopping.flight_offers_search.get.call_count, 8)
+
+
+class ProfilingTests(SimpleTestCase):
+    def test_profiles_staff_requests_that_ask_for_it(self):
+        def slow_route(route):
+            return sum(i * i for i in range(20000))
+
+        def view(request):
+            # The work happens on worker threads, as it does for a real search
+            return HttpResponse(str(sum(result for _, result, _ in run_tasks(['BRU-BUD', 'BRU-MAD'], slow_route))))
+
+        middleware = ProfileMiddleware(view)
+        factory = RequestFactory()
+        staff, visitor = Mock(is_active=True, is_staff=True), Mock(is_active=True, is_staff=False)
+
+        with tempfile.TemporaryDirectory() as profiles, override_settings(FLIGHT_PRICE_PROFILE_DIR=profiles):
+            asked = factory.get('/flight_offers/', {'profile': '1'})
+            asked.user = staff
+            by_header = factory.get('/flight_offers/', HTTP_X_PROFILE='1')
+            by_header.user = staff
+            not_staff = factory.get('/flight_offers/', {'profile': '1'})
+            not_staff.user = visitor
+            not_asked = factory.get('/flight_offers/')
+            not_asked.user = staff
+
+            with self.assertLogs('flight_price.profiling', 'DEBUG') as logs:
+                response = middleware(asked)
+            self.assertTrue(middleware(by_header).has_header('X-Profile-Artifact'))
+            self.assertFalse(middleware(not_staff).has_header('X-Profile-Artifact'))
+            self.assertFalse(middleware(not_asked).has_header('X-Profile-Artifact'))
+            self.assertEqual(len(list(Path(profiles).glob('*.prof'))), 2)
+            artifact = Path(profiles) / response['X-Profile-Artifact']
+            self.assertTrue(artifact.exists())
+
+        # The report covers the worker threads, not just the request thread waiting on them
+        self.assertEqual([record.levelname for record in logs.records], ['INFO', 'DEBUG'])
+        self.assertNotIn('slow_route', logs.output[0])
+        self.assertIn('slow_route', logs.output[1])
+
+    def test_profiles_only_the_work_the_block_hands_to_its_workers(self):
+        def own_route(route):
+            return sum(i * i for i in range(20000))
+
+        def other_request():
+            started.set()
+            while not done.is_set():
+                sum(i * i for i in range(2000))
+
+        started, done = threading.Event(), threading.Event()
+        with Profiler() as profiler:
+            # Another request's thread, busy the whole time the block runs
+            bystander = threading.Thread(target=other_request)
+            bystander.start()
+            started.wait(5)
+            list(run_tasks(['BRU-BUD', 'BRU-MAD'], own_route, workers=2))
+            done.set()
+            bystander.join(5)
+
+        functions = {name for _, _, name in profiler.stats.stats}
+        self.assertIn('own_route', functions)
+        self.assertNotIn('other_request', functions)
+        # Every task profiler is stopped by then: another profiler can start right away
+        with Profiler():
+            pass
+
+
+class AirportIndexTests(SimpleTestCase):
+    def test_radius_queries_match_a_full_scan(self):
+        index = load_airports()
+        # Plain points, airports, and circles crossing the antimeridian or reaching a pole
+        points = [(50.9, 4.5), (0.0, 0.0), (-17.0, 179.9), (21.3, -157.9), (64.0, -22.6), (88.0, 10.0)]
+
+        for latitude, longitude in points:
+            for radius_km in (100, 800, 3000):
+                distances = ((haversine_km(latitude, longitude, a.latitude, a.longitude), a.code) for a in index)
+                expected = [code for distance, code in sorted(distances) if distance <= radius_km]
+                found = index.within(latitude, longitude, radius_km)
+                self.assertEqual([airport.code for airport, _ in found], expected)
+
+    def test_nearby_endpoint_filters_by_size(self):
+        response = self.client.get(reverse('nearby_airports'), {'iata': 'bru', 'radius_km': 60})
+        small_too = json.loads(response.content)
+        response = self.client.get(reverse('nearby_airports'), {'iata': 'BRU', 'radius_km': 60, 'min_size': 'medium'})
+        medium_up = json.loads(response.content)
+
+        self.assertEqual([a['code'] for a in small_too['airports']], ['BRU', 'ANR', 'CRL'])
+        self.assertEqual([a['code'] for a in medium_up['airports']], ['BRU', 'CRL'])
+        self.assertEqual(medium_up['airports'][1]['distance_km'], 49)
+
+    def test_nearby_endpoint_rejects_points_off_the_map(self):
+        for lat, lon in [('nan', '4.5'), ('50.9', 'inf'), ('-inf', '4.5'), ('90.5', '4.5'), ('50.9', '-181')]:
+            response = self.client.get(reverse('nearby_airports'), {'lat': lat, 'lon': lon, 'radius_km': 60})
+
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(json.loads(response.content)['success'])
+            self.assertIn('Latitude must be between', json.loads(response.content)['message'])
+        response = self.client.get(reverse('nearby_airports'), {'lat': '50.9', 'lon': '4.5', 'radius_km': 60})
+        self.assertIn('BRU', [a['code'] for a in json.loads(response.content)['airports']])
+
+
+class SharedAccessTokenTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.store_path = Path(tempfile.mkdtemp()) / 'token.sqlite3'
+
+    def _worker_token(self, access_token='first'):
+        client = Mock(host='test.api.amadeus.com', client_id='id', client_secret='secret')
+        client._unauthenticated_request.return_value = Mock(result={'access_token': access_token, 'expires_in': 1800})
+        return SharedAccessToken(client, TokenStore(self.store_path), clock=lambda: self.now)
+
+    def test_workers_share_one_token_and_renew_it_before_expiry(self):
+        worker_1, worker_2 = self._worker_token(), self._worker_token()
+
+        self.assertEqual(worker_1._bearer_token(), 'Bearer first')
+        self.assertEqual(worker_2._bearer_token(), 'Bearer first')
+        self.assertEqual((worker_1.fetched, worker_2.fetched), (1, 0))
+
+        # Inside the refresh margin the valid token is still served while a new one is fetched
+        self.now += 1600
+        worker_2.client._unauthenticated_request.return_value = Mock(result={'access_token': 'second', 'expires_in': 1800})
+        self.assertEqual(worker_2.token(), 'first')
+        for thread in threading.enumerate():
+            if thread.name == 'amadeus-token-refresh':
+                thread.join()
+
+        self.assertEqual((worker_2.token(), worker_1.refresh()), ('second', 'second'))
+        self.assertEqual((worker_1.fetched, worker_2.fetched), (1, 1))
+
+
+class PrewarmTests(SimpleTestCase):
+    def test_only_served_processes_prewarm(self):
+        with patch('flight_price.prewarm.start_prewarm') as start_prewarm:
+            call_command('check', stdout=StringIO())
+            self.assertFalse(start_prewarm.called)
+            sys.modules.pop('pricing.wsgi', None)
+            importlib.import_module('pricing.wsgi')
+            start_prewarm.assert_called_once_with()
+
+            sys.modules.pop('pricing.wsgi', None)
+            with override_settings(FLIGHT_ENGINE_PREWARM=False):
+                importlib.import_module('pricing.wsgi')
+            start_prewarm.assert_called_once_with()
+
+
+class SchedulerTests(SimpleTestCase):
+    def test_results_and_errors_come_back_per_task(self):
+        def price(route):
+            if route == 'BRU-XXX':
+                raise ValueError('unknown airport')
+            return len(route)
+
+        for workers in (1, 3):
+            with self.subTest(workers=workers):
+                outcomes = {task: (result, error) for task, result, error
+                            in run_tasks(['BRU-BUD', 'BRU-XXX', 'BRU-MADRID'], price, workers=workers)}
+                self.assertEqual(outcomes['BRU-BUD'], (7, None))
+                self.assertEqual(outcomes['BRU-MADRID'], (10, None))
+                self.assertIsNone(outcomes['BRU-XXX'][0])
+                self.assertIsInstance(outcomes['BRU-XXX'][1], ValueError)
+
+    def test_tasks_are_pulled_two_per_worker_at_most(self):
+        pulled = []
+        release = threading.Event()
+
+        def tasks():
+            for i in range(20):
+                pulled.append(i)
+                yield i
+
+        results = run_tasks(tasks(), lambda i: release.wait(5) and i, workers=2)
+        first = []
+        consumer = threading.Thread(target=lambda: first.append(next(results)))
+        consumer.start()
+        consumer.join(0.3)
+
+        # Every worker is blocked, so only the initial 2 * workers tasks have been taken
+        self.assertEqual(len(pulled), 4)
+        release.set()
+        consumer.join(5)
+        self.assertEqual(sorted([first[0][0]] + [task for task, _, _ in results]), list(range(20)))
+
+    def test_rate_limiter_spaces_out_requests(self):
+        limiter = RateLimiter(50)
+        started = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        # The first slot is immediate, the next five 20 ms apart
+        self.assertGreaterEqual(time.monotonic() - started, 0.095)
+        self.assertEqual(RateLimiter(0).interval, 0.0)
+
+
+class CoalescingTests(SimpleTestCase):
+    def test_concurrent_identical_searches_share_one_upstream_call(self):
+        release = threading.Event()
+        client = Mock()
+        client.shopping.flight_offers_search.get.side_effect = lambda **params: (
+            release.wait(5) and Mock(data=[{'id': '1', 'price': {'total': '80.00'}}])
+        )
+        # Two workers, each searching the same route from four threads at once
+        locks_path = Path(tempfile.mkdtemp()) / 'inflight.sqlite3'
+        workers = [
+            SearchEngine(client, cache=TTLCache(300), locks=CallLockTable(locks_path, poll_interval=0.01))
+            for _ in range(2)
+        ]
+        query = OfferQuery('BRU', 'BUD', '2026-09-01')
+        results = []
+        threads = [
+            threading.Thread(target=lambda engine=engine: results.append(engine.offers(query)))
+            for engine in workers for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for _ in range(500):
+            if sum(engine.inflight.shared for engine in workers) == 6:
+                break
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(client.shopping.flight_offers_search.get.call_count, 1)
+        self.assertEqual(results, [[{'id': '1', 'price': {'total': '80.00'}}]] * 8)
+        self.assertEqual(sorted(engine.locks.shared for engine in workers), [0, 1])
+
+
+class WarmCacheTests(SimpleTestCase):
+    def test_warms_the_most_searched_routes_for_the_web_workers(self):
+        directory = Path(tempfile.mkdtemp())
+        departure = (date.today() + timedelta(days=30)).isoformat()
+        logged_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S,000')
+        searches = ['BUD', 'BUD', 'MAD', 'BUD', 'LIS', 'MAD']
+        (directory / 'app.log').write_text(''.join(
+            f"INFO {logged_at} views Searching flight offers with parameters: "
+            f"{views.get_offer_kwargs('BRU', destination, departure, '', 'EUR')}\n"
+            for destination in searches
+        ))
+        client = Mock()
+        client.shopping.flight_offers_search.get.return_value = Mock(data=[{'id': '1', 'price': {'total': '80.00'}}])
+        client.analytics.itinerary_price_metrics.get.return_value = Mock(data=[])
+        client.reference_data.locations.get.return_value = Mock(data=[])
+
+        # One-way routes cost an offers search, price metrics and each new airport name: BUD 4 + MAD 2 requests
+        with override_settings(FLIGHT_ENGINE_LOCK_TABLE=str(directory / 'inflight.sqlite3')), \
+                patch.object(views, 'amadeus', client):
+            call_command('warm_cache', str(directory / 'app.log'), '--budget', '7', stdout=StringIO())
+
+        self.assertEqual(client.shopping.flight_offers_search.get.call_count, 2)
+        web_client = Mock()
+        web_worker = SearchEngine(web_client, locks=CallLockTable(directory / 'inflight.sqlite3'))
+        offers = web_worker.offers(OfferQuery('BRU', 'MAD', departure, currency='EUR'))
+        self.assertEqual(offers, [{'id': '1', 'price': {'total': '80.00'}}])
+        web_client.shopping.flight_offers_search.get.assert_not_called()
+
+    def test_warmed_offers_keep_the_age_they_were_fetched_at(self):
+        directory = Path(tempfile.mkdtemp())
+        departure = (date.today() + timedelta(days=30)).isoformat()
+        kwargs = views.get_offer_kwargs('BRU', 'BUD', departure, '', 'EUR')
+        (directory / 'app.log').write_text(f"INFO views Searching flight offers with parameters: {kwargs}\n")
+        client = Mock()
+        client.shopping.flight_offers_search.get.return_value = Mock(data=[{'id': '1', 'price': {'total': '80.00'}}])
+        client.analytics.itinerary_price_metrics.get.return_value = Mock(data=[])
+        client.reference_data.locations.get.return_value = Mock(data=[])
+
+        with override_settings(FLIGHT_ENGINE_LOCK_TABLE=str(directory / 'inflight.sqlite3'),
+                               FLIGHT_ENGINE_CACHE_TTL=300, FLIGHT_ENGINE_CACHE_GRACE=300), \
+                patch.object(views, 'amadeus', client):
+            call_command('warm_cache', str(directory / 'app.log'), '--ttl', str(4 * 3600), stdout=StringIO())
+
+        # A web worker reading the warmed offers 400 seconds later
+        web_client = Mock()
+        web_client.shopping.flight_offers_search.get.return_value = Mock(data=[{'id': '2', 'price': {'total': '95.00'}}])
+        locks = CallLockTable(directory / 'inflight.sqlite3', clock=lambda: time.time() + 400)
+        web_worker = SearchEngine(web_client, cache=TTLCache(300, grace=300), locks=locks)
+        query = OfferQuery.from_params(kwargs)
+
+        with patch.object(views, 'engine', web_worker):
+            self.assertEqual(views.get_flight_offers(**kwargs)[0]['price'], '80.00')
+            self.assertEqual(views.get_stale_offers_age(kwargs), 7)
+            web_client.shopping.flight_offers_search.get.assert_not_called()
+            # Served stale while the refresh fetches new offers instead of re-reading the warmed ones
+            self.assertEqual(web_worker.offers(query)[0]['price']['total'], '80.00')
+            for _ in range(500):
+                if web_worker.offers_age(query) < 300:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(web_worker.offers(query)[0]['price']['total'], '95.00')
+            self.assertIsNone(views.get_stale_offers_age(kwargs))
+        self.assertEqual(web_client.shopping.flight_offers_search.get.call_count, 1)
+        # --ttl is capped at the workers' cache TTL and grace period
+        with sqlite3.connect(directory / 'inflight.sqlite3') as connection:
+            lifetimes = [row[0] for row in connection.execute(
+                "SELECT result_until - fetched_at FROM calls WHERE key != ?", (locks._key(('offers', query)),)
+            )]
+        self.assertTrue(lifetimes)
+        self.assertTrue(all(lifetime <= 601 for lifetime in lifetimes))
+
+
+class BulkSearchTests(SimpleTestCase):
+    def test_resumes_an_interrupted_run_and_rates_each_row(self):
+        directory = Path(tempfile.mkdtemp())
+        (directory / 'routes.csv').write_text(
+            'Origin,Destination,Departure_Date,Return_Date\n'
+            'BRU,BUD,2026-09-01,2026-09-08\nBRU,MAD,2026-09-01,\nBRU,LIS,someday,\n'
+        )
+        # Row 1 was written before the interruption, row 2 only partly
+        (directory / 'prices.ndjson').write_text('{"row": 1, "error": null}\n{"row": 2, "orig')
+        client = Mock()
+        client.shopping.flight_offers_search.get.return_value = Mock(data=[{'id': '1', 'price': {'total': '140.00'}}])
+        client.analytics.itinerary_price_metrics.get.return_value = Mock(data=[{'priceMetrics': [
+            {'amount': amount} for amount in ('100.00', '120.00', '150.00', '180.00', '260.00')
+        ]}])
+
+        with patch.object(views, 'engine', SearchEngine(client, cache=TTLCache(60), workers=2)):
+            call_command('bulk_search', str(directory / 'routes.csv'), str(directory / 'prices.ndjson'),
+                         '--resume', '--currency', 'eur', stdout=StringIO(), stderr=StringIO())
+
+        rows = [json.loads(line) for line in (directory / 'prices.ndjson').read_text().splitlines()]
+        self.assertEqual(sorted(row['row'] for row in rows), [1, 2, 3])
+        priced = next(row for row in rows if row['row'] == 2)
+        self.assertEqual((priced['cheapest'], priced['currency'], priced['median']), ('140.00', 'EUR', '150.00'))
+        self.assertEqual(priced['deal'], 'TYPICAL')
+        self.assertEqual(next(row for row in rows if row['row'] == 3)['error'], 'Invalid route or date')
+        client.shopping.flight_offers_search.get.assert_called_once()
+
+
+class SearchApiTests(SimpleTestCase):
+    def test_batch_searches_each_route_once_and_pages_the_results(self):
+        client = Mock()
+        client.shopping.flight_offers_search.get.return_value = Mock(data=[ONE_STOP_RETURN_OFFER])
+        batch = {
+            'searches': [
+                {'origin': 'BRU', 'destinations': ['BUD', 'MAD'], 'departure_date': '2026-09-01', 'currency': 'EUR'},
+                {'id': 'again', 'origin': 'bru', 'destination': 'bud', 'departure_date': '2026-09-01', 'currency': 'eur'},
+            ],
+            'page_size': 2,
+            'enrich': False,
+        }
+
+        with patch.object(views, 'engine', SearchEngine(client, workers=2)), \
+                patch.object(views, 'get_airport_name', side_effect=lambda code: f'{code} Airport, Europe'):
+            response = self.client.post(reverse('api_search'), json.dumps(batch), content_type='application/json',
+                                        HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        payload = json.loads(gzip.decompress(response.content))
+        self.assertEqual(client.shopping.flight_offers_search.get.call_count, 2)
+        self.assertEqual((payload['total_routes'], payload['pages']), (3, 2))
+        self.assertEqual([(r['search'], r['destination']) for r in payload['routes']], [(0, 'BUD'), (0, 'MAD')])
+        self.assertEqual(payload['routes'][0]['offers'][0]['itineraries'][0]['segments'][1]['to'], 'BUD')
+        self.assertEqual(payload['searches'][0]['summary'][0]['min_price'], 245.1)
+        self.assertEqual(payload['searches'][1]['id'], 'again')
+
+    def test_rejects_searches_without_a_departure_date(self):
+        response = self.client.post(reverse('api_search'), json.dumps({'origin': 'BRU', 'destination': 'BUD'}),
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_an_enrich_flag_that_is_not_a_boolean(self):
+        search = {'origin': 'BRU', 'destination': 'BUD', 'departure_date': '2026-09-01'}
+        with patch.object(views, 'engine') as engine:
+            response = self.client.post(reverse('api_search'), json.dumps(dict(search, enrich='false')),
+                                        content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['error'], 'enrich must be true or false')
+        engine.run.assert_not_called()
@@ -1,11 +1,15 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 
 urlpatterns = [
     path('', views.flight_offers, name='flight_offers'),
+    path('enrich_results/', views.enrich_results, name='enrich_results'),
+    path('route_offers/', views.route_offers, name='route_offers'),
+    path('api/v1/search/', api.search, name='api_search'),
     path('origin_airport_search/', views.origin_airport_search, name='origin_airport_search'),
     path('destination_airport_search/', views.destination_airport_search, name='destination_airport_search'),
+    path('nearby_airports/', views.nearby_airports, name='nearby_airports'),
     path('add_south_america_airports/', views.add_south_america_airports, name='add_south_america_airports'),
     path('add_europe_airports/', views.add_europe_airports, name='add_europe_airports'),
     path('add_asia_airports/', views.add_asia_airports, name='add_asia_airports'),
@@ -1,17 +1,47 @@
 import json
 import ast
 import logging
-from amadeus import Client, ResponseError, Location
+import uuid
+from datetime import date, timedelta
+from urllib.parse import urlencode
+from amadeus import ResponseError, Location
+from django.conf import settings
 from django.shortcuts import render
 from django.contrib import messages
-from .flight import Flight
+from flight_engine import (
+    CallLockTable, FxRates, OfferQuery, ResultStore, SearchEngine, TTLCache, TokenStore, load_airports,
+    new_client,
+)
+from .flight import LazyFlight
 from .metrics import Metrics
 from django.http import HttpResponse
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-amadeus = Client()
+# One client per worker: keep-alive connections are reused across requests, and the OAuth
+# token is shared with the other workers and renewed before it expires
+amadeus = new_client(
+    token_store=TokenStore(settings.FLIGHT_ENGINE_TOKEN_STORE) if settings.FLIGHT_ENGINE_TOKEN_STORE else None
+)
+engine = SearchEngine(
+    amadeus,
+    cache=TTLCache(settings.FLIGHT_ENGINE_CACHE_TTL, grace=settings.FLIGHT_ENGINE_CACHE_GRACE),
+    workers=settings.FLIGHT_ENGINE_WORKERS,
+    refresh_budget=settings.FLIGHT_ENGINE_REFRESH_BUDGET,
+    # Concurrent identical searches, in this worker or another, share one upstream call
+    locks=CallLockTable(settings.FLIGHT_ENGINE_LOCK_TABLE) if settings.FLIGHT_ENGINE_LOCK_TABLE else None,
+    # One upstream search serves every currency: other currencies are converted from the canonical one
+    canonical_currency=settings.FLIGHT_ENGINE_CANONICAL_CURRENCY or None,
+    fx=FxRates(
+        settings.FLIGHT_ENGINE_FX_URL,
+        path=settings.FLIGHT_ENGINE_FX_CACHE or None,
+        refresh_interval=settings.FLIGHT_ENGINE_FX_REFRESH,
+    ) if settings.FLIGHT_ENGINE_CANONICAL_CURRENCY else None,
+)
+
+# Each search's offers, for whichever worker serves the route's "show more" requests
+searches = ResultStore(settings.FLIGHT_PRICE_SEARCH_STORE, ttl=settings.FLIGHT_PRICE_SEARCH_TTL)
 
 
 def flight_offers(request):
@@ -51,82 +81,61 @@ def flight_offers(request):
             return render(request, 'flight_price/home.html')
 
         all_results = []
-        trip_purposes = {}
-        metrics = {}
-        cheapest_flights = {}
-        is_good_deals = {}
+        search_id = uuid.uuid4().hex
 
-        for search_item in search_list:
+        # Run every route's offer search concurrently up front; the loop below reads them from the cache
+        if search_mode == 'destinations':
+            routes = [(origin, search_item) for search_item in search_list]
+        else:
+            routes = [(search_item, destination) for search_item in search_list]
+
+        calendars = {}
+        flex_days = get_flex_days(request.POST.get('Flexdays'))
+        if flex_days:
             try:
-                # Set up origin and destination based on mode
-                if search_mode == 'destinations':
-                    current_origin = origin
-                    current_destination = search_item
-                else:
-                    current_origin = search_item
-                    current_destination = destination
-
-                kwargs = {'originLocationCode': current_origin,
-                         'destinationLocationCode': current_destination,
-                         'departureDate': departure_date,
-                         'adults': 1,
-                         'currencyCode': currency
-                         }
-
-                kwargs_metrics = {'originIataCode': current_origin,
-                                'destinationIataCode': current_destination,
-                                'departureDate': departure_date,
-                                'currencyCode': currency
-                                }
-
-                if return_date:
-                    kwargs['returnDate'] = return_date
-                    kwargs_trip_purpose = {'originLocationCode': current_origin,
-                                         'destinationLocationCode': current_destination,
-                                         'departureDate': departure_date,
-                                         'returnDate': return_date
-                                         }
-                    trip_purposes[search_item] = get_trip_purpose(**kwargs_trip_purpose)
-                else:
-                    kwargs_metrics['oneWay'] = 'true'
+                departures, returns = get_flex_dates(departure_date, return_date, flex_days)
+            except ValueError:
+                messages.error(request, 'Please enter valid dates')
+                return render(request, 'flight_price/home.html')
+            cells = get_flex_cells(routes, departures, returns)
+            if len(cells) > MAX_FLEX_CELLS:
+                messages.error(request, f'Flexible dates would price {len(cells)} date combinations '
+                                        f'(at most {MAX_FLEX_CELLS}); choose fewer routes or fewer days')
+                return render(request, 'flight_price/home.html')
+            # The grid includes the dates searched, so the offer searches below are served from the cache
+            calendars = get_price_calendars(routes, departures, returns, cells, departure_date, return_date, currency)
+
+        engine.prefetch(
+            get_offer_kwargs(route_origin, route_destination, departure_date, return_date, currency)
+            for route_origin, route_destination in routes
+        )
 
+        for current_origin, current_destination in routes:
+            try:
+                kwargs = get_offer_kwargs(current_origin, current_destination, departure_date, return_date, currency)
                 flight_offers = get_flight_offers(**kwargs)
-                metrics[search_item] = get_flight_price_metrics(**kwargs_metrics)
-                cheapest_flights[search_item] = get_cheapest_flight_price(flight_offers)
-                
-                if metrics[search_item] is not None:
-                    is_good_deals[search_item] = rank_cheapest_flight(
-                        cheapest_flights[search_item], 
-                        metrics[search_item]['first'], 
-                        metrics[search_item]['third']
-                    )
-                    is_cheapest_flight_out_of_range(cheapest_flights[search_item], metrics[search_item])
-
-                # Store result with consistent structure
-                if search_mode == 'destinations':
-                    all_results.append({
-                        'flight_offers': flight_offers,
-                        'origin': current_origin,
-                        'origin_name': get_airport_name(current_origin),
-                        'destination': current_destination,
-                        'destination_name': get_airport_name(current_destination),
-                        'metrics': metrics[search_item],
-                        'cheapest_flight': cheapest_flights[search_item],
-                        'is_good_deal': is_good_deals.get(search_item, 'NO FLIGHTS'),
-                        'trip_purpose': trip_purposes.get(search_item, '')
-                    })
-                else:
-                    all_results.append({
-                        'flight_offers': flight_offers,
-                        'origin': current_origin,
-                        'origin_name': get_airport_name(current_origin),
-                        'destination': current_destination,
-                        'destination_name': get_airport_name(current_destination),
-                        'metrics': metrics[search_item],
-                        'cheapest_flight': cheapest_flights[search_item],
-                        'is_good_deal': is_good_deals.get(search_item, 'NO FLIGHTS'),
-                        'trip_purpose': trip_purposes.get(search_item, '')
-                    })
+                if len(flight_offers) > 1:
+                    # Only the cheapest offer is rendered; route_offers serves the rest from here
+                    searches.save(get_search_key(search_id, current_origin, current_destination),
+                                  {'currency': currency, 'offers': [offer.offer for offer in flight_offers]})
+
+                # Price metrics and trip purpose are fetched by the page afterwards from enrich_results
+                all_results.append({
+                    'flight_offers': flight_offers,
+                    'origin': current_origin,
+                    'origin_name': get_airport_name(current_origin),
+                    'destination': current_destination,
+                    'destination_name': get_airport_name(current_destination),
+                    'metrics': None,
+                    'cheapest_flight': get_cheapest_flight_price(flight_offers),
+                    'is_good_deal': None,
+                    'trip_purpose': '',
+                    'offers_age': get_stale_offers_age(kwargs),
+                    'calendar': calendars.get((current_origin, current_destination)),
+                    'offers_query': urlencode({'search': search_id,
+                                               'origin': current_origin,
+                                               'destination': current_destination})
+                })
 
             except ResponseError as error:
                 logger.error(f"Amadeus API error for {current_origin} to {current_destination}: {error.response.result['errors'][0]['detail']}")
@@ -137,6 +146,8 @@ def flight_offers(request):
                 messages.add_message(request, messages.ERROR, f"Unexpected error searching flights from {current_origin} to {current_destination}")
                 continue
 
+        logger.info(f"Amadeus transport: {engine.transport_stats()}")
+
         if not all_results:
             messages.error(request, 'No flights found for the given criteria')
             return render(request, 'flight_price/home.html')
@@ -165,7 +176,15 @@ def flight_offers(request):
             'single_destination_name': single_destination_name,
             'departure_date': departure_date,
             'return_date': return_date,
-            'currency': currency
+            'currency': currency,
+            'conversion': engine.conversion(currency),
+            'enrichment': {
+                'departure_date': departure_date,
+                'return_date': return_date,
+                'currency': currency,
+                'routes': [f"{result['origin']}-{result['destination']}-{result['cheapest_flight'] or ''}"
+                           for result in all_results],
+            }
         })
 
     except Exception as e:
@@ -174,34 +193,166 @@ def flight_offers(request):
         return render(request, 'flight_price/home.html')
 
 
+# Widest flexible-date window the form offers, and the most date combinations one search may price
+MAX_FLEX_DAYS = 3
+MAX_FLEX_CELLS = 300
+
+
+def get_flex_days(value):
+    try:
+        return min(MAX_FLEX_DAYS, max(0, int(value or 0)))
+    except ValueError:
+        return 0
+
+
+def get_flex_dates(departure_date, return_date, flex_days):
+    """Departure and return dates within flex_days of those searched; returns are [None] for one-way trips"""
+    offsets = [timedelta(days=offset) for offset in range(-flex_days, flex_days + 1)]
+    departure = date.fromisoformat(departure_date)
+    departures = [departure + offset for offset in offsets if departure + offset >= date.today()]
+    returns = [date.fromisoformat(return_date) + offset for offset in offsets] if return_date else [None]
+    return departures, returns
+
+
+def get_flex_cells(routes, departures, returns):
+    return [(route, departure, return_) for route in routes for departure in departures for return_ in returns
+            if return_ is None or return_ >= departure]
+
+
+def get_price_calendars(routes, departures, returns, cells, departure_date, return_date, currency):
+    """
+    Per route, the cheapest price of every (departure, return) date combination as a calendar.
+
+    All cells of all routes are priced concurrently through the search engine, so a
+    combination searched before within the cache TTL costs no upstream call.
+    """
+    def price(cell):
+        (origin, destination), departure, return_ = cell
+        kwargs = get_offer_kwargs(origin, destination, departure.isoformat(),
+                                  return_.isoformat() if return_ else None, currency)
+        return engine.cheapest(OfferQuery.from_params(kwargs))[0]
+
+    prices = {}
+    for cell, cheapest, error in engine.run(cells, price):
+        if error is not None:
+            (origin, destination), departure, return_ = cell
+            logger.error(f"Flexible date search failed for {origin} to {destination} on {departure}/{return_}: {str(error)}")
+        prices[cell] = cheapest
+
+    searched = (date.fromisoformat(departure_date), date.fromisoformat(return_date) if return_date else None)
+    calendars = {}
+    for route in routes:
+        best = min((prices[cell] for cell in cells if cell[0] == route and prices.get(cell) is not None), default=None)
+        calendars[route] = {
+            'returns': returns,
+            'rows': [
+                {
+                    'departure': departure,
+                    'cells': [
+                        {
+                            'valid': (route, departure, return_) in prices,
+                            'price': prices.get((route, departure, return_)),
+                            'cheapest': best is not None and prices.get((route, departure, return_)) == best,
+                            'searched': (departure, return_) == searched,
+                        }
+                        for return_ in returns
+                    ],
+                }
+                for departure in departures
+            ],
+        }
+    return calendars
+
+
+# Offers per "show more" fragment, so a fragment weighs the same however many offers a route has
+ROUTE_OFFERS_PAGE_SIZE = 10
+
+
+def route_offers(request):
+    """
+    Further offers of one route on the results page, rendered as an HTML fragment.
+
+    The page renders only each route's cheapest offer. This serves the rest a page at a
+    time from the offers the search stored under its id, whichever worker ran it. Once
+    FLIGHT_PRICE_SEARCH_TTL has passed they are gone, and the visitor is asked to search
+    again rather than this fragment running a new search of its own.
+    """
+    params = request.GET
+    try:
+        key = get_search_key(params['search'], params['origin'], params['destination'])
+        offset = max(0, int(params.get('offset', 1)))
+    except (KeyError, ValueError):
+        return HttpResponse('Invalid route', status=400)
+
+    search = searches.load(key)
+    if search is None:
+        return render(request, 'flight_price/route_offers.html', {
+            'flight_offers': [], 'next_url': None,
+            'error': 'These offers have expired. Please search again for current prices.',
+        })
+
+    end = offset + ROUTE_OFFERS_PAGE_SIZE
+    offers = search['offers']
+    context = {'currency': search['currency'],
+               'flight_offers': [LazyFlight(offer) for offer in offers[offset:end]],
+               'next_url': None}
+    if end < len(offers):
+        next_params = params.copy()
+        next_params['offset'] = end
+        context['next_url'] = f"{request.path}?{next_params.urlencode()}"
+        context['remaining'] = len(offers) - end
+    return render(request, 'flight_price/route_offers.html', context)
+
+
+def get_search_key(search_id, origin, destination):
+    if not search_id.isalnum():
+        raise ValueError(f'Invalid search id: {search_id!r}')
+    return f'{search_id}/{origin}-{destination}'
+
+
+def get_offer_kwargs(origin, destination, departure_date, return_date, currency):
+    kwargs = {'originLocationCode': origin,
+              'destinationLocationCode': destination,
+              'departureDate': departure_date,
+              'adults': 1,
+              'currencyCode': currency
+              }
+    if return_date:
+        kwargs['returnDate'] = return_date
+    return kwargs
+
+
 def get_flight_offers(**kwargs):
     try:
-        logger.info(f"Making Amadeus API request with parameters: {kwargs}")
-        search_flights = amadeus.shopping.flight_offers_search.get(**kwargs)
-        logger.info(f"Amadeus API response status: {search_flights.status_code}")
-        logger.info(f"Number of flights found: {len(search_flights.data) if search_flights.data else 0}")
-        
-        if not search_flights.data:
+        logger.info(f"Searching flight offers with parameters: {kwargs}")
+        offers = engine.offers(OfferQuery.from_params(kwargs))
+        logger.info(f"Number of flights found: {len(offers)}")
+
+        if not offers:
             logger.warning("No flight offers found in the response")
             return []
-            
-        flight_offers = []
-        for flight in search_flights.data:
-            offer = Flight(flight).construct_flights()
-            flight_offers.append(offer)
-        return flight_offers
+
+        # Itinerary details are decoded lazily, only for the offers the page actually shows
+        return [LazyFlight(flight) for flight in offers]
     except Exception as e:
         logger.error(f"Error in get_flight_offers: {str(e)}")
         raise
 
 
+def get_stale_offers_age(kwargs):
+    """Minutes since a route's offers were fetched when they are served past the cache TTL, else None."""
+    age = engine.offers_age(OfferQuery.from_params(kwargs))
+    if age is None or age < engine.cache.ttl:
+        return None
+    return max(1, round(age / 60))
+
+
 def get_flight_price_metrics(**kwargs_metrics):
-    metrics = amadeus.analytics.itinerary_price_metrics.get(**kwargs_metrics)
-    return Metrics(metrics.data).construct_metrics()
+    return Metrics(engine.price_metrics(**kwargs_metrics)).construct_metrics()
 
 
 def get_trip_purpose(**kwargs_trip_purpose):
-    trip_purpose = amadeus.travel.predictions.trip_purpose.get(**kwargs_trip_purpose).data
+    trip_purpose = engine.trip_purpose(**kwargs_trip_purpose)
     return trip_purpose['result']
 
 
@@ -237,6 +388,86 @@ def is_cheapest_flight_out_of_range(cheapest_flight_price, metrics):
         metrics['max'] = cheapest_flight_price
 
 
+# Upper bound on routes enriched per request, well above what the search form can submit
+MAX_ENRICHED_ROUTES = 100
+
+
+def get_enrichment_kwargs(origin, destination, departure_date, return_date, currency):
+    """Price metrics and trip purpose parameters for a route; no trip purpose for one-way trips."""
+    kwargs_metrics = {'originIataCode': origin,
+                      'destinationIataCode': destination,
+                      'departureDate': departure_date,
+                      'currencyCode': currency
+                      }
+    kwargs_trip_purpose = None
+    if return_date:
+        kwargs_trip_purpose = {'originLocationCode': origin,
+                               'destinationLocationCode': destination,
+                               'departureDate': departure_date,
+                               'returnDate': return_date
+                               }
+    else:
+        kwargs_metrics['oneWay'] = 'true'
+    return kwargs_metrics, kwargs_trip_purpose
+
+
+def get_route_enrichment(origin, destination, departure_date, return_date, currency, cheapest_flight):
+    kwargs_metrics, kwargs_trip_purpose = get_enrichment_kwargs(origin, destination, departure_date,
+                                                                return_date, currency)
+    trip_purpose = ''
+    if kwargs_trip_purpose:
+        trip_purpose = get_trip_purpose(**kwargs_trip_purpose)
+
+    metrics = get_flight_price_metrics(**kwargs_metrics)
+    is_good_deal = 'NO FLIGHTS'
+    if metrics is not None:
+        is_good_deal = rank_cheapest_flight(cheapest_flight, metrics['first'], metrics['third'])
+        is_cheapest_flight_out_of_range(cheapest_flight, metrics)
+    return {'metrics': metrics, 'is_good_deal': is_good_deal, 'trip_purpose': trip_purpose}
+
+
+def parse_enrichment_route(value):
+    """'MAD-BCN-245.10' -> ('MAD', 'BCN', '245.10'); the price part is empty for routes without offers."""
+    origin, _, rest = value.partition('-')
+    destination, _, cheapest_flight = rest.partition('-')
+    if not origin or not destination:
+        return None
+    return origin.upper(), destination.upper(), cheapest_flight or None
+
+
+def enrich_results(request):
+    """
+    Price metrics, deal ranking and trip purpose for the routes of a results page.
+
+    The results page renders offers straight away and requests this once for all of
+    its routes; the routes are enriched concurrently through the search engine.
+    """
+    departure_date = request.GET.get('departure_date')
+    return_date = request.GET.get('return_date') or None
+    currency = request.GET.get('currency', 'USD')
+    routes = [route for route in map(parse_enrichment_route, request.GET.getlist('route')) if route]
+    if not departure_date or not routes:
+        return HttpResponse(json.dumps({'routes': []}), 'application/json')
+
+    def enrich(route):
+        origin, destination, cheapest_flight = route
+        return get_route_enrichment(origin, destination, departure_date, return_date, currency, cheapest_flight)
+
+    routes = list(dict.fromkeys(routes))[:MAX_ENRICHED_ROUTES]
+    enriched = {}
+    for route, enrichment, error in engine.run(routes, enrich):
+        origin, destination, _ = route
+        if error is not None:
+            if isinstance(error, ResponseError):
+                logger.error(f"Amadeus API error enriching {origin} to {destination}: {error.response.result['errors'][0]['detail']}")
+            else:
+                logger.error(f"Unexpected error enriching {origin} to {destination}: {str(error)}")
+            enrichment = {'metrics': None, 'is_good_deal': 'NO FLIGHTS', 'trip_purpose': ''}
+        enriched[route] = {'origin': origin, 'destination': destination, **enrichment}
+    # Routes finish in any order; answer in the order the page asked for them
+    return HttpResponse(json.dumps({'routes': [enriched[route] for route in routes]}), 'application/json')
+
+
 def origin_airport_search(request):
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         try:
@@ -272,6 +503,55 @@ def get_city_airport_list(data):
     return json.dumps(result)
 
 
+# Largest radius accepted by nearby_airports, to keep expansions regional
+MAX_NEARBY_RADIUS_KM = 2000
+
+
+def nearby_airports(request):
+    """Airports within a radius of an IATA code or a lat/lon point, for tight regional searches"""
+    params = request.POST if request.method == 'POST' else request.GET
+    mode = params.get('mode', 'destinations')
+    min_size = params.get('min_size') or None
+    try:
+        radius_km = float(params.get('radius_km', 300))
+    except ValueError:
+        return HttpResponse(json.dumps({'success': False, 'message': 'Radius must be a number of kilometres'}), 'application/json')
+    if not 0 < radius_km <= MAX_NEARBY_RADIUS_KM:
+        return HttpResponse(json.dumps({'success': False, 'message': f'Radius must be between 0 and {MAX_NEARBY_RADIUS_KM} km'}), 'application/json')
+    if min_size not in (None, 'small', 'medium', 'large'):
+        return HttpResponse(json.dumps({'success': False, 'message': 'Airport size must be small, medium or large'}), 'application/json')
+
+    index = load_airports()
+    code = params.get('iata', '').strip().upper()
+    if code:
+        center = index.get(code)
+        if center is None:
+            return HttpResponse(json.dumps({'success': False, 'message': f'Unknown airport {code}'}), 'application/json')
+        latitude, longitude, label = center.latitude, center.longitude, code
+    else:
+        try:
+            latitude, longitude = float(params['lat']), float(params['lon'])
+        except (KeyError, ValueError):
+            return HttpResponse(json.dumps({'success': False, 'message': 'Please provide an airport code or a lat/lon point'}), 'application/json')
+        # float() also accepts nan and inf, which no point on the map has
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return HttpResponse(json.dumps({'success': False, 'message': 'Latitude must be between -90 and 90 and longitude between -180 and 180'}), 'application/json')
+        label = f'{latitude:.2f}, {longitude:.2f}'
+
+    airports = [
+        {'code': airport.code, 'name': airport.name, 'city': f'{airport.city}, {airport.country}',
+         'distance_km': round(distance)}
+        for airport, distance in index.within(latitude, longitude, radius_km, min_size=min_size)
+    ]
+    airport_type = 'destinations' if mode == 'destinations' else 'origins'
+    return HttpResponse(json.dumps({
+        'success': bool(airports),
+        'airports': airports,
+        'message': f'Added {len(airports)} airports within {radius_km:g} km of {label} as {airport_type}'
+        if airports else f'No airports found within {radius_km:g} km of {label}'
+    }), 'application/json')
+
+
 def add_south_america_airports(request):
     """Add all major South American airports as destinations or origins"""
     if request.method == 'POST':
@@ -332,14 +612,18 @@ def add_south_america_airports(request):
     return HttpResponse(json.dumps({'success': False, 'message': 'Invalid request method'}), 'application/json')
 
 
+def get_location_kwargs(iata_code):
+    return {'keyword': iata_code, 'subType': Location.ANY}
+
+
 def get_airport_name(iata_code):
     """Get airport name with country from IATA code using Amadeus API"""
     try:
         if not iata_code:
             return iata_code
         
-        # Use the same API endpoint as the search functions
-        data = amadeus.reference_data.locations.get(keyword=iata_code, subType=Location.ANY).data
+        # Use the same API endpoint as the search functions, cached like the searches
+        data = engine.locations(**get_location_kwargs(iata_code))
         
         # Find exact match for the IATA code
         for location in data:
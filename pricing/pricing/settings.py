@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -20,6 +21,11 @@ load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The flight_engine package shared with the CLI lives at the repository root.
+REPO_ROOT = BASE_DIR.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.1/howto/deployment/checklist/
@@ -50,6 +56,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'flight_price.profiling.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware'
@@ -164,3 +171,41 @@ LOGGING = {
         },
     },
 }
+
+# Shared search engine: seconds to cache identical Amadeus searches (0 disables the cache)
+# and how many route searches a results page runs concurrently.
+FLIGHT_ENGINE_CACHE_TTL = int(os.environ.get('FLIGHT_ENGINE_CACHE_TTL', 300))
+FLIGHT_ENGINE_WORKERS = int(os.environ.get('FLIGHT_ENGINE_WORKERS', 4))
+
+# Stale-while-revalidate: for this many seconds past the TTL cached offers are still served
+# (marked with their age) while a background refresh runs (0 disables), with at most
+# FLIGHT_ENGINE_REFRESH_BUDGET refreshes in flight per worker.
+FLIGHT_ENGINE_CACHE_GRACE = int(os.environ.get('FLIGHT_ENGINE_CACHE_GRACE', 300))
+FLIGHT_ENGINE_REFRESH_BUDGET = int(os.environ.get('FLIGHT_ENGINE_REFRESH_BUDGET', 2))
+
+# Offers and price metrics are fetched and cached in this currency and converted locally for
+# the others (empty fetches each currency from Amadeus), using ECB reference rates cached in
+# FLIGHT_ENGINE_FX_CACHE and refreshed every FLIGHT_ENGINE_FX_REFRESH seconds.
+FLIGHT_ENGINE_CANONICAL_CURRENCY = os.environ.get('FLIGHT_ENGINE_CANONICAL_CURRENCY', 'EUR')
+FLIGHT_ENGINE_FX_URL = os.environ.get('FLIGHT_ENGINE_FX_URL', 'https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml')
+FLIGHT_ENGINE_FX_CACHE = os.environ.get('FLIGHT_ENGINE_FX_CACHE', str(BASE_DIR / '.fx_rates.json'))
+FLIGHT_ENGINE_FX_REFRESH = int(os.environ.get('FLIGHT_ENGINE_FX_REFRESH', 6 * 3600))
+
+# OAuth token shared by every worker through this SQLite file (empty keeps one token per process),
+# and whether each served process (gunicorn or runserver, through wsgi.py) fetches it and loads
+# reference data at boot. Other manage.py commands never prewarm.
+FLIGHT_ENGINE_TOKEN_STORE = os.environ.get('FLIGHT_ENGINE_TOKEN_STORE', str(BASE_DIR / '.amadeus_token.sqlite3'))
+FLIGHT_ENGINE_PREWARM = os.environ.get('FLIGHT_ENGINE_PREWARM', '1') == '1'
+
+# Lock table through which workers making the same Amadeus request at the same time share one
+# upstream call (empty only coalesces identical requests within each worker).
+FLIGHT_ENGINE_LOCK_TABLE = os.environ.get('FLIGHT_ENGINE_LOCK_TABLE', str(BASE_DIR / '.amadeus_inflight.sqlite3'))
+
+# Staff can profile a request with ?profile=1 or an X-Profile: 1 header: the cProfile stats are
+# saved in this directory (empty disables profiling) and the hottest functions are logged.
+FLIGHT_PRICE_PROFILE_DIR = os.environ.get('FLIGHT_PRICE_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
+# Each search's offers are kept in this SQLite file for FLIGHT_PRICE_SEARCH_TTL seconds, so any
+# worker can serve a route's further offers; after that the page asks for a new search.
+FLIGHT_PRICE_SEARCH_STORE = os.environ.get('FLIGHT_PRICE_SEARCH_STORE', str(BASE_DIR / '.flight_searches.sqlite3'))
+FLIGHT_PRICE_SEARCH_TTL = int(os.environ.get('FLIGHT_PRICE_SEARCH_TTL', 1800))
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pricing.settings')
 
 application = get_wsgi_application()
+
+# Served processes get their OAuth token and reference data at boot instead of on the first request.
+# Only serving loads this module (gunicorn workers, runserver's serving process but not its
+# autoreloader), so management commands such as migrate or warm_cache never prewarm.
+from django.conf import settings  # noqa: E402
+
+if settings.FLIGHT_ENGINE_PREWARM:
+    from flight_price.prewarm import start_prewarm  # noqa: E402
+    start_prewarm()